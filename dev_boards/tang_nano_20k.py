@@ -63,6 +63,25 @@ class TangNano20kPlatform(GowinPlatform):
     ]
     connectors = []
 
+    # Place and route with nextpnr-himbaechel (the legacy nextpnr-gowin the Amaranth
+    # templates call is no longer maintained, and YoWASP only ships himbaechel)
+    _apicula_required_tools = ["yosys", "nextpnr-himbaechel", "gowin_pack"]
+    _apicula_command_templates = [
+        GowinPlatform._apicula_command_templates[0],
+        r"""
+        {{invoke_tool("nextpnr-himbaechel")}}
+            {{quiet("--quiet")}}
+            {{get_override("nextpnr_opts")|options}}
+            --log {{name}}.tim
+            --device {{platform.part}}
+            --vopt family={{platform._chipdb_device}}
+            --vopt cst={{name}}.cst
+            --json {{name}}.syn.json
+            --write {{name}}.pnr.json
+        """,
+        GowinPlatform._apicula_command_templates[2],
+    ]
+
     def toolchain_prepare(self, fragment, name, **kwargs):
         overrides = {
             "add_options": "set_option -use_mspi_as_gpio 1 -use_sspi_as_gpio 1",
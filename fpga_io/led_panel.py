@@ -354,6 +354,28 @@ class LEDPanel(wiring.Component):
     source: wiring.In(WidgetSignature)
     dout: wiring.Out(1)
 
+    def __init__(
+        self,
+        *,
+        t_high: int | None = None,
+        t_data: int | None = None,
+        t_low: int | None = None,
+        t_wait: int | None = None,
+    ) -> None:
+        """
+        Delays default to the class values (WS2812 timings at CLKFREQ). Other values
+        are only useful for simulation, where the real-time timings don't matter.
+        """
+        if t_high is not None:
+            self.T_HIGH = t_high
+        if t_data is not None:
+            self.T_DATA = t_data
+        if t_low is not None:
+            self.T_LOW = t_low
+        if t_wait is not None:
+            self.T_WAIT = t_wait
+        super().__init__()
+
     def elaborate(self, platform) -> Module:
         m = Module()
 
@@ -0,0 +1,331 @@
+"""
+Side by side benchmark of the two CPUs: the component based `sap1.core.sap1.SAP1` and
+the hand decoded monolith (`sap1/monolith/monolith.py`).
+
+Every workload of the corpus runs on both. The monolith uses a different opcode
+encoding, so programs are translated: only the bytes executed as instructions (found
+with the reference interpreter), since the rest are data. At every instruction boundary
+(the first fetch step) PC, A, OUT and the flags must match, and so must the OUT
+sequence. Both take 5 cycles per instruction, but the core halts one cycle later (its
+HLT stops the sequencer after 3 steps, the monolith's after 2).
+
+With the Gowin flow available, both CPUs (with the output register on the `rout` pins)
+are also built, to compare resources and Fmax. Results are added to a JSON history.
+"""
+
+from __future__ import annotations
+
+import importlib
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import ModuleType
+from typing import Collection, Sequence
+
+from amaranth import Module
+from amaranth.sim import Simulator
+
+from ..core.microcode import Mnemonic
+from ..core.sap1 import SAP1
+from ..model.interpreter import ADDRESS_BUS_WIDTH, ADDRESS_MASK
+from ..model.profiler import profile
+from ..model.tstate import STEPS
+from ..sim.harness import Harness, standard_probes
+from ..synth import SAP1_Nano
+from ..toolchain.build import build
+from ..toolchain.reports import BuildReport
+from ..workloads import CORPUS, MULTIPLY_PROG, WORKLOADS, Workload
+from . import history
+
+MONOLITH = "sap1.monolith.monolith"
+HISTORY = "build/bench/cores.json"
+BUILD_DIR = "build/cores"
+DATA_ACCESS = {Mnemonic.LDA, Mnemonic.ADD, Mnemonic.SUB, Mnemonic.STA}
+BOUNDARY_REGISTERS = ("pc", "a", "out", "carry_flag", "zero_flag")
+
+Boundary = tuple[int, ...]  # Values of BOUNDARY_REGISTERS
+
+
+# The monolith design is built when its module runs. If it was imported only for its
+# definitions, this is that module, with a design that hasn't been used yet
+_unused: ModuleType | None = None
+
+
+def _monolith_definitions() -> ModuleType:
+    global _unused
+    if MONOLITH not in sys.modules:
+        _unused = importlib.import_module(MONOLITH)
+    return sys.modules[MONOLITH]
+
+
+def monolith_module() -> ModuleType:
+    """The monolith module, with a freshly built design"""
+    global _unused
+    if _unused is not None:
+        module, _unused = _unused, None
+        return module
+    if MONOLITH in sys.modules:
+        return importlib.reload(sys.modules[MONOLITH])
+    return importlib.import_module(MONOLITH)
+
+
+def monolith_opcodes() -> dict[int, int]:
+    """Core opcode -> monolith opcode. Unassigned core opcodes (NOPs) aren't included"""
+    Instruction = _monolith_definitions().Instruction
+    return {
+        mnemonic.value: Instruction[mnemonic.name].value
+        for mnemonic in Mnemonic
+        if mnemonic.name in Instruction.__members__
+    }
+
+
+def code_addresses(program: Sequence[int], max_instructions: int) -> set[int]:
+    """Addresses executed as instructions. Fails if some are also used as data"""
+    result = profile(program, max_instructions)
+    code = {address for address, count in enumerate(result.executions) if count}
+    data = set()
+    for address in code:
+        byte = result.code[address]
+        if byte != program[address]:
+            raise ValueError(f"Self-modifying code at {address:x}, can't translate")
+        if byte >> ADDRESS_BUS_WIDTH in {mnemonic.value for mnemonic in DATA_ACCESS}:
+            data.add(byte & ADDRESS_MASK)
+    if code & data:
+        shared = ", ".join(f"{address:x}" for address in sorted(code & data))
+        raise ValueError(f"Addresses used as code and data ({shared}), can't translate")
+    return code
+
+
+def translate(program: Sequence[int], code: Collection[int] | None = None) -> list[int]:
+    """Program in the monolith encoding. Only the code addresses (default: all)"""
+    opcodes = monolith_opcodes()
+    nop = opcodes[Mnemonic.NOP.value]
+    code = range(len(program)) if code is None else code
+    return [
+        (opcodes.get(byte >> ADDRESS_BUS_WIDTH, nop) << ADDRESS_BUS_WIDTH)
+        | byte & ADDRESS_MASK
+        if address in code
+        else byte
+        for address, byte in enumerate(program)
+    ]
+
+
+@dataclass
+class Run:
+    outputs: list[int]
+    halted: bool
+    cycles: int
+    boundaries: list[Boundary] = field(default_factory=list)
+
+    @property
+    def instructions(self) -> int:
+        return len(self.boundaries)
+
+    @property
+    def cpi(self) -> float:
+        return self.cycles / self.instructions if self.instructions else 0.0
+
+
+class BoundaryMonitor:
+    """Records BOUNDARY_REGISTERS at the start of every instruction of a Harness run"""
+
+    def __init__(self, harness: Harness) -> None:
+        probes = standard_probes(harness.sap1)
+        names = (*BOUNDARY_REGISTERS, "u_sequencer", "halted")
+        self.probes = {name: probes[name] for name in names}
+        self.boundaries: list[Boundary] = []
+        self._last = -1  # Cycle of the last boundary
+
+    def sample(self, cycle: int, values: dict[str, int]) -> None:
+        if values["u_sequencer"] == 0 and not values["halted"]:
+            self.boundaries.append(tuple(values[name] for name in BOUNDARY_REGISTERS))
+            self._last = cycle
+
+    def finish(self, cycle: int) -> None:
+        if self._last == cycle:
+            # The final state, at the start of an instruction that didn't run
+            self.boundaries.pop()
+
+
+def run_core(workload: Workload, harness: Harness) -> Run:
+    monitor = BoundaryMonitor(harness)
+    result = harness.run(workload.program, workload.max_cycles, monitors=[monitor])
+    return Run(result.outputs, result.halted, result.cycles, monitor.boundaries)
+
+
+def run_monolith(program: Sequence[int], max_cycles: int) -> Run:
+    """Simulate the monolith with program (in its encoding) in RAM"""
+    module = monolith_module()
+    module.ram.init = list(program)
+    registers = [
+        module.pc,
+        module.a_reg,
+        module.out_reg,
+        module.flag_carry,
+        module.flag_zero,
+    ]
+    run = Run([], False, 0)
+
+    async def testbench(ctx):
+        def sample() -> None:
+            # The one-hot sequencer is at its first step (and not halted there)
+            if ctx.get(module.sequencer) == 1 and not ctx.get(module.halted):
+                run.boundaries.append(tuple(ctx.get(reg) for reg in registers))
+
+        while run.cycles < max_cycles and not ctx.get(module.halted):
+            sample()
+            if ctx.get(module.out_reg_load):
+                run.outputs.append(ctx.get(module.bus_data))
+            await ctx.tick()
+            run.cycles += 1
+        run.halted = bool(ctx.get(module.halted))
+
+    sim = Simulator(module.m)
+    sim.add_clock(1e-6)
+    sim.add_testbench(testbench)
+    sim.run()
+    return run
+
+
+@dataclass
+class Comparison:
+    workload: Workload
+    core: Run
+    monolith: Run
+    differences: list[str] = field(default_factory=list)
+
+
+def compare(workload: Workload, harness: Harness) -> Comparison:
+    core = run_core(workload, harness)
+    code = code_addresses(workload.program, workload.max_cycles // STEPS)
+    monolith = run_monolith(translate(workload.program, code), workload.max_cycles)
+
+    differences = []
+    if core.outputs != monolith.outputs:
+        differences.append(f"outputs: core {core.outputs}, monolith {monolith.outputs}")
+    if core.halted != monolith.halted:
+        differences.append(f"halted: core {core.halted}, monolith {monolith.halted}")
+    for idx, (expected, actual) in enumerate(zip(core.boundaries, monolith.boundaries)):
+        if expected != actual:
+            registers = ", ".join(BOUNDARY_REGISTERS)
+            differences.append(
+                f"instruction {idx}: ({registers}) core {expected}, monolith {actual}"
+            )
+            break
+    if core.instructions != monolith.instructions:
+        differences.append(
+            f"instructions: core {core.instructions}, monolith {monolith.instructions}"
+        )
+    return Comparison(workload, core, monolith, differences)
+
+
+def core_top(platform: SAP1_Nano, program: Sequence[int] = MULTIPLY_PROG) -> Module:
+    m = Module()
+    m.submodules.sap1 = sap1 = SAP1(list(program))
+    m.d.comb += platform.request("rout").o.eq(sap1.output_register.data_out)
+    return m
+
+
+def monolith_top(platform: SAP1_Nano, program: Sequence[int] | None = None) -> Module:
+    """The monolith as in its synth command (with its own PROGRAM by default)"""
+    module = monolith_module()
+    if program is not None:
+        module.ram.init = list(program)
+    module.m.d.comb += platform.request("rout").o.eq(module.out_reg)
+    return module.m
+
+
+def build_both(build_dir: str | Path = BUILD_DIR) -> dict[str, BuildReport | None]:
+    """Build reports of both CPUs running MULTIPLY_PROG (None if nothing was built)"""
+    code = code_addresses(MULTIPLY_PROG, WORKLOADS["multiply"].max_cycles // STEPS)
+    tops = {
+        "core": lambda platform: core_top(platform),
+        "monolith": lambda platform: monolith_top(
+            platform, translate(MULTIPLY_PROG, code)
+        ),
+    }
+    reports: dict[str, BuildReport | None] = {}
+    for name, make in tops.items():
+        platform = SAP1_Nano()
+        result = build(make, name, Path(build_dir) / name, platform)
+        if result.error:
+            print(f"{name}: {result.error}")
+        has_report = result.report.cells or result.report.placed
+        reports[name] = result.report if has_report else None
+    return reports
+
+
+def metrics(
+    comparisons: list[Comparison], reports: dict[str, BuildReport | None]
+) -> history.Results:
+    results: history.Results = {}
+    for comparison in comparisons:
+        results[comparison.workload.name] = {
+            "core_cpi": comparison.core.cpi,
+            "monolith_cpi": comparison.monolith.cpi,
+        }
+    for name, report in reports.items():
+        if report is None:
+            continue
+        results[name] = {key: float(value) for key, value in report.resources.items()}
+        if report.fmax:
+            results[name]["fmax"] = min(report.fmax.values())
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import platform as host
+
+    parser = argparse.ArgumentParser(description="Compare the core and monolith CPUs")
+    parser.add_argument("workloads", nargs="*", help=f"Any of: {', '.join(WORKLOADS)}")
+    parser.add_argument("--no-build", action="store_true", help="Skip the Gowin builds")
+    parser.add_argument("--build-dir", default=BUILD_DIR)
+    parser.add_argument("--history", default=HISTORY)
+    parser.add_argument("--threshold", type=float, default=history.THRESHOLD)
+    parser.add_argument("--no-save", action="store_true", help="Don't add to history")
+    args = parser.parse_args()
+    for name in args.workloads:
+        if name not in WORKLOADS:
+            parser.error(f"Unknown workload {name!r}")
+
+    harness = Harness()
+    selected = [WORKLOADS[name] for name in args.workloads] or CORPUS
+    comparisons = [compare(workload, harness) for workload in selected]
+    print("Workload             Instructions  Core cycles   CPI  Monolith cycles   CPI")
+    for comparison in comparisons:
+        core, monolith = comparison.core, comparison.monolith
+        print(
+            f"{comparison.workload.name:20} {core.instructions:12} {core.cycles:12}"
+            f" {core.cpi:5.2f} {monolith.cycles:16} {monolith.cpi:5.2f}"
+        )
+        for difference in comparison.differences:
+            print(f"    MISMATCH {difference}")
+
+    reports = {} if args.no_build else build_both(args.build_dir)
+    if reports:
+        print("\nResource      Core  Monolith")
+        empty = BuildReport()
+        core, monolith = (reports[name] or empty for name in ("core", "monolith"))
+        for key in core.resources:
+            print(f"{key:10} {core.resources[key]:7} {monolith.resources[key]:9}")
+
+        def fmax(report: BuildReport) -> str:
+            return f"{min(report.fmax.values()):.1f}" if report.fmax else "-"
+
+        print(f"{'Fmax (MHz)':10} {fmax(core):>7} {fmax(monolith):>9}")
+        if not (core.placed and monolith.placed):
+            print("(Not placed: resources are yosys cell counts, Fmax is unknown)")
+
+    results = metrics(comparisons, reports)
+    reference = history.baseline(history.load(args.history), machine=host.node())
+    found = history.regressions(results, reference, args.threshold, {"fmax"})
+    if not args.no_save:
+        history.append(args.history, results)
+    for regression in found:
+        print(f"Regression: {regression}")
+    mismatches = sum(1 for comparison in comparisons if comparison.differences)
+    if mismatches:
+        raise SystemExit(f"{mismatches} workloads differ between the CPUs")
+    if found:
+        raise SystemExit(f"{len(found)} regressions beyond {100 * args.threshold:.0f}%")
@@ -0,0 +1,95 @@
+"""
+Resource utilization per submodule, compared with the previous builds.
+
+Builds a design variant (see `toolchain.farm`; the whole flow, through the build cache)
+and breaks its LUT, MUX, FF, ALU, SSRAM and BSRAM counts after synthesis down by
+submodule (`reports.hierarchy`): `sap1` and its registers, ALU and RAM, every `LEDPanel`
+and widget of `panel_glue`, the display and decimal decoder of `glue`, `front_panel`,
+`clock_control`, `prog_control`... Results are added to a JSON history, and submodules
+that grew beyond a threshold compared with the previous runs are reported and make the
+command fail. The build commands (`python -m sap1.synth`...) print and record the same
+breakdown for every build, without the check.
+"""
+
+from __future__ import annotations
+
+from ..toolchain.reports import BuildReport, hierarchy
+from . import history
+
+HISTORY = "build/bench/hierarchy.json"
+BUILD_DIR = "build/hierarchy"
+DEPTH = 2
+THRESHOLD = 0.1
+# Ignore growth of a few cells, significant only for tiny submodules
+ABSOLUTE_TOLERANCE = {"lut": 8, "mux": 2, "ff": 4, "alu": 4}
+TOP = "(top)"
+
+
+def breakdown(report: BuildReport, depth: int = DEPTH) -> dict[str, dict[str, int]]:
+    """Resources by submodule (the top has the totals). IO buffers are left out"""
+    return {
+        scope or TOP: resources
+        for scope, resources in hierarchy(report.scopes, depth).items()
+        if not scope.startswith("pin_")
+    }
+
+
+def table(scopes: dict[str, dict[str, int]]) -> str:
+    lines = ["Submodule                          LUT   MUX    FF   ALU  SSRAM  BSRAM"]
+    for scope, resources in scopes.items():
+        indent = "  " * scope.count(".") if scope != TOP else ""
+        lines.append(
+            f"{indent + scope.rsplit('.', 1)[-1]:32} {resources['lut']:5}"
+            f" {resources['mux']:5} {resources['ff']:5} {resources['alu']:5}"
+            f" {resources['ssram']:6} {resources['bsram']:6}"
+        )
+    return "\n".join(lines)
+
+
+def metrics(variant: str, scopes: dict[str, dict[str, int]]) -> history.Results:
+    return {
+        f"{variant}:{scope}": {kind: float(count) for kind, count in resources.items()}
+        for scope, resources in scopes.items()
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from ..toolchain.farm import VARIANTS, Job, run_job
+    from ..workloads import WORKLOADS
+
+    parser = argparse.ArgumentParser(description="Resource utilization per submodule")
+    parser.add_argument("-v", "--variant", default="board", help=", ".join(VARIANTS))
+    parser.add_argument("-p", "--program", default="multiply", help=", ".join(WORKLOADS))
+    parser.add_argument("-d", "--depth", type=int, default=DEPTH)
+    parser.add_argument("--build-dir", default=BUILD_DIR)
+    parser.add_argument("--history", default=HISTORY)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--no-save", action="store_true", help="Don't add to history")
+    args = parser.parse_args()
+    if args.variant not in VARIANTS:
+        parser.error(f"Unknown variant {args.variant!r}")
+    if args.program not in WORKLOADS:
+        parser.error(f"Unknown program {args.program!r}")
+
+    result = run_job(Job(args.variant, args.program, 1), args.build_dir)
+    if not result.report.scopes:
+        raise SystemExit(f"No synthesized netlist: {result.error}")
+    scopes = breakdown(result.report, args.depth)
+
+    print(table(scopes))
+    if not result.report.placed:
+        print("(Counts after synthesis: nextpnr didn't run)")
+
+    results = metrics(args.variant, scopes)
+    reference = history.baseline(history.load(args.history))
+    found = history.regressions(
+        results, reference, args.threshold, absolute=ABSOLUTE_TOLERANCE
+    )
+    if not args.no_save:
+        history.append(args.history, results)
+    for regression in found:
+        print(f"Grew: {regression}")
+    if found:
+        raise SystemExit(f"{len(found)} submodules grew beyond {100 * args.threshold:.0f}%")
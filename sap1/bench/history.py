@@ -0,0 +1,123 @@
+"""
+JSON history of benchmark results, and regression checks against it.
+
+A history file is a list of entries, one per benchmark run:
+
+    {"time": "...", "commit": "...", "machine": "...",
+     "results": {"<benchmark>": {"<metric>": value, ...}, ...}}
+
+New results are compared with a baseline: the median of every metric over the last
+entries, which smooths out the noise of single runs. Timings are only comparable on the
+same machine, so the baseline can be limited to the entries from one.
+"""
+
+from __future__ import annotations
+
+import json
+import platform
+import statistics
+import subprocess
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Collection, Mapping
+
+Results = dict[str, dict[str, float]]  # benchmark -> metric -> value
+
+BASELINE_RUNS = 5
+THRESHOLD = 0.2  # Relative change flagged as a regression
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load(path: str | Path) -> list[dict]:
+    path = Path(path)
+    return json.loads(path.read_text()) if path.exists() else []
+
+
+def append(path: str | Path, results: Results) -> dict:
+    """Add an entry with the results (and where they come from) to the history"""
+    path = Path(path)
+    history = load(path)
+    entry = {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_revision(),
+        "machine": platform.node(),
+        "results": results,
+    }
+    history.append(entry)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(history, indent=2))
+    return entry
+
+
+def baseline(
+    history: list[dict], runs: int = BASELINE_RUNS, machine: str | None = None
+) -> Results:
+    """Median of every metric over the last runs entries (from machine, if given)"""
+    if machine is not None:
+        history = [entry for entry in history if entry.get("machine") == machine]
+    values: dict[str, dict[str, list[float]]] = {}
+    for entry in history[-runs:]:
+        for name, metrics in entry["results"].items():
+            for metric, value in metrics.items():
+                values.setdefault(name, {}).setdefault(metric, []).append(value)
+    return {
+        name: {metric: statistics.median(series) for metric, series in metrics.items()}
+        for name, metrics in values.items()
+    }
+
+
+@dataclass
+class Regression:
+    name: str
+    metric: str
+    baseline: float
+    value: float
+
+    @property
+    def change(self) -> float:
+        return self.value / self.baseline - 1 if self.baseline else float("inf")
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name} {self.metric}: {self.value:.4g} vs baseline"
+            f" {self.baseline:.4g} ({100 * self.change:+.1f}%)"
+        )
+
+
+def regressions(
+    results: Results,
+    reference: Results,
+    threshold: float = THRESHOLD,
+    higher_is_better: Collection[str] = (),
+    absolute: Mapping[str, float] = {},
+) -> list[Regression]:
+    """
+    Metrics that got worse than the reference by more than threshold (relative), and by
+    more than absolute[metric] if given (to ignore noise in tiny values). Metrics are
+    lower-is-better, except the ones in higher_is_better
+    """
+    found = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = reference.get(name, {}).get(metric)
+            if base is None or abs(value - base) <= absolute.get(metric, 0):
+                continue
+            if metric in higher_is_better:
+                worse = value < base * (1 - threshold)
+            else:
+                worse = value > base * (1 + threshold)
+            if worse:
+                found.append(Regression(name, metric, base, value))
+    return found
@@ -0,0 +1,216 @@
+"""
+Simulation and elaboration benchmarks of every component.
+
+For each benchmark, measures (best of several repetitions):
+
+- elaborate: seconds to construct the design and elaborate it into a Fragment,
+- compile: seconds to build the pysim `Simulator` for it (pysim generates and compiles
+  Python code for the design at that point),
+- cycles_per_second: simulated clock cycles per second, with no testbench.
+
+Components whose activity depends on their inputs are wrapped with a free running
+counter driving them, so the simulation exercises their logic. Results are appended to
+a JSON history (see `history.py`) and compared with the previous runs; slowdowns beyond
+a threshold are reported and make the command fail.
+"""
+
+from __future__ import annotations
+
+import gc
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from amaranth import Cat, Module, Signal, Value
+from amaranth.hdl import Elaboratable, Fragment
+from amaranth.lib import wiring
+from amaranth.sim import Simulator
+
+from fpga_io.led_panel import LEDPanel, RAMPanel, SequenceWidget, make_register
+from fpga_io.tm1637 import TM1637, DecimalDecoder
+
+from ..clock_control import ClockControl
+from ..core.memory import RAM
+from ..core.sap1 import SAP1
+from ..prog_control import ProgrammingControl
+from ..workloads import FIBONACCI
+from . import history
+from .cores import monolith_module, translate
+
+HISTORY = "build/bench/simulation.json"
+CYCLES = 20_000
+REPEATS = 3
+HIGHER_IS_BETTER = {"cycles_per_second"}
+# Elaboration and compilation take milliseconds: ignore changes smaller than this noise
+ABSOLUTE_TOLERANCE = {"elaborate": 0.01, "compile": 0.01}
+
+
+def stimulus(m: Module, width: int = 24) -> Signal:
+    """A free running counter, to drive inputs of the component under test"""
+    counter = Signal(width)
+    m.d.sync += counter.eq(counter + 1)
+    return counter
+
+
+def drive(m: Module, counter: Signal, inputs: list[Value], shift: int = 0) -> None:
+    """Drive inputs from consecutive counter bits (starting at shift, slower higher)"""
+    m.d.comb += Cat(*inputs).eq(counter[shift:])
+
+
+def sap1() -> Elaboratable:
+    return SAP1(FIBONACCI)  # Never halts
+
+
+def monolith() -> Elaboratable:
+    module = monolith_module()
+    module.ram.init = translate(FIBONACCI)  # Never halts
+    return module.m
+
+
+def led_panel() -> Elaboratable:
+    m = Module()
+    counter = stimulus(m)
+    widgets = [
+        make_register(m, (3, 3, 2), counter[4:12]),
+        make_register(m, (2, 0, 2), counter[8:12], read=counter[12]),
+        make_register(m, (1, 1, 1), counter[12:13], write=counter[13]),
+    ]
+    m.submodules.sequence = sequence = SequenceWidget(*widgets)
+    m.submodules.panel = panel = LEDPanel()
+    wiring.connect(m, sequence.panel, panel.source)
+    return m
+
+
+def ram_panel() -> Elaboratable:
+    m = Module()
+    counter = stimulus(m)
+    m.submodules.ram = ram = RAM(4, 8, FIBONACCI)
+    m.submodules.ram_panel = ram_panel = RAMPanel(ram.panel_port)
+    m.submodules.panel = panel = LEDPanel()
+    drive(m, counter, [ram_panel.address_register, ram_panel.mem_read], shift=10)
+    wiring.connect(m, ram_panel.panel, panel.source)
+    return m
+
+
+def tm1637() -> Elaboratable:
+    m = Module()
+    counter = stimulus(m, 40)
+    m.submodules.display = display = TM1637()
+    drive(m, counter, [display.display_data], shift=8)
+    return m
+
+
+def decimal_decoder() -> Elaboratable:
+    m = Module()
+    counter = stimulus(m)
+    m.submodules.decimal = decimal = DecimalDecoder()
+    segments = Signal.like(decimal.segments)
+    m.d.sync += segments.eq(decimal.segments)  # Keep it from being a comb-only design
+    drive(m, counter, [decimal.value])
+    return m
+
+
+def clock_control() -> Elaboratable:
+    m = Module()
+    counter = stimulus(m)
+    m.submodules.clock_control = cc = ClockControl(WAIT_BITS=10)
+    drive(m, counter, [cc.slow, cc.fast], shift=12)
+    return m
+
+
+def prog_control() -> Elaboratable:
+    m = Module()
+    counter = stimulus(m)
+    m.submodules.prog_control = pc = ProgrammingControl()
+    drive(m, counter, [pc.sw_next, pc.sw_write, pc.sw_mode], shift=6)
+    return m
+
+
+BENCHMARKS: dict[str, Callable[[], Elaboratable]] = {
+    "sap1": sap1,
+    "monolith": monolith,
+    "led_panel": led_panel,
+    "ram_panel": ram_panel,
+    "tm1637": tm1637,
+    "decimal_decoder": decimal_decoder,
+    "clock_control": clock_control,
+    "prog_control": prog_control,
+}
+
+
+@dataclass
+class Measurement:
+    elaborate: float
+    compile: float
+    cycles_per_second: float
+
+    def best(self, other: Measurement) -> Measurement:
+        return Measurement(
+            min(self.elaborate, other.elaborate),
+            min(self.compile, other.compile),
+            max(self.cycles_per_second, other.cycles_per_second),
+        )
+
+
+def measure(build: Callable[[], Elaboratable], cycles: int = CYCLES) -> Measurement:
+    gc.collect()
+    start = time.perf_counter()
+    fragment = Fragment.get(build(), platform=None)
+    elaborated = time.perf_counter()
+    sim = Simulator(fragment)
+    sim.add_clock(1e-6)
+    compiled = time.perf_counter()
+    sim.run_until(cycles * 1e-6)
+    simulated = time.perf_counter()
+    return Measurement(
+        elaborated - start, compiled - elaborated, cycles / (simulated - compiled)
+    )
+
+
+def run(
+    names: list[str], cycles: int = CYCLES, repeats: int = REPEATS
+) -> history.Results:
+    results = {}
+    for name in names:
+        measure(BENCHMARKS[name], cycles=100)  # Warm up (imports, caches)
+        best = measure(BENCHMARKS[name], cycles)
+        for _ in range(repeats - 1):
+            best = best.best(measure(BENCHMARKS[name], cycles))
+        results[name] = vars(best)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import platform
+
+    parser = argparse.ArgumentParser(description="Benchmark simulation of components")
+    parser.add_argument("benchmarks", nargs="*", help=f"Any of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("-c", "--cycles", type=int, default=CYCLES)
+    parser.add_argument("-r", "--repeats", type=int, default=REPEATS)
+    parser.add_argument("--history", default=HISTORY)
+    parser.add_argument("--threshold", type=float, default=history.THRESHOLD)
+    parser.add_argument("--no-save", action="store_true", help="Don't add to history")
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f"Unknown benchmark {name!r}")
+
+    results = run(args.benchmarks or list(BENCHMARKS), args.cycles, args.repeats)
+    print("Benchmark        Elaborate (s)  Compile (s)  Cycles/s")
+    for name, metrics in results.items():
+        print(
+            f"{name:15}  {metrics['elaborate']:13.3f}  {metrics['compile']:11.3f}"
+            f"  {metrics['cycles_per_second']:8.0f}"
+        )
+
+    reference = history.baseline(history.load(args.history), machine=platform.node())
+    found = history.regressions(
+        results, reference, args.threshold, HIGHER_IS_BETTER, ABSOLUTE_TOLERANCE
+    )
+    if not args.no_save:
+        history.append(args.history, results)
+    for regression in found:
+        print(f"Regression: {regression}")
+    if found:
+        raise SystemExit(f"{len(found)} regressions beyond {100 * args.threshold:.0f}%")
@@ -192,22 +192,8 @@ class SAP1(wiring.Component):
 
 
 if __name__ == "__main__":
-    from amaranth.cli import main
-
-    FIBONACCI = [
-        0x51,  # LDI 1
-        0x4E,  # STA e
-        0x50,  # LDI 0
-        0xE0,  # OUT
-        0x2E,  # ADD e
-        0x4F,  # STA f
-        0x1E,  # LDA e
-        0x4D,  # STA d
-        0x1F,  # LDA f
-        0x4E,  # STA e
-        0x1D,  # LDA d
-        0x70,  # JC 0
-        0x63,  # JMP 3
-    ]
+    from ..toolchain.cache import cached_main
+    from ..workloads import FIBONACCI
+
     sap1 = SAP1(FIBONACCI)
-    main(sap1, ports=[sap1.display])
+    cached_main(sap1, key=("sap1.core.sap1", FIBONACCI), ports=[sap1.display])
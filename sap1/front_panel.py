@@ -3,6 +3,8 @@ from amaranth.lib import wiring
 
 from fpga_io.tm1637 import SlowEnable
 
+from .timing import HARDWARE, TimingProfile
+
 class SwitchScanner(wiring.Component):
     """
     Scans a matrix (16x1) of switches and provides their status.
@@ -36,8 +38,8 @@ class SwitchScanner(wiring.Component):
 
         return m
 
-def clocked_scanner() -> Module:
+def clocked_scanner(timing: TimingProfile = HARDWARE) -> Module:
     m = Module()
-    m.submodules.divisor = divisor = SlowEnable(27000)  # 1ms at 27MHz
+    m.submodules.divisor = divisor = SlowEnable(timing.scanner_delay)
     m.submodules.scanner = EnableInserter(divisor.pulse)(SwitchScanner())
     return m
@@ -0,0 +1,228 @@
+"""
+Vectorized version of the reference interpreter, running many SAP-1 machines in lockstep.
+
+The state of N machines is kept as NumPy arrays of shape (N,) (or (N, 16) for RAM), and
+each step executes one instruction in every machine that is not halted, using masked
+array operations. The semantics are exactly the ones of `interpreter.run`.
+
+This is meant for sweeps over many programs or initial RAM images, where the per
+instruction overhead of Python would dominate.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, fields
+from typing import Sequence
+
+import numpy as np
+
+from ..core.microcode import Mnemonic
+from .interpreter import (
+    ADDRESS_BUS_WIDTH,
+    ADDRESS_MASK,
+    CYCLES,
+    DATA_BUS_WIDTH,
+    DATA_MASK,
+    MAX_INSTRUCTIONS,
+    RAM_SIZE,
+)
+
+MAX_OUTPUTS = 16  # Default capacity of the per-machine output buffer
+
+_CYCLES = np.array(CYCLES, dtype=np.int64)
+
+
+@dataclass
+class BatchState:
+    """State of N SAP-1 machines. Every field has the machine index as first axis"""
+
+    ram: np.ndarray  # (N, 16) uint8
+    a: np.ndarray
+    b: np.ndarray
+    pc: np.ndarray
+    mar: np.ndarray
+    ir: np.ndarray
+    out: np.ndarray
+    carry_flag: np.ndarray
+    zero_flag: np.ndarray
+    halted: np.ndarray  # bool
+    # Statistics (not part of the architectural state)
+    instructions: np.ndarray  # int64
+    cycles: np.ndarray  # int64
+    # Values sent to the output register. Only the first `outputs.shape[1]` are kept,
+    # but output_count keeps counting past that
+    outputs: np.ndarray  # (N, max_outputs) uint8
+    output_count: np.ndarray  # int64
+
+    @classmethod
+    def from_rams(
+        cls, rams: np.ndarray | Sequence[Sequence[int]], max_outputs: int = MAX_OUTPUTS
+    ) -> BatchState:
+        """Machines right after reset, with the given RAM images (0-padded to 16 bytes)"""
+        n = len(rams)
+        ram = np.zeros((n, RAM_SIZE), dtype=np.uint8)
+        if isinstance(rams, np.ndarray) and rams.ndim == 2:
+            assert rams.shape[1] <= RAM_SIZE, "Program does not fit in RAM"
+            ram[:, : rams.shape[1]] = rams
+        else:
+            for idx, image in enumerate(rams):
+                assert len(image) <= RAM_SIZE, "Program does not fit in RAM"
+                ram[idx, : len(image)] = image
+
+        def registers() -> np.ndarray:
+            return np.zeros(n, dtype=np.uint8)
+
+        return cls(
+            ram=ram,
+            a=registers(),
+            b=registers(),
+            pc=registers(),
+            mar=registers(),
+            ir=registers(),
+            out=registers(),
+            carry_flag=registers(),
+            zero_flag=registers(),
+            halted=np.zeros(n, dtype=bool),
+            instructions=np.zeros(n, dtype=np.int64),
+            cycles=np.zeros(n, dtype=np.int64),
+            outputs=np.zeros((n, max_outputs), dtype=np.uint8),
+            output_count=np.zeros(n, dtype=np.int64),
+        )
+
+    def __len__(self) -> int:
+        return len(self.halted)
+
+    def split(self, parts: int) -> list[BatchState]:
+        """Split into (up to) `parts` batches of consecutive machines (none if empty)"""
+        if len(self) == 0:
+            return []
+        chunks = {
+            f.name: np.array_split(getattr(self, f.name), parts) for f in fields(self)
+        }
+        return [
+            BatchState(**{name: chunk[idx] for name, chunk in chunks.items()})
+            for idx in range(min(parts, len(self)))
+        ]
+
+    @classmethod
+    def concatenate(
+        cls, batches: Sequence[BatchState], max_outputs: int = MAX_OUTPUTS
+    ) -> BatchState:
+        """Machines of batches, in order (max_outputs is for an empty list)"""
+        if not batches:
+            return cls.from_rams([], max_outputs)
+        return cls(
+            **{
+                f.name: np.concatenate([getattr(batch, f.name) for batch in batches])
+                for f in fields(cls)
+            }
+        )
+
+    def output_list(self, idx: int) -> list[int]:
+        """Outputs of machine `idx` (only the ones that fit in the buffer)"""
+        count = min(int(self.output_count[idx]), self.outputs.shape[1])
+        return self.outputs[idx, :count].tolist()
+
+
+def step(state: BatchState) -> None:
+    """Execute one instruction in every machine that isn't halted. Updates in place"""
+    active = ~state.halted
+    rows = np.arange(len(state))
+
+    # Fetch
+    np.copyto(state.mar, state.pc, where=active)
+    np.copyto(state.ir, state.ram[rows, state.pc], where=active)
+    np.copyto(state.pc, (state.pc + 1) & ADDRESS_MASK, where=active)
+    opcode = state.ir >> ADDRESS_BUS_WIDTH
+    operand = state.ir & ADDRESS_MASK
+
+    def decoded(mnemonic: Mnemonic) -> np.ndarray:
+        return active & (opcode == mnemonic.value)
+
+    lda, add, sub = decoded(Mnemonic.LDA), decoded(Mnemonic.ADD), decoded(Mnemonic.SUB)
+    sta, ldi, out = decoded(Mnemonic.STA), decoded(Mnemonic.LDI), decoded(Mnemonic.OUT)
+    jmp, jc, jz = decoded(Mnemonic.JMP), decoded(Mnemonic.JC), decoded(Mnemonic.JZ)
+    hlt = decoded(Mnemonic.HLT)
+    alu = add | sub
+
+    # Memory operand
+    np.copyto(state.mar, operand, where=lda | alu | sta)
+    memory_value = state.ram[rows, operand]
+
+    # ALU
+    np.copyto(state.b, memory_value, where=alu)
+    port_b = np.where(sub, state.b ^ DATA_MASK, state.b).astype(np.uint16)
+    result = state.a.astype(np.uint16) + port_b + sub
+    np.copyto(state.carry_flag, result >> DATA_BUS_WIDTH, where=alu, casting="unsafe")
+    np.copyto(state.zero_flag, (result & DATA_MASK) == 0, where=alu)
+
+    # Stores happen before A is updated (but STA never updates A anyway)
+    stores = np.nonzero(sta)[0]
+    state.ram[stores, operand[stores]] = state.a[stores]
+
+    # Output
+    outputs = np.nonzero(out)[0]
+    np.copyto(state.out, state.a, where=out)
+    in_buffer = outputs[state.output_count[outputs] < state.outputs.shape[1]]
+    state.outputs[in_buffer, state.output_count[in_buffer]] = state.a[in_buffer]
+    state.output_count += out
+
+    # A register
+    np.copyto(state.a, memory_value, where=lda)
+    np.copyto(state.a, result, where=alu, casting="unsafe")
+    np.copyto(state.a, operand, where=ldi)
+
+    # Jumps. Flags are not changed by jumps, so these are the ones before the step
+    jump = jmp | (jc & (state.carry_flag != 0)) | (jz & (state.zero_flag != 0))
+    np.copyto(state.pc, operand, where=jump)
+
+    state.halted |= hlt
+    state.instructions += active
+    state.cycles += np.where(active, _CYCLES[opcode], 0)
+
+
+def run(state: BatchState, max_instructions: int = MAX_INSTRUCTIONS) -> BatchState:
+    """Run every machine until it halts or executes max_instructions"""
+    for _ in range(max_instructions):
+        if state.halted.all():
+            break
+        step(state)
+    return state
+
+
+def run_parallel(
+    state: BatchState,
+    max_instructions: int = MAX_INSTRUCTIONS,
+    processes: int | None = None,
+) -> BatchState:
+    """
+    Same as run(), but sharding the machines across a pool of worker processes.
+
+    Returns a new BatchState (the argument is not updated)
+    """
+    if len(state) == 0:
+        return BatchState.concatenate([state])  # A copy, there's nothing to run
+    parts = state.split(processes or os.cpu_count() or 1)
+    with ProcessPoolExecutor(processes) as pool:
+        results = pool.map(run, parts, [max_instructions] * len(parts))
+        return BatchState.concatenate(list(results))
+
+
+if __name__ == "__main__":
+    import time
+
+    from ..workloads import MULTIPLY_PROG
+
+    # Sweep every x, y in MULTIPLY_PROG (addresses e, f)
+    xs, ys = np.meshgrid(np.arange(256), np.arange(256), indexing="ij")
+    rams = np.tile(np.array(MULTIPLY_PROG, dtype=np.uint8), (xs.size, 1))
+    rams[:, 0xE] = xs.ravel()
+    rams[:, 0xF] = ys.ravel()
+
+    start = time.perf_counter()
+    result = run_parallel(BatchState.from_rams(rams), max_instructions=3000)
+    elapsed = time.perf_counter() - start
+    print(f"{len(result)} machines, {result.instructions.sum()} instructions in {elapsed:.2f}s")
+    print(f"Halted: {result.halted.sum()}, max cycles: {result.cycles.max()}")
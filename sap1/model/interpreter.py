@@ -0,0 +1,219 @@
+"""
+Instruction-accurate software model of the SAP-1.
+
+This executes the ISA described by `microcode.Mnemonic` directly, one instruction at a
+time, without going through the microcode. It is intended as a fast reference for what
+a program does (and how many clocks it takes in the hardware), not as a replacement of
+the HDL simulation.
+
+Registers are updated exactly as the hardware leaves them at the end of an instruction,
+including the "side effect" ones: MAR holds the last address put into it (the fetch
+address, or the operand of a memory instruction), B holds the last operand of an
+ADD/SUB, and IR holds the full instruction.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Sequence
+
+from ..core import microcode
+from ..core.microcode import Mnemonic
+from ..core.sap1 import ADDRESS_BUS_WIDTH, DATA_BUS_WIDTH, SAP1
+
+RAM_SIZE = 1 << ADDRESS_BUS_WIDTH
+ADDRESS_MASK = RAM_SIZE - 1
+DATA_MASK = (1 << DATA_BUS_WIDTH) - 1
+
+FETCH_CYCLES = 2  # MAR <- PC; IR <- memory && PC++
+MAX_INSTRUCTIONS = 100_000
+
+
+def instruction_cycles(uinstructions: list[microcode.uInstr]) -> int:
+    """Clock cycles the hardware spends in an instruction with the given microcode"""
+    assert FETCH_CYCLES + len(uinstructions) <= SAP1.uINSTRUCTIONS_PER_INSTRUCTION
+    for step, uinstr in enumerate(uinstructions, FETCH_CYCLES):
+        if uinstr.halt:
+            # The u-sequencer still moves forward on the halting step, then stops
+            return step + 1
+    # The u-sequencer always goes through every step, even if it has nothing to do
+    return SAP1.uINSTRUCTIONS_PER_INSTRUCTION
+
+
+def opcode_microcode(opcode: int) -> list[microcode.uInstr]:
+    """Microcode for an opcode value. Unassigned opcodes have none (like NOP)"""
+    try:
+        return microcode.OPCODES[Mnemonic(opcode)]
+    except ValueError:
+        return []
+
+
+# Cycles per opcode value
+CYCLES: list[int] = [
+    instruction_cycles(opcode_microcode(opcode))
+    for opcode in range(1 << (DATA_BUS_WIDTH - ADDRESS_BUS_WIDTH))
+]
+
+_LDA = Mnemonic.LDA.value
+_ADD = Mnemonic.ADD.value
+_SUB = Mnemonic.SUB.value
+_STA = Mnemonic.STA.value
+_LDI = Mnemonic.LDI.value
+_JMP = Mnemonic.JMP.value
+_JC = Mnemonic.JC.value
+_JZ = Mnemonic.JZ.value
+_OUT = Mnemonic.OUT.value
+_HLT = Mnemonic.HLT.value
+
+
+@dataclass
+class State:
+    """Architectural state of a SAP-1, between instructions"""
+
+    ram: bytearray = field(default_factory=lambda: bytearray(RAM_SIZE))
+    a: int = 0
+    b: int = 0
+    pc: int = 0
+    mar: int = 0
+    ir: int = 0
+    out: int = 0
+    carry_flag: int = 0
+    zero_flag: int = 0
+    halted: bool = False
+
+    @classmethod
+    def from_program(cls, program: Sequence[int]) -> State:
+        """Initial state after reset, with the program loaded (and 0-padded) in RAM"""
+        assert len(program) <= RAM_SIZE, "Program does not fit in RAM"
+        ram = bytearray(RAM_SIZE)
+        ram[: len(program)] = bytes(v & DATA_MASK for v in program)
+        return cls(ram)
+
+    def copy(self) -> State:
+        return State(
+            bytearray(self.ram),
+            self.a,
+            self.b,
+            self.pc,
+            self.mar,
+            self.ir,
+            self.out,
+            self.carry_flag,
+            self.zero_flag,
+            self.halted,
+        )
+
+    def key(self) -> tuple:
+        """
+        Hashable snapshot of the complete state. Between instructions the u-sequencer
+        is 0, or just after the halting step, so it's determined by this too.
+        """
+        return (
+            bytes(self.ram),
+            self.a,
+            self.b,
+            self.pc,
+            self.mar,
+            self.ir,
+            self.out,
+            self.carry_flag,
+            self.zero_flag,
+            self.halted,
+        )
+
+
+@dataclass
+class RunResult:
+    outputs: list[int]  # Values written to the output register, in order
+    state: State  # Final state
+    instructions: int  # Instructions executed (including the HLT, if any)
+    cycles: int  # Hardware clock cycles, from the start until halted (or stopped)
+
+    @property
+    def halted(self) -> bool:
+        return self.state.halted
+
+
+def run(
+    machine: State | Sequence[int], max_instructions: int = MAX_INSTRUCTIONS
+) -> RunResult:
+    """
+    Run a program until it halts or max_instructions are executed.
+
+    `machine` is either a program (which is loaded in a fresh machine) or a State, which
+    is updated in place.
+    """
+    state = machine if isinstance(machine, State) else State.from_program(machine)
+
+    # Everything is kept in locals in the loop; this is several times faster than
+    # going through the state attributes.
+    ram = state.ram
+    a, b, pc, mar, ir, out = state.a, state.b, state.pc, state.mar, state.ir, state.out
+    carry, zero, halted = state.carry_flag, state.zero_flag, state.halted
+    cycles_table = CYCLES
+    outputs: list[int] = []
+    cycles = 0
+    executed = 0
+
+    while not halted and executed < max_instructions:
+        # Fetch
+        mar = pc
+        ir = ram[pc]
+        pc = (pc + 1) & ADDRESS_MASK
+        opcode = ir >> ADDRESS_BUS_WIDTH
+        operand = ir & ADDRESS_MASK
+        executed += 1
+        cycles += cycles_table[opcode]
+
+        # Decode and execute
+        if opcode == _LDA:
+            mar = operand
+            a = ram[operand]
+        elif opcode == _ADD:
+            mar = operand
+            b = ram[operand]
+            result = a + b
+            carry = result >> DATA_BUS_WIDTH
+            a = result & DATA_MASK
+            zero = int(a == 0)
+        elif opcode == _SUB:
+            mar = operand
+            b = ram[operand]
+            result = a + (b ^ DATA_MASK) + 1
+            carry = result >> DATA_BUS_WIDTH
+            a = result & DATA_MASK
+            zero = int(a == 0)
+        elif opcode == _STA:
+            mar = operand
+            ram[operand] = a
+        elif opcode == _LDI:
+            a = operand
+        elif opcode == _JMP:
+            pc = operand
+        elif opcode == _JC:
+            if carry:
+                pc = operand
+        elif opcode == _JZ:
+            if zero:
+                pc = operand
+        elif opcode == _OUT:
+            out = a
+            outputs.append(a)
+        elif opcode == _HLT:
+            halted = True
+        # Anything else (NOP, unassigned opcodes) does nothing
+
+    state.a, state.b, state.pc, state.mar, state.ir, state.out = a, b, pc, mar, ir, out
+    state.carry_flag, state.zero_flag, state.halted = carry, zero, halted
+    return RunResult(outputs, state, executed, cycles)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Usage: python -m sap1.model.interpreter 14 25 e0 f0 1c 0e
+    result = run([int(v, 16) for v in sys.argv[1:]])
+    print("Output:", *result.outputs)
+    print(f"{'Halted' if result.halted else 'Stopped'} after", end=" ")
+    print(f"{result.instructions} instructions, {result.cycles} cycles")
+    print(result.state)
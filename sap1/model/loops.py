@@ -0,0 +1,136 @@
+"""
+Loop detection for programs that never halt.
+
+The complete machine state is hashed at every instruction boundary. As the state is
+finite (and execution deterministic), a program that doesn't halt eventually repeats a
+state, and from then on it repeats the same sequence of states forever. Once that cycle
+is known, the state (and outputs, and clock count) at any point in the future can be
+computed without simulating every period.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Sequence
+
+from . import interpreter
+from .interpreter import MAX_INSTRUCTIONS, RunResult, State
+
+
+@dataclass
+class Loop:
+    initial: State
+    # Everything executed before entering the loop for the first time
+    prefix_instructions: int
+    prefix_cycles: int
+    prefix_outputs: list[int]
+    # State at the start of the loop, and one full period of it
+    entry: State
+    period_instructions: int
+    period_cycles: int
+    period_outputs: list[int]
+
+    def _run(self, instructions: int) -> RunResult:
+        """Run from the closest known state. Result counts are from that state"""
+        if instructions <= self.prefix_instructions:
+            return interpreter.run(self.initial.copy(), instructions)
+        remaining = (instructions - self.prefix_instructions) % self.period_instructions
+        return interpreter.run(self.entry.copy(), remaining)
+
+    def _periods(self, instructions: int) -> int:
+        """Complete periods executed in the first `instructions`"""
+        if instructions <= self.prefix_instructions:
+            return 0
+        return (instructions - self.prefix_instructions) // self.period_instructions
+
+    def state_at(self, instructions: int) -> State:
+        """State after executing the given number of instructions"""
+        return self._run(instructions).state
+
+    def cycles_at(self, instructions: int) -> int:
+        """Clock cycles spent in the given number of instructions"""
+        partial = self._run(instructions).cycles
+        if instructions <= self.prefix_instructions:
+            return partial
+        periods = self._periods(instructions)
+        return self.prefix_cycles + periods * self.period_cycles + partial
+
+    def output_count(self, instructions: int) -> int:
+        """Number of OUT instructions executed in the given number of instructions"""
+        partial = len(self._run(instructions).outputs)
+        if instructions <= self.prefix_instructions:
+            return partial
+        periods = self._periods(instructions)
+        return len(self.prefix_outputs) + periods * len(self.period_outputs) + partial
+
+    def output(self, index: int) -> int:
+        """The index-th value sent to the output register (0-based)"""
+        if index < len(self.prefix_outputs):
+            return self.prefix_outputs[index]
+        if not self.period_outputs:
+            raise IndexError("Output index out of range")
+        index -= len(self.prefix_outputs)
+        return self.period_outputs[index % len(self.period_outputs)]
+
+    def outputs(self, count: int) -> list[int]:
+        """The first `count` values sent to the output register"""
+        return [self.output(index) for index in range(count)]
+
+
+def find_loop(
+    machine: State | Sequence[int], max_instructions: int = MAX_INSTRUCTIONS
+) -> Loop | None:
+    """
+    Run a program until its state repeats. Returns None if it halts, or if there's no
+    repetition within max_instructions. The argument is not modified.
+    """
+    if isinstance(machine, State):
+        initial = machine.copy()
+    else:
+        initial = State.from_program(machine)
+    state = initial.copy()
+
+    # state -> (instructions, cycles, number of outputs) when first seen
+    seen: dict[tuple, tuple[int, int, int]] = {}
+    outputs: list[int] = []
+    instructions = cycles = 0
+
+    while not state.halted and instructions <= max_instructions:
+        key = state.key()
+        if key in seen:
+            first_instructions, first_cycles, first_outputs = seen[key]
+            return Loop(
+                initial=initial,
+                prefix_instructions=first_instructions,
+                prefix_cycles=first_cycles,
+                prefix_outputs=outputs[:first_outputs],
+                entry=state,
+                period_instructions=instructions - first_instructions,
+                period_cycles=cycles - first_cycles,
+                period_outputs=outputs[first_outputs:],
+            )
+        seen[key] = (instructions, cycles, len(outputs))
+
+        result = interpreter.run(state, 1)
+        instructions += 1
+        cycles += result.cycles
+        outputs += result.outputs
+
+    return None
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Usage: python -m sap1.model.loops 51 4e 50 e0 2e 4f 1e 4d 1f 4e 1d 70 63
+    loop = find_loop([int(v, 16) for v in sys.argv[1:]])
+    if loop is None:
+        print("No loop found")
+    else:
+        print(f"Loop entered after {loop.prefix_instructions} instructions", end=" ")
+        print(f"({loop.prefix_cycles} cycles), outputs", *loop.prefix_outputs)
+        print(f"Period: {loop.period_instructions} instructions", end=" ")
+        print(f"({loop.period_cycles} cycles), outputs", *loop.period_outputs)
+        far = 10**12
+        print(f"After {far} instructions ({loop.cycles_at(far)} cycles):")
+        print(loop.state_at(far))
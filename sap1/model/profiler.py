@@ -0,0 +1,179 @@
+"""
+Profiler for SAP-1 programs.
+
+Runs a program in the reference interpreter one instruction at a time, and accounts
+executions and clock cycles to the address each instruction was fetched from and to its
+mnemonic. Taken jumps backwards (to the same or a lower address) are loop back-edges;
+the loops are reported with their iteration count and the cycles spent in their body.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Sequence
+
+from ..core.microcode import Mnemonic
+from . import interpreter
+from .interpreter import (
+    ADDRESS_BUS_WIDTH,
+    ADDRESS_MASK,
+    CYCLES,
+    MAX_INSTRUCTIONS,
+    RAM_SIZE,
+    State,
+)
+
+# Instructions that use their operand
+WITH_OPERAND = {
+    Mnemonic.LDA,
+    Mnemonic.ADD,
+    Mnemonic.SUB,
+    Mnemonic.STA,
+    Mnemonic.LDI,
+    Mnemonic.JMP,
+    Mnemonic.JC,
+    Mnemonic.JZ,
+}
+
+
+def mnemonic_name(opcode: int) -> str:
+    """Name of the opcode. Unassigned ones (which behave like NOP) are shown as ?N"""
+    try:
+        return Mnemonic(opcode).name
+    except ValueError:
+        return f"?{opcode:X}"
+
+
+def disassemble(byte: int) -> str:
+    opcode, operand = byte >> ADDRESS_BUS_WIDTH, byte & ADDRESS_MASK
+    name = mnemonic_name(opcode)
+    if opcode in {mnemonic.value for mnemonic in WITH_OPERAND}:
+        return f"{name} {operand:x}"
+    return name
+
+
+@dataclass
+class HotLoop:
+    head: int  # Target of the back-edge
+    tail: int  # Address of the jump
+    iterations: int = 0  # Times the back-edge was taken
+    cycles: int = 0  # Spent at addresses from head to tail (inclusive)
+
+    def __contains__(self, address: int) -> bool:
+        return self.head <= address <= self.tail
+
+
+@dataclass
+class Profile:
+    ram: bytes  # Initial RAM contents
+    executions: list[int] = field(default_factory=lambda: [0] * RAM_SIZE)
+    cycles: list[int] = field(default_factory=lambda: [0] * RAM_SIZE)
+    # Last instruction fetched from every address (it can differ from ram when the
+    # program modifies itself)
+    code: dict[int, int] = field(default_factory=dict)
+    mnemonic_executions: Counter[str] = field(default_factory=Counter)
+    mnemonic_cycles: Counter[str] = field(default_factory=Counter)
+    loops: dict[tuple[int, int], HotLoop] = field(default_factory=dict)
+    halted: bool = False
+
+    @property
+    def instructions(self) -> int:
+        return sum(self.executions)
+
+    @property
+    def total_cycles(self) -> int:
+        return sum(self.cycles)
+
+    @property
+    def cpi(self) -> float:
+        return self.total_cycles / self.instructions if self.instructions else 0.0
+
+    def hot_loops(self) -> list[HotLoop]:
+        """Loops, by decreasing cycles spent in them"""
+        return sorted(self.loops.values(), key=lambda loop: -loop.cycles)
+
+    def report(self) -> str:
+        total = self.total_cycles or 1
+        lines = ["Addr  Byte  Instruction  Executions  Cycles      %"]
+        for address in range(RAM_SIZE):
+            if not self.executions[address]:
+                continue
+            byte = self.code[address]
+            lines.append(
+                f"{address:4x}  {byte:02x}    {disassemble(byte):11}"
+                f"  {self.executions[address]:10}  {self.cycles[address]:6}"
+                f"  {100 * self.cycles[address] / total:5.1f}"
+            )
+        lines += ["", "Mnemonic  Executions  Cycles      %"]
+        for name, cycles in self.mnemonic_cycles.most_common():
+            lines.append(
+                f"{name:8}  {self.mnemonic_executions[name]:10}  {cycles:6}"
+                f"  {100 * cycles / total:5.1f}"
+            )
+        if self.loops:
+            lines += ["", "Hot loops"]
+            for loop in self.hot_loops():
+                lines.append(
+                    f"  {loop.head:x}..{loop.tail:x}: {loop.iterations} iterations,"
+                    f" {loop.cycles} cycles ({100 * loop.cycles / total:.1f}%)"
+                )
+        lines += [
+            "",
+            f"{'Halted' if self.halted else 'Stopped'} after {self.instructions}"
+            f" instructions, {self.total_cycles} cycles. CPI: {self.cpi:.2f}",
+        ]
+        return "\n".join(lines)
+
+
+def profile(
+    machine: State | Sequence[int], max_instructions: int = MAX_INSTRUCTIONS
+) -> Profile:
+    """Profile a program (or a State, which is updated in place)"""
+    state = machine if isinstance(machine, State) else State.from_program(machine)
+    result = Profile(bytes(state.ram), halted=state.halted)
+
+    for _ in range(max_instructions):
+        if state.halted:
+            break
+        address = state.pc
+        byte = state.ram[address]
+        opcode = byte >> ADDRESS_BUS_WIDTH
+        # Jumps don't change the flags. Falling through at the last address wraps
+        # around to 0, so PC after the step doesn't tell whether the jump was taken
+        taken = (
+            opcode == Mnemonic.JMP.value
+            or (opcode == Mnemonic.JC.value and bool(state.carry_flag))
+            or (opcode == Mnemonic.JZ.value and bool(state.zero_flag))
+        )
+        interpreter.run(state, 1)
+
+        cycles = CYCLES[opcode]
+        name = mnemonic_name(opcode)
+        result.executions[address] += 1
+        result.cycles[address] += cycles
+        result.code[address] = byte
+        result.mnemonic_executions[name] += 1
+        result.mnemonic_cycles[name] += cycles
+
+        target = byte & ADDRESS_MASK
+        if taken and target <= address:
+            loop = result.loops.setdefault((target, address), HotLoop(target, address))
+            loop.iterations += 1
+
+    result.halted = state.halted
+    for loop in result.loops.values():
+        loop.cycles = sum(
+            result.cycles[address] for address in range(loop.head, loop.tail + 1)
+        )
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+
+    from ..workloads import MULTIPLY_PROG
+
+    # Usage: python -m sap1.model.profiler [program bytes in hex]
+    program = [int(v, 16) for v in sys.argv[1:]] or MULTIPLY_PROG
+    print(profile(program).report())
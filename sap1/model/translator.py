@@ -0,0 +1,262 @@
+"""
+Basic-block translator: runs SAP-1 programs by compiling them into Python functions.
+
+Straight-line runs of instructions (up to and including the next conditional jump or
+HLT, following unconditional jumps) are decoded once and turned into the source of a
+Python function, which is compiled and cached. Running a program then means chaining
+calls to these cached blocks, which is much faster than decoding every instruction
+every time (see `interpreter.run`).
+
+Translated code depends on the instruction bytes, so blocks are cached by (address,
+bytes). A block that stores into its own (not yet executed) code ends right after the
+store, and after every block any other block whose bytes were overwritten is dropped, so
+self-modifying programs behave as in the hardware.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable, Sequence
+
+from ..core.microcode import Mnemonic
+from . import interpreter
+from .interpreter import (
+    ADDRESS_BUS_WIDTH,
+    ADDRESS_MASK,
+    CYCLES,
+    DATA_BUS_WIDTH,
+    DATA_MASK,
+    MAX_INSTRUCTIONS,
+    RAM_SIZE,
+    RunResult,
+    State,
+)
+
+CONDITIONAL_JUMPS = {Mnemonic.JC.value, Mnemonic.JZ.value}
+ALU = {Mnemonic.ADD.value, Mnemonic.SUB.value}
+
+# Signature of translated blocks:
+#   block(ram, outputs, a, b, carry, zero, out) -> (pc, a, b, carry, zero, out)
+BlockFunction = Callable[..., tuple[int, int, int, int, int, int]]
+
+
+@dataclass(slots=True)
+class Block:
+    start: int
+    code: dict[int, int]  # address -> instruction byte, for every instruction
+    writes: frozenset[int]  # Addresses that STA instructions in the block write to
+    function: BlockFunction
+    source: str  # Generated Python code, for debugging
+    # Static effects of running the whole block
+    instructions: int
+    cycles: int
+    mar: int
+    ir: int
+    halts: bool
+
+
+def decode_block(ram: Sequence[int], start: int) -> list[tuple[int, int]]:
+    """
+    (address, byte) of the instructions in the block starting at `start`. Unconditional
+    jumps don't end the block; decoding follows them unless they go back into it.
+    """
+    instructions: list[tuple[int, int]] = []
+    decoded: set[int] = set()
+    address = start
+    while True:
+        byte = ram[address]
+        instructions.append((address, byte))
+        decoded.add(address)
+        opcode = byte >> ADDRESS_BUS_WIDTH
+        if opcode == Mnemonic.JMP.value:
+            address = byte & ADDRESS_MASK
+        else:
+            address = (address + 1) & ADDRESS_MASK
+        if opcode in CONDITIONAL_JUMPS or opcode == Mnemonic.HLT.value:
+            break
+        if address in decoded:
+            break
+
+    # Stores into code that still has to run in this block end the block
+    for idx, (_, byte) in enumerate(instructions):
+        if byte >> ADDRESS_BUS_WIDTH == Mnemonic.STA.value and (
+            byte & ADDRESS_MASK in {address for address, _ in instructions[idx + 1 :]}
+        ):
+            return instructions[: idx + 1]
+    return instructions
+
+
+def generate_source(name: str, instructions: list[tuple[int, int]]) -> str:
+    """Python source of a function running the given instructions"""
+    lines = [f"def {name}(ram, outputs, a, b, carry, zero, out):"]
+    # Only the flags of the last ALU operation can be observed (jumps end the block)
+    alu_indexes = [
+        idx
+        for idx, (_, byte) in enumerate(instructions)
+        if byte >> ADDRESS_BUS_WIDTH in ALU
+    ]
+    last_alu = alu_indexes[-1] if alu_indexes else None
+
+    for idx, (address, byte) in enumerate(instructions):
+        opcode, operand = byte >> ADDRESS_BUS_WIDTH, byte & ADDRESS_MASK
+        next_pc: int | str = (address + 1) & ADDRESS_MASK
+        lines.append(f"    # {address:x}: {byte:02x}")
+        match opcode:
+            case Mnemonic.LDA.value:
+                lines.append(f"    a = ram[{operand}]")
+            case Mnemonic.ADD.value | Mnemonic.SUB.value:
+                lines.append(f"    b = ram[{operand}]")
+                if opcode == Mnemonic.ADD.value:
+                    lines.append("    result = a + b")
+                else:
+                    lines.append(f"    result = a + (b ^ {DATA_MASK}) + 1")
+                lines.append(f"    a = result & {DATA_MASK}")
+                if idx == last_alu:
+                    lines.append(f"    carry = result >> {DATA_BUS_WIDTH}")
+                    lines.append("    zero = 0 if a else 1")
+            case Mnemonic.STA.value:
+                lines.append(f"    ram[{operand}] = a")
+            case Mnemonic.LDI.value:
+                lines.append(f"    a = {operand}")
+            case Mnemonic.JMP.value:
+                next_pc = operand
+            case Mnemonic.JC.value:
+                next_pc = f"{operand} if carry else {next_pc}"
+            case Mnemonic.JZ.value:
+                next_pc = f"{operand} if zero else {next_pc}"
+            case Mnemonic.OUT.value:
+                lines.append("    out = a")
+                lines.append("    outputs.append(a)")
+            case _:
+                pass  # NOP, HLT and unassigned opcodes
+
+    # next_pc is the one of the last instruction
+    lines.append(f"    return {next_pc}, a, b, carry, zero, out")
+    return "\n".join(lines) + "\n"
+
+
+def end_mar(instructions: list[tuple[int, int]]) -> int:
+    """MAR after running the block: operand of a memory instruction, or fetch address"""
+    address, byte = instructions[-1]
+    opcode, operand = byte >> ADDRESS_BUS_WIDTH, byte & ADDRESS_MASK
+    if opcode in ALU or opcode in (Mnemonic.LDA.value, Mnemonic.STA.value):
+        return operand
+    return address
+
+
+class Translator:
+    """
+    Runs programs through translated blocks. Translations are kept between runs, so
+    running many programs (or the same one many times) with one Translator is cheaper.
+    """
+
+    def __init__(self) -> None:
+        self.cache: dict[tuple[int, bytes], Block] = {}
+
+    def translate(self, ram: Sequence[int], start: int) -> Block:
+        instructions = decode_block(ram, start)
+        key = (start, bytes(byte for _, byte in instructions))
+        if key in self.cache:
+            return self.cache[key]
+
+        name = f"block_{start:x}_{key[1].hex()}"
+        source = generate_source(name, instructions)
+        namespace: dict[str, BlockFunction] = {}
+        exec(compile(source, f"<sap1 {name}>", "exec"), namespace)
+
+        last_address, last_byte = instructions[-1]
+        block = self.cache[key] = Block(
+            start=start,
+            code=dict(instructions),
+            writes=frozenset(
+                byte & ADDRESS_MASK
+                for _, byte in instructions
+                if byte >> ADDRESS_BUS_WIDTH == Mnemonic.STA.value
+            ),
+            function=namespace[name],
+            source=source,
+            instructions=len(instructions),
+            cycles=sum(CYCLES[byte >> ADDRESS_BUS_WIDTH] for _, byte in instructions),
+            mar=end_mar(instructions),
+            ir=last_byte,
+            halts=last_byte >> ADDRESS_BUS_WIDTH == Mnemonic.HLT.value,
+        )
+        return block
+
+    def run(
+        self, machine: State | Sequence[int], max_instructions: int = MAX_INSTRUCTIONS
+    ) -> RunResult:
+        """Same as interpreter.run(), using translated blocks"""
+        state = machine if isinstance(machine, State) else State.from_program(machine)
+
+        ram = state.ram
+        a, b, pc, out = state.a, state.b, state.pc, state.out
+        carry, zero = state.carry_flag, state.zero_flag
+        outputs: list[int] = []
+        executed = cycles = 0
+
+        # Blocks for the current RAM contents, by start address
+        live: dict[int, Block] = {}
+        # Live blocks that include each address
+        covering: list[list[Block]] = [[] for _ in range(RAM_SIZE)]
+
+        halted = state.halted
+        last: Block | None = None
+        while not halted:
+            block = live.get(pc)
+            if block is None:
+                block = live[pc] = self.translate(ram, pc)
+                for address in block.code:
+                    covering[address].append(block)
+            if executed + block.instructions > max_instructions:
+                break
+
+            pc, a, b, carry, zero, out = block.function(
+                ram, outputs, a, b, carry, zero, out
+            )
+            executed += block.instructions
+            cycles += block.cycles
+            halted = block.halts
+            last = block
+
+            # Drop blocks with code that has been overwritten
+            for address in block.writes:
+                for other in list(covering[address]):
+                    if other.code[address] != ram[address]:
+                        del live[other.start]
+                        for other_address in other.code:
+                            covering[other_address].remove(other)
+
+        state.a, state.b, state.pc, state.out = a, b, pc, out
+        state.carry_flag, state.zero_flag, state.halted = carry, zero, halted
+        if last is not None:
+            state.mar, state.ir = last.mar, last.ir
+
+        if not state.halted and executed < max_instructions:
+            # The instruction budget ends in the middle of a block
+            tail = interpreter.run(state, max_instructions - executed)
+            outputs += tail.outputs
+            executed += tail.instructions
+            cycles += tail.cycles
+
+        return RunResult(outputs, state, executed, cycles)
+
+
+def run(
+    machine: State | Sequence[int], max_instructions: int = MAX_INSTRUCTIONS
+) -> RunResult:
+    """Run a program with a new Translator (see Translator.run)"""
+    return Translator().run(machine, max_instructions)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Usage: python -m sap1.model.translator 14 25 e0 f0 1c 0e
+    translator = Translator()
+    result = translator.run([int(v, 16) for v in sys.argv[1:]])
+    for block in translator.cache.values():
+        print(block.source)
+    print("Output:", *result.outputs)
+    print(f"{'Halted' if result.halted else 'Stopped'} after", end=" ")
+    print(f"{result.instructions} instructions, {result.cycles} cycles")
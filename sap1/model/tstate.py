@@ -0,0 +1,332 @@
+"""
+Cycle-accurate software model of the SAP-1, generated from the microcode tables.
+
+Every clock cycle is modelled like the hardware does: the control signals for the current
+(opcode, u-sequencer step) are decoded from `microcode.OPCODES` (resolving the
+`conditional` variants with the current flags), the bus value is computed from the
+selected source, and then every destination, the ALU flags, the PC counter, the halt
+flip-flop and the u-sequencer are updated together, as in a clock edge.
+
+`lockstep()` runs this model next to the Amaranth SAP1 and compares them every cycle.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Sequence
+
+from ..core import microcode
+from ..core.sap1 import SAP1
+from .interpreter import (
+    ADDRESS_BUS_WIDTH,
+    ADDRESS_MASK,
+    CYCLES,
+    DATA_BUS_WIDTH,
+    DATA_MASK,
+    RAM_SIZE,
+    State,
+    opcode_microcode,
+)
+
+# Bus ports of SAP1.data_bus
+BUS_SOURCES = ("a", "pc", "instruction", "memory", "alu", "input")
+BUS_DESTINATIONS = ("a", "pc", "instruction", "memory", "b", "memory_address", "output")
+
+# The fixed control of the first steps (see "FIXED CONTROL" in SAP1.elaborate)
+FETCH = [
+    microcode.uInstr(dst="memory_address", src="pc"),
+    microcode.uInstr(dst="instruction", src="memory", count=True),
+]
+STEPS = SAP1.uINSTRUCTIONS_PER_INSTRUCTION
+
+
+@dataclass(frozen=True)
+class ControlWord:
+    """Effective control signals for one cycle (after resolving conditionals)"""
+
+    src: str | None = None
+    dst: frozenset[str] = frozenset()
+    subtract: bool = False
+    update_flags: bool = False
+    count: bool = False
+    halt: bool = False
+
+
+def resolve(uinstr: microcode.uInstr, carry_flag: int, zero_flag: int) -> ControlWord:
+    """The control word generated for uinstr, given the current flags"""
+    flags = {"carry_flag": carry_flag, "zero_flag": zero_flag}
+    word = ControlWord(
+        uinstr.src,
+        frozenset(uinstr.dst.split()),
+        uinstr.subtract,
+        uinstr.update_flags,
+        uinstr.count,
+        uinstr.halt,
+    )
+    for (flag, value), variant in (uinstr.conditional or {}).items():
+        if flags[flag] == value:
+            # A matching variant overrides all the combinational signals, but the halt
+            # flip-flop is set if any of them says so
+            override = resolve(variant, carry_flag, zero_flag)
+            word = ControlWord(
+                override.src,
+                override.dst,
+                override.subtract,
+                override.update_flags,
+                override.count,
+                word.halt or override.halt,
+            )
+    return word
+
+
+def generate_table() -> list[ControlWord]:
+    """
+    Control words for every (opcode, step, carry, zero), flattened (see `table_index`).
+    Steps without microcode get an empty control word, like in the hardware.
+    """
+    table = []
+    for opcode in range(1 << (DATA_BUS_WIDTH - ADDRESS_BUS_WIDTH)):
+        uinstructions = FETCH + opcode_microcode(opcode)
+        assert len(uinstructions) <= STEPS
+        for step in range(STEPS):
+            if step < len(uinstructions):
+                uinstr = uinstructions[step]
+            else:
+                uinstr = microcode.uInstr()
+            for carry in (0, 1):
+                for zero in (0, 1):
+                    table.append(resolve(uinstr, carry, zero))
+    return table
+
+
+def table_index(opcode: int, step: int, carry_flag: int, zero_flag: int) -> int:
+    return ((opcode * STEPS + step) * 2 + carry_flag) * 2 + zero_flag
+
+
+CONTROL_TABLE = generate_table()
+
+
+class CycleModel:
+    """
+    State of the SAP-1 at the register level, advanced one clock cycle at a time.
+
+    `evaluate()` computes the combinational values for the current cycle (control word,
+    ALU output, bus value); `clock()` applies them like a rising clock edge.
+    """
+
+    def __init__(self, program: Sequence[int] = (), input_switches: int = 0) -> None:
+        state = State.from_program(program)
+        self.ram = state.ram
+        self.a = self.b = self.pc = self.mar = self.ir = self.out = 0
+        self.carry_flag = self.zero_flag = 0
+        self.halted = 0
+        self.u_sequencer = 0
+        self.input_switches = input_switches
+        self.cycles = 0
+        self.outputs: list[int] = []
+        self.evaluate()
+
+    @classmethod
+    def from_state(cls, state: State) -> CycleModel:
+        """Model at the start of an instruction, with the given architectural state"""
+        model = cls()
+        model.ram = bytearray(state.ram)
+        model.a, model.b, model.pc = state.a, state.b, state.pc
+        model.mar, model.ir, model.out = state.mar, state.ir, state.out
+        model.carry_flag, model.zero_flag = state.carry_flag, state.zero_flag
+        model.halted = int(state.halted)
+        # A halted CPU stops right after the halting step
+        if state.halted:
+            model.u_sequencer = CYCLES[state.ir >> ADDRESS_BUS_WIDTH] % STEPS
+        model.evaluate()
+        return model
+
+    def to_state(self) -> State:
+        return State(
+            bytearray(self.ram),
+            self.a,
+            self.b,
+            self.pc,
+            self.mar,
+            self.ir,
+            self.out,
+            self.carry_flag,
+            self.zero_flag,
+            bool(self.halted),
+        )
+
+    def evaluate(self) -> None:
+        opcode = self.ir >> ADDRESS_BUS_WIDTH
+        self.control = control = CONTROL_TABLE[
+            table_index(opcode, self.u_sequencer, self.carry_flag, self.zero_flag)
+        ]
+
+        port_b = self.b ^ DATA_MASK if control.subtract else self.b
+        self.alu_result = self.a + port_b + control.subtract
+
+        match control.src:
+            case "a":
+                self.bus_value = self.a
+            case "pc":
+                self.bus_value = self.pc
+            case "instruction":
+                self.bus_value = self.ir & ADDRESS_MASK
+            case "memory":
+                self.bus_value = self.ram[self.mar]
+            case "alu":
+                self.bus_value = self.alu_result & DATA_MASK
+            case "input":
+                self.bus_value = self.input_switches
+            case None:
+                self.bus_value = 0
+            case _:
+                raise ValueError(f"Unknown bus input: {control.src}")
+
+    def clock(self) -> None:
+        control, bus = self.control, self.bus_value
+        dst = control.dst
+
+        # Memory is written at the address *before* the edge
+        if "memory" in dst:
+            self.ram[self.mar] = bus
+        if "a" in dst:
+            self.a = bus
+        if "b" in dst:
+            self.b = bus
+        if "instruction" in dst:
+            self.ir = bus
+        if "memory_address" in dst:
+            self.mar = bus & ADDRESS_MASK
+        if "output" in dst:
+            self.out = bus
+            self.outputs.append(bus)
+        if "pc" in dst:
+            self.pc = bus & ADDRESS_MASK
+        elif control.count:
+            self.pc = (self.pc + 1) & ADDRESS_MASK
+
+        if control.update_flags:
+            self.carry_flag = self.alu_result >> DATA_BUS_WIDTH
+            self.zero_flag = int(self.alu_result & DATA_MASK == 0)
+
+        if not self.halted:
+            self.u_sequencer = (self.u_sequencer + 1) % STEPS
+        if control.halt:
+            self.halted = 1
+
+        self.cycles += 1
+        self.evaluate()
+
+    def run(self, max_cycles: int) -> None:
+        """Clock until halted, or max_cycles have been executed"""
+        for _ in range(max_cycles):
+            if self.halted:
+                break
+            self.clock()
+
+    def registers(self) -> dict[str, int]:
+        return {
+            "a": self.a,
+            "b": self.b,
+            "pc": self.pc,
+            "mar": self.mar,
+            "ir": self.ir,
+            "out": self.out,
+            "carry_flag": self.carry_flag,
+            "zero_flag": self.zero_flag,
+            "halted": self.halted,
+            "u_sequencer": self.u_sequencer,
+        }
+
+
+@dataclass
+class Mismatch:
+    cycle: int
+    signal: str
+    model: int
+    hardware: int
+
+
+def lockstep(
+    program: Sequence[int], max_cycles: int, input_switches: int = 0
+) -> Mismatch | None:
+    """
+    Simulate SAP1(program) in Amaranth and the cycle model side by side, comparing
+    registers, RAM and control/bus signals on every cycle. Returns the first difference.
+    Stops when both are halted or after max_cycles.
+    """
+    from amaranth.sim import Simulator
+
+    sap1 = SAP1(program)
+    model = CycleModel(program, input_switches)
+    bus = sap1.data_bus
+    registers = {
+        "a": sap1.register_a.data_out,
+        "b": sap1.register_b.data_out,
+        "pc": sap1.program_counter.data_out,
+        "mar": sap1.memory_address_register.data_out,
+        "ir": sap1.instruction_register.full_value,
+        "out": sap1.output_register.data_out,
+        "carry_flag": sap1.alu.carry_flag,
+        "zero_flag": sap1.alu.zero_flag,
+        "halted": sap1.halted,
+        "u_sequencer": sap1.u_sequencer,
+    }
+    mismatches: list[Mismatch] = []
+
+    def compare(ctx, cycle: int) -> None:
+        expected = model.registers()
+        control = model.control
+        expected |= {
+            "bus_value": model.bus_value,
+            "update_flags": control.update_flags,
+            "count_enable": control.count,
+        }
+        actual = {name: ctx.get(signal) for name, signal in registers.items()} | {
+            "bus_value": ctx.get(bus.bus_value),
+            "update_flags": ctx.get(sap1.alu.update_flags),
+            "count_enable": ctx.get(sap1.program_counter.count_enable),
+        }
+        if control.update_flags:
+            # The ALU operation is only relevant when it's stored somewhere
+            expected["subtract"] = control.subtract
+            actual["subtract"] = ctx.get(sap1.alu.subtract)
+        for src in BUS_SOURCES:
+            expected[f"src_{src}"] = src == control.src
+            actual[f"src_{src}"] = ctx.get(bus.is_selected(src))
+        for dst in BUS_DESTINATIONS:
+            expected[f"dst_{dst}"] = dst in control.dst
+            actual[f"dst_{dst}"] = ctx.get(bus.is_writing(dst))
+        for address in range(RAM_SIZE):
+            expected[f"ram_{address:x}"] = model.ram[address]
+            actual[f"ram_{address:x}"] = ctx.get(sap1.memory.memory.data[address])
+
+        for name, value in expected.items():
+            if int(value) != actual[name]:
+                mismatches.append(Mismatch(cycle, name, int(value), actual[name]))
+                return
+
+    async def testbench(ctx):
+        ctx.set(sap1.input_switches, input_switches)
+        for cycle in range(max_cycles + 1):
+            compare(ctx, cycle)
+            if mismatches or (model.halted and ctx.get(sap1.halted)):
+                return
+            if cycle < max_cycles:
+                await ctx.tick()
+                model.clock()
+
+    sim = Simulator(sap1)
+    sim.add_clock(1e-6)
+    sim.add_testbench(testbench)
+    sim.run()
+    return mismatches[0] if mismatches else None
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Usage: python -m sap1.model.tstate 14 25 e0 f0 1c 0e
+    program = [int(v, 16) for v in sys.argv[1:]]
+    mismatch = lockstep(program, max_cycles=2000)
+    print(mismatch or "Model and hardware agree")
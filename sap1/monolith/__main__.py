@@ -9,15 +9,21 @@ from .monolith import (
 if __name__ == "__main__":
 
     if len(sys.argv) > 1 and sys.argv[1] == "synth":
-        from sap1.synth import SAP1_Nano
+        import argparse
 
-        platform = SAP1_Nano()
-        m.d.comb += platform.request("rout").o.eq(out_reg)
-        platform.build(
-            m,
-            do_program=False,
-            add_preferences='CLOCK_LOC "clk27_0__io" BUFG;',  # Put clock in global network
+        from sap1.toolchain.build import add_arguments, command
+
+        parser = argparse.ArgumentParser(
+            prog="python -m sap1.monolith synth", description="Build in build/"
         )
+        add_arguments(parser)
+        args = parser.parse_args(sys.argv[2:])
+
+        def make_top(platform):
+            m.d.comb += platform.request("rout").o.eq(out_reg)
+            return m
+
+        command(args, make_top, key=("sap1.monolith",), design="monolith")
     else:
         main(
             m,
@@ -3,6 +3,7 @@ from amaranth.lib import wiring
 from amaranth import Module, C
 
 from sap1.core.sap1 import SAP1
+from sap1.timing import HARDWARE, TimingProfile
 from fpga_io.led_panel import (
     LEDPanel,
     RAMPanel,
@@ -20,10 +21,20 @@ class SAP1Panel(wiring.Component):
     ctrl_dout: wiring.Out(1)
     bus_dout: wiring.Out(1)
 
-    def __init__(self, sap1: SAP1):
+    def __init__(self, sap1: SAP1, timing: TimingProfile = HARDWARE):
         self.sap1 = sap1
+        self.timing = timing
         super().__init__()
 
+    def led_panel(self) -> LEDPanel:
+        timing = self.timing
+        return LEDPanel(
+            t_high=timing.led_t_high,
+            t_data=timing.led_t_data,
+            t_low=timing.led_t_low,
+            t_wait=timing.led_t_wait,
+        )
+
     def elaborate(self, platform: Any) -> Module:
         m = Module()
         sap1 = self.sap1
@@ -56,7 +67,7 @@ class SAP1Panel(wiring.Component):
         )
 
         m.submodules.alu_sequence = alu_sequence
-        m.submodules.panel_alu = LEDPanel()
+        m.submodules.panel_alu = self.led_panel()
         m.d.comb += self.alu_dout.eq(m.submodules.panel_alu.dout)
         wiring.connect(m, alu_sequence.panel, m.submodules.panel_alu.source)
 
@@ -115,7 +126,7 @@ class SAP1Panel(wiring.Component):
             pc_widget,
         )
         m.submodules.control_sequence = control_sequence
-        m.submodules.panel_control = LEDPanel()
+        m.submodules.panel_control = self.led_panel()
         m.d.comb += self.ctrl_dout.eq(m.submodules.panel_control.dout)
         wiring.connect(m, control_sequence.panel, m.submodules.panel_control.source)
 
@@ -130,7 +141,7 @@ class SAP1Panel(wiring.Component):
             ram_widget,
             make_counter(m, (2, 2, 2), sap1.memory_address_register, flip=True),
         )
-        m.submodules.panel_ram = LEDPanel()
+        m.submodules.panel_ram = self.led_panel()
         m.d.comb += self.mem_dout.eq(m.submodules.panel_ram.dout)
         wiring.connect(m, m.submodules.memory_sequence.panel, m.submodules.panel_ram.source)
 
@@ -140,7 +151,7 @@ class SAP1Panel(wiring.Component):
             (0, 2, 0),
             sap1.data_bus.bus_value
         )
-        m.submodules.panel_bus = LEDPanel()
+        m.submodules.panel_bus = self.led_panel()
         m.d.comb += self.bus_dout.eq(m.submodules.panel_bus.dout)
         wiring.connect(m, bus_widget.panel, m.submodules.panel_bus.source)
 
@@ -0,0 +1,406 @@
+"""
+Board-level simulation of the `sap1.synth` design.
+
+The whole top (`make_top`: CPU, `ClockControl`, `ProgrammingControl`, `SwitchScanner`,
+`TangGlue` and `SAP1Panel`) is elaborated against a `MockPlatform`, whose resources are
+plain signals. The testbench models the switch matrix (pressing switches by their
+`TangGlue.LAYOUT` name), and decodes what the board sends to the outside world:
+
+- `WS2812Decoder` turns each LED panel `dout` line back into frames of RGB pixels,
+- `TM1637Decoder` turns the display scl/dio lines back into the digits shown.
+
+From those, `BoardResult` reports frame periods, bits per frame and, for every switch
+press, the latency until each panel and the display first show something they wouldn't
+have shown without it. `simulate_presses` runs the design once more per press, with only
+the earlier presses, to know what that is: periodic refreshes and the changes made by a
+running CPU are the same in both runs, so they aren't mistaken for the response.
+
+Use `timing.SIMULATION` (the default) to get results in a reasonable number of cycles.
+With `timing.HARDWARE` the cycle counts match the real board (at 27 MHz), but pysim
+needs millions of cycles for anything involving the switches.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Sequence
+
+from amaranth import Module, Signal
+from amaranth.build import Pins, ResourceError
+from amaranth.hdl import Fragment
+from amaranth.sim import Simulator
+
+from fpga_io.led_panel import LEDPanel
+from fpga_io.tm1637 import Seven_Segment_Decoder
+
+from ..synth import SAP1_Nano, TangGlue, make_top
+from ..timing import SIMULATION, SWITCHES, TimingProfile
+from ..workloads import MULTIPLY_PROG
+
+CLOCK_FREQUENCY = LEDPanel.CLKFREQ
+PANELS = ("panel_alu", "panel_ctrl", "panel_mem", "panel_bus")
+DISPLAY = "display"
+# Longer than the slowest frame period (the RAM panel) with the simulation timing
+PRESS_GAP = 20_000
+# Characters for the segment patterns the DecimalDecoder generates (blank digits are 0)
+SEGMENT_CHARACTERS = {
+    segments: character
+    for segments, character in zip(
+        Seven_Segment_Decoder.BCD_TO_SEGMENTS, "0123456789AbCdEF"
+    )
+} | {0: " "}
+
+
+class MockPlatform:
+    """
+    Stands in for SAP1_Nano. Every resource made of plain pins is a signal (`o` or `i`,
+    by direction), created upfront so the testbench can drive or observe it.
+    """
+
+    def __init__(self, resources=SAP1_Nano.resources) -> None:
+        self.ports: dict[tuple[str, int], Signal] = {}
+        for resource in resources:
+            (pins, *rest) = resource.ios
+            if rest or not isinstance(pins, Pins):
+                continue  # Subsignals (UART, flash) are not used by the design
+            direction = "i" if pins.dir == "i" else "o"
+            self.ports[(resource.name, resource.number)] = Signal(
+                len(pins.names), name=f"{resource.name}_{resource.number}__{direction}"
+            )
+        self.requested: set[tuple[str, int]] = set()
+
+    def request(self, name: str, number: int = 0) -> SimpleNamespace:
+        key = (name, number)
+        if key not in self.ports:
+            raise ResourceError(f"Resource {name}#{number} does not exist")
+        if key in self.requested:
+            raise ResourceError(f"Resource {name}#{number} has already been requested")
+        self.requested.add(key)
+        port = self.ports[key]
+        return SimpleNamespace(**{port.name[-1]: port})
+
+
+@dataclass
+class Frame:
+    cycle: int  # When the LEDs latched it (at the end of the reset period)
+    pixels: tuple[tuple[int, int, int], ...]  # (r, g, b)
+
+    @property
+    def bits(self) -> int:
+        return 24 * len(self.pixels)
+
+
+class WS2812Decoder:
+    """
+    Decodes a WS2812 data line, sampled every cycle.
+
+    A bit is 1 if its high pulse lasts more than one_threshold cycles. Pixels are 24 bits
+    (GRB, MSB first), and a frame is latched when the line stays low for reset_cycles.
+    """
+
+    def __init__(self, one_threshold: int, reset_cycles: int) -> None:
+        self.one_threshold = one_threshold
+        self.reset_cycles = reset_cycles
+        self.frames: list[Frame] = []
+        self._bits: list[int] = []
+        self._level = 0
+        self._edge = 0  # Cycle of the last level change
+
+    @classmethod
+    def for_timing(cls, timing: TimingProfile) -> WS2812Decoder:
+        # A 0 bit is high for (t_high + 1) cycles, a 1 bit for (t_data + 1) more
+        return cls(timing.led_t_high + 1, timing.led_t_wait)
+
+    def sample(self, cycle: int, level: int) -> None:
+        if level != self._level:
+            if not level:
+                self._bits.append(int(cycle - self._edge > self.one_threshold))
+            self._level = level
+            self._edge = cycle
+        elif not level and cycle - self._edge == self.reset_cycles and self._bits:
+            self._latch(cycle)
+
+    def _latch(self, cycle: int) -> None:
+        bits, self._bits = self._bits, []
+        pixels = []
+        for start in range(0, len(bits) - 23, 24):
+            value = int("".join(map(str, bits[start : start + 24])), 2)
+            g, r, b = value >> 16, value >> 8 & 0xFF, value & 0xFF
+            pixels.append((r, g, b))
+        self.frames.append(Frame(cycle, tuple(pixels)))
+
+
+@dataclass
+class DisplayUpdate:
+    cycle: int  # End (STOP) of the transfer that changed the digits
+    segments: bytes  # One byte per digit, from the left
+
+    @property
+    def text(self) -> str:
+        return "".join(SEGMENT_CHARACTERS.get(digit, "?") for digit in self.segments)
+
+
+class TM1637Decoder:
+    """
+    Decodes the TM1637 two-wire protocol, sampled every cycle.
+
+    Bytes are sent LSB first, each followed by an ACK clock; START and STOP are dio
+    falling and rising while scl is high. `updates` records every change to the digits
+    shown; `refreshes` counts every transfer of display data.
+    """
+
+    DIGITS = 4
+
+    def __init__(self) -> None:
+        self.segments = bytearray(self.DIGITS)
+        self.updates: list[DisplayUpdate] = []
+        self.refreshes: list[int] = []  # Cycles where display data was transferred
+        self.refresh_bits = 0  # Clocks in the last display data transfer
+        self.active = False
+        self.brightness = 0
+        self._bits: list[int] = []
+        self._scl = 0
+        self._dio = 0
+
+    def sample(self, cycle: int, scl: int, dio: int) -> None:
+        if scl and self._scl and dio != self._dio:
+            if dio:
+                self._stop(cycle)
+            self._bits = []  # START, or after a STOP
+        elif scl and not self._scl:
+            self._bits.append(dio)
+        self._scl, self._dio = scl, dio
+
+    def _stop(self, cycle: int) -> None:
+        # 9 clocks per byte: 8 data bits, then the ACK
+        data = [
+            sum(bit << idx for idx, bit in enumerate(self._bits[start : start + 8]))
+            for start in range(0, len(self._bits) - 8, 9)
+        ]
+        if not data:
+            return
+        command, payload = data[0], data[1:]
+        if command & 0xC0 == 0xC0:  # Address command, followed by the digits
+            address = command & 0x0F
+            for offset, segments in enumerate(payload):
+                if address + offset < self.DIGITS:
+                    self.segments[address + offset] = segments
+            self.refreshes.append(cycle)
+            self.refresh_bits = len(self._bits) - 1  # Not the clock rise of the STOP
+            if not self.updates or self.updates[-1].segments != self.segments:
+                self.updates.append(DisplayUpdate(cycle, bytes(self.segments)))
+        elif command & 0xC0 == 0x80:  # Display control
+            self.active = bool(command & 0x08)
+            self.brightness = command & 0x07
+
+
+@dataclass
+class Press:
+    cycle: int
+    switch: str  # Name in TangGlue.LAYOUT
+    duration: int | None = None  # Cycles held. By default, two full switch scans
+
+
+@dataclass
+class BoardResult:
+    timing: TimingProfile
+    cycles: int
+    frames: dict[str, list[Frame]]  # By panel
+    display: TM1637Decoder
+    presses: list[Press] = field(default_factory=list)
+    # Runs of the same length with only the presses before each press (presses[:idx])
+    baselines: list[BoardResult] = field(default_factory=list)
+
+    def _updates(self, channel: str) -> list[tuple[int, object]]:
+        """(cycle, content) of everything shown on a panel or the display"""
+        if channel == DISPLAY:
+            return [(update.cycle, update.segments) for update in self.display.updates]
+        return [(frame.cycle, frame.pixels) for frame in self.frames[channel]]
+
+    def frame_period(self, channel: str) -> float | None:
+        """Average cycles between frames (or display data transfers)"""
+        if channel == DISPLAY:
+            cycles = self.display.refreshes
+        else:
+            cycles = [frame.cycle for frame in self.frames[channel]]
+        if len(cycles) < 2:
+            return None
+        return (cycles[-1] - cycles[0]) / (len(cycles) - 1)
+
+    def latency(self, press: Press, channel: str) -> int | None:
+        """
+        Cycles from the press until the channel first shows something else than in the
+        baseline run without it. None if the press made no visible difference
+        """
+        if len(self.baselines) != len(self.presses):
+            raise ValueError("Latencies need the baseline runs (see simulate_presses)")
+        baseline = self.baselines[self.presses.index(press)]
+        updates, expected = self._updates(channel), baseline._updates(channel)
+        update_cycles = [cycle for cycle, _ in updates]
+        expected_cycles = [cycle for cycle, _ in expected]
+
+        def shown(contents: list[tuple[int, object]], cycles: list[int], cycle: int):
+            idx = bisect_right(cycles, cycle)
+            return contents[idx - 1][1] if idx else None
+
+        for cycle in sorted({*update_cycles, *expected_cycles}):
+            if cycle <= press.cycle:
+                continue
+            if shown(updates, update_cycles, cycle) != shown(
+                expected, expected_cycles, cycle
+            ):
+                return cycle - press.cycle
+        return None
+
+    def report(self) -> str:
+        def duration(cycles: float) -> str:
+            return f"{cycles:9.0f} cycles ({1e3 * cycles / CLOCK_FREQUENCY:8.3f} ms)"
+
+        lines = [
+            f"{self.cycles} cycles simulated, timing profile {self.timing.name!r}"
+            " (times at 27 MHz)",
+            "",
+            "Channel     Frames  Bits/frame      Frame period",
+        ]
+        for channel in (*PANELS, DISPLAY):
+            period = self.frame_period(channel)
+            if channel == DISPLAY:
+                count = len(self.display.refreshes)
+                bits = f"{self.display.refresh_bits:10}"
+            else:
+                frames = self.frames[channel]
+                count = len(frames)
+                bits = f"{frames[-1].bits:10}" if frames else f"{'-':>10}"
+            period_text = duration(period) if period else "-"
+            lines.append(f"{channel:10}  {count:6}  {bits}  {period_text}")
+        if self.display.updates:
+            shown = ", ".join(repr(update.text) for update in self.display.updates)
+            lines += ["", f"Display showed: {shown}"]
+        for press in self.presses if self.baselines else ():
+            lines += ["", f"Press {press.switch!r} at cycle {press.cycle}, latency to:"]
+            for channel in (*PANELS, DISPLAY):
+                latency = self.latency(press, channel)
+                text = duration(latency) if latency is not None else "no change"
+                lines.append(f"  {channel:10}  {text}")
+        return "\n".join(lines)
+
+
+class BoardSimulation:
+    """The synth top with a program, against a MockPlatform"""
+
+    def __init__(
+        self, program: Sequence[int] = MULTIPLY_PROG, timing: TimingProfile = SIMULATION
+    ) -> None:
+        self.timing = timing
+        self.platform = MockPlatform()
+        self.top = make_top(self.platform, list(program), timing)
+        self.switches = Signal(SWITCHES)  # Pressed switches
+
+        m = Module()
+        m.submodules.top = self.top
+        # The switch matrix: scan is low while the selected switch is pressed
+        select, scan = self.port("select"), self.port("scan")
+        m.d.comb += scan.eq(~self.switches.bit_select(select, 1))
+        self.fragment = Fragment.get(m, self.platform)
+
+    def port(self, name: str, number: int = 0) -> Signal:
+        return self.platform.ports[(name, number)]
+
+    def run(self, cycles: int, presses: Sequence[Press] = ()) -> BoardResult:
+        events: dict[int, list[tuple[int, int]]] = {}
+        for press in presses:
+            bit = TangGlue.LAYOUT[press.switch]
+            duration = press.duration or 2 * self.timing.scan_period
+            events.setdefault(press.cycle, []).append((bit, 1))
+            events.setdefault(press.cycle + duration, []).append((bit, 0))
+
+        panels = {name: WS2812Decoder.for_timing(self.timing) for name in PANELS}
+        display = TM1637Decoder()
+        douts = [(panels[name], self.port(name)) for name in PANELS]
+        scl, dio = self.port("display_clk"), self.port("display_dio")
+
+        async def testbench(ctx):
+            pressed = 0
+            for cycle in range(cycles):
+                for bit, value in events.get(cycle, ()):
+                    pressed = pressed | 1 << bit if value else pressed & ~(1 << bit)
+                    ctx.set(self.switches, pressed)
+                for decoder, dout in douts:
+                    decoder.sample(cycle, ctx.get(dout))
+                display.sample(cycle, ctx.get(scl), ctx.get(dio))
+                await ctx.tick()
+
+        sim = Simulator(self.fragment)
+        sim.add_clock(1 / CLOCK_FREQUENCY)
+        sim.add_testbench(testbench)
+        sim.run()
+        frames = {name: decoder.frames for name, decoder in panels.items()}
+        return BoardResult(self.timing, cycles, frames, display, list(presses))
+
+
+def simulate(
+    program: Sequence[int], timing: TimingProfile, cycles: int, presses: Sequence[Press]
+) -> BoardResult:
+    return BoardSimulation(program, timing).run(cycles, presses)
+
+
+def simulate_presses(
+    cycles: int,
+    presses: Sequence[Press],
+    program: Sequence[int] = MULTIPLY_PROG,
+    timing: TimingProfile = SIMULATION,
+    processes: int | None = None,
+) -> BoardResult:
+    """
+    Run with the presses, and with only the ones before each press (the baselines of
+    `BoardResult.latency`), across a process pool (every CPU by default)
+    """
+    runs = [list(presses[:idx]) for idx in range(len(presses) + 1)]
+    count = len(runs)
+    with ProcessPoolExecutor(processes) as pool:
+        *baselines, result = pool.map(
+            simulate, [program] * count, [timing] * count, [cycles] * count, runs
+        )
+    result.baselines = baselines
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from ..timing import PROFILES
+
+    parser = argparse.ArgumentParser(description="Simulate the whole board")
+    parser.add_argument("program", nargs="*", help="Program bytes in hex")
+    parser.add_argument("-c", "--cycles", type=int, help="Default: until after the presses")
+    parser.add_argument(
+        "-g",
+        "--gap",
+        type=int,
+        default=PRESS_GAP,
+        help="Cycles between presses (at least 4 switch scans)",
+    )
+    parser.add_argument("-t", "--timing", choices=PROFILES, default=SIMULATION.name)
+    parser.add_argument("-j", "--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    timing = PROFILES[args.timing]
+    program = [int(v, 16) for v in args.program] or MULTIPLY_PROG
+    # The CPU starts in single-step mode: step it twice with "slow", then run it at
+    # increasing speeds with "fast". Every press gets its own frame on every panel
+    gap = max(args.gap, 4 * timing.scan_period)
+    switches = ["slow", "slow", "fast", "fast"]
+    presses = [Press((1 + idx) * gap, switch) for idx, switch in enumerate(switches)]
+    cycles = args.cycles or (len(presses) + 2) * gap
+
+    start = time.perf_counter()
+    result = simulate_presses(cycles, presses, program, timing, args.processes)
+    elapsed = time.perf_counter() - start
+    print(result.report())
+    runs = len(presses) + 1  # With every press, and the baselines
+    print(f"\n{runs} runs simulated in {elapsed:.1f}s", end=" ")
+    print(f"({runs * cycles / elapsed:.0f} cycles/s)")
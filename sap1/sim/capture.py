@@ -0,0 +1,269 @@
+"""
+Triggered trace capture, in the style of a logic analyzer (ILA).
+
+Instead of dumping every signal on every cycle to a VCD file, a `TriggeredCapture`
+keeps the last `depth` cycles of a few probes in a ring buffer. When one of its triggers
+fires, it records `post_trigger` more cycles and then writes that window (only) to a
+VCD file. The cost per cycle is constant, no matter how long the run is.
+
+A capture is a `harness.Monitor`, so it can be passed to `Harness.run(monitors=...)`.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Protocol, Sequence
+
+from amaranth import Value
+
+from ..core.sap1 import SAP1
+from .harness import standard_probes
+
+TIMESCALE = "1 us"  # One cycle of the clock used by the harness
+DEPTH = 64
+POST_TRIGGER = 16
+
+
+class Trigger(Protocol):
+    """A condition on the probe values of one cycle"""
+
+    probes: tuple[str, ...]  # Names of the (standard) probes it needs
+
+    def fires(self, values: dict[str, int]) -> bool: ...
+
+
+@dataclass(frozen=True)
+class PCTrigger:
+    """Fetch of the instruction at address"""
+
+    address: int
+    probes = ("pc", "u_sequencer")
+
+    def fires(self, values: dict[str, int]) -> bool:
+        return values["u_sequencer"] == 0 and values["pc"] == self.address
+
+    def __str__(self) -> str:
+        return f"pc={self.address:x}"
+
+
+@dataclass(frozen=True)
+class RAMWriteTrigger:
+    """Write to a RAM address (any address if None)"""
+
+    address: int | None = None
+    probes = ("memory_write", "mar")
+
+    def fires(self, values: dict[str, int]) -> bool:
+        return bool(values["memory_write"]) and self.address in (None, values["mar"])
+
+    def __str__(self) -> str:
+        return "write" if self.address is None else f"write={self.address:x}"
+
+
+@dataclass(frozen=True)
+class HaltTrigger:
+    probes = ("halted",)
+
+    def fires(self, values: dict[str, int]) -> bool:
+        return bool(values["halted"])
+
+    def __str__(self) -> str:
+        return "halted"
+
+
+@dataclass(frozen=True)
+class BusValueTrigger:
+    value: int
+    probes = ("bus_value",)
+
+    def fires(self, values: dict[str, int]) -> bool:
+        return values["bus_value"] == self.value
+
+    def __str__(self) -> str:
+        return f"bus={self.value:x}"
+
+
+def parse_trigger(text: str) -> Trigger:
+    """Trigger from a description like "pc=3", "write=f", "write", "halted", "bus=2a" """
+    kind, _, argument = text.partition("=")
+    match kind, argument:
+        case "pc", _ if argument:
+            return PCTrigger(int(argument, 16))
+        case "write", _:
+            return RAMWriteTrigger(int(argument, 16) if argument else None)
+        case "halted", "":
+            return HaltTrigger()
+        case "bus", _ if argument:
+            return BusValueTrigger(int(argument, 16))
+    raise ValueError(f"Invalid trigger: {text!r}")
+
+
+@dataclass
+class Window:
+    trigger: Trigger
+    trigger_cycle: int
+    samples: list[tuple[int, tuple[int, ...]]]  # (cycle, values in probe order)
+    path: Path | None = None
+
+
+@dataclass
+class _Pending:
+    trigger: Trigger
+    trigger_cycle: int
+    remaining: int  # Cycles still to record after the trigger
+    samples: list[tuple[int, tuple[int, ...]]] = field(default_factory=list)
+
+
+class TriggeredCapture:
+    """
+    Ring buffer of the last `depth` cycles of `signals` (names of standard probes, or
+    extra name: Value pairs), flushed to `{output}_{n}.vcd` when a trigger fires. After
+    a window is complete the capture re-arms, up to `max_windows` windows.
+
+    With output=None windows are only kept in memory (see `windows`).
+    """
+
+    def __init__(
+        self,
+        sap1: SAP1,
+        triggers: Sequence[Trigger],
+        signals: Sequence[str] | dict[str, Value] = (),
+        *,
+        depth: int = DEPTH,
+        post_trigger: int = POST_TRIGGER,
+        max_windows: int = 1,
+        output: str | Path | None = "capture",
+    ) -> None:
+        available = standard_probes(sap1)
+        if isinstance(signals, dict):
+            selected = dict(signals)
+        else:
+            selected = {name: available[name] for name in signals or available}
+        for trigger in triggers:
+            for name in trigger.probes:
+                selected.setdefault(name, available[name])
+        self.probes = selected
+        self.names = tuple(selected)
+        self.widths = tuple(len(Value.cast(probe)) for probe in selected.values())
+
+        self.triggers = list(triggers)
+        self.post_trigger = post_trigger
+        self.max_windows = max_windows
+        self.output = None if output is None else Path(output)
+        self.buffer: deque[tuple[int, tuple[int, ...]]] = deque(maxlen=depth)
+        self.windows: list[Window] = []
+        self._pending: _Pending | None = None
+
+    def sample(self, cycle: int, values: dict[str, int]) -> None:
+        if len(self.windows) >= self.max_windows:
+            return
+        row = (cycle, tuple(values[name] for name in self.names))
+        pending = self._pending
+        if pending is not None:
+            pending.samples.append(row)
+            pending.remaining -= 1
+            if pending.remaining <= 0:
+                self._flush()
+            return
+
+        self.buffer.append(row)
+        for trigger in self.triggers:
+            if trigger.fires(values):
+                self._pending = _Pending(trigger, cycle, self.post_trigger)
+                if self.post_trigger <= 0:
+                    self._flush()
+                break
+
+    def finish(self, cycle: int) -> None:
+        """The run ended: write a window that is still waiting for samples"""
+        if self._pending is not None:
+            self._flush()
+
+    def _flush(self) -> None:
+        pending = self._pending
+        assert pending is not None
+        window = Window(
+            pending.trigger, pending.trigger_cycle, list(self.buffer) + pending.samples
+        )
+        if self.output is not None:
+            window.path = self.output.with_name(
+                f"{self.output.name}_{len(self.windows)}.vcd"
+            )
+            self.write_vcd(window)
+        self.windows.append(window)
+        self.buffer.clear()
+        self._pending = None
+
+    def write_vcd(self, window: Window) -> None:
+        assert window.path is not None
+        identifiers = [_vcd_identifier(idx) for idx in range(len(self.names))]
+        with open(window.path, "w") as vcd:
+            vcd.write(f"$comment Triggered by {window.trigger} at cycle ")
+            vcd.write(f"{window.trigger_cycle} $end\n")
+            vcd.write(f"$timescale {TIMESCALE} $end\n$scope module sap1 $end\n")
+            for name, width, identifier in zip(self.names, self.widths, identifiers):
+                vcd.write(f"$var wire {width} {identifier} {name} $end\n")
+            vcd.write("$upscope $end\n$enddefinitions $end\n")
+
+            previous: tuple[int, ...] | None = None
+            for cycle, values in window.samples:
+                changes = [
+                    _vcd_value(value, width, identifier)
+                    for idx, (value, width, identifier) in enumerate(
+                        zip(values, self.widths, identifiers)
+                    )
+                    if previous is None or previous[idx] != value
+                ]
+                if changes:
+                    vcd.write(f"#{cycle}\n" + "".join(changes))
+                previous = values
+
+
+def _vcd_identifier(index: int) -> str:
+    """Short identifier made of printable characters ("!" to "~")"""
+    identifier = ""
+    while True:
+        identifier += chr(33 + index % 94)
+        index //= 94
+        if not index:
+            return identifier
+
+
+def _vcd_value(value: int, width: int, identifier: str) -> str:
+    if width == 1:
+        return f"{value}{identifier}\n"
+    return f"b{value:b} {identifier}\n"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from ..workloads import MULTIPLY_PROG
+    from .harness import Harness
+
+    parser = argparse.ArgumentParser(description="Run a program with triggered capture")
+    parser.add_argument("trigger", nargs="+", help="pc=N, write[=N], halted or bus=N")
+    parser.add_argument("-p", "--program", help="Program bytes in hex (default: MULTIPLY)")
+    parser.add_argument("-d", "--depth", type=int, default=DEPTH)
+    parser.add_argument("-a", "--after", type=int, default=POST_TRIGGER)
+    parser.add_argument("-w", "--windows", type=int, default=1)
+    parser.add_argument("-o", "--output", default="capture")
+    parser.add_argument("-c", "--cycles", type=int, default=100_000)
+    args = parser.parse_args()
+
+    program = bytes.fromhex(args.program) if args.program else bytes(MULTIPLY_PROG)
+    harness = Harness()
+    capture = TriggeredCapture(
+        harness.sap1,
+        [parse_trigger(text) for text in args.trigger],
+        depth=args.depth,
+        post_trigger=args.after,
+        max_windows=args.windows,
+        output=args.output,
+    )
+    result = harness.run(program, args.cycles, monitors=[capture])
+    print(f"Ran {result.cycles} cycles")
+    for window in capture.windows:
+        print(f"{window.trigger} at cycle {window.trigger_cycle}: {window.path}")
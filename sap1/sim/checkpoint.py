@@ -0,0 +1,117 @@
+"""
+Checkpoints of a running SAP1 simulation.
+
+A `Checkpoint` holds every piece of state of the SAP1: all the registers (including
+the hidden operand copy in the instruction register), the ALU flags, `halted`, the
+u-sequencer and the RAM contents. It serializes to a fixed size blob of a few dozen
+bytes, so it can be stored, or sent to worker processes, cheaply.
+
+`capture()` and `restore()` work from inside any testbench, given its context; the
+simulation harness uses them to start runs from a checkpoint (see `Harness.resume`).
+"""
+
+from __future__ import annotations
+
+import struct
+from dataclasses import dataclass
+from typing import Sequence
+
+from amaranth import Signal
+
+from ..core.sap1 import SAP1
+from ..model.interpreter import RAM_SIZE
+
+MAGIC = b"SAP1"
+VERSION = 1
+
+# Stateful signals of SAP1, in serialization order (all of them fit in a byte)
+STATE_SIGNALS = (
+    "a",
+    "b",
+    "pc",
+    "mar",
+    "ir",
+    "ir_operand",
+    "out",
+    "carry_flag",
+    "zero_flag",
+    "halted",
+    "u_sequencer",
+)
+
+# Header: magic, version, cycles, output count
+_HEADER = struct.Struct("<4sBQQ")
+_BODY = struct.Struct(f"<{len(STATE_SIGNALS)}B{RAM_SIZE}s")
+
+
+def state_signals(sap1: SAP1) -> dict[str, Signal]:
+    signals = {
+        "a": sap1.register_a.data_out,
+        "b": sap1.register_b.data_out,
+        "pc": sap1.program_counter.data_out,
+        "mar": sap1.memory_address_register.data_out,
+        "ir": sap1.instruction_register.full_value,
+        "ir_operand": sap1.instruction_register.data_out,
+        "out": sap1.output_register.data_out,
+        "carry_flag": sap1.alu.carry_flag,
+        "zero_flag": sap1.alu.zero_flag,
+        "halted": sap1.halted,
+        "u_sequencer": sap1.u_sequencer,
+    }
+    assert tuple(signals) == STATE_SIGNALS
+    return signals
+
+
+@dataclass(frozen=True)
+class Checkpoint:
+    registers: dict[str, int]  # Values for every name in STATE_SIGNALS
+    ram: bytes
+    # Not part of the SAP1 state, but needed to continue a run where it was
+    cycles: int = 0
+    output_count: int = 0
+
+    @classmethod
+    def at_reset(cls, program: Sequence[int]) -> Checkpoint:
+        """The state of SAP1(program) right after reset (program is 0-padded)"""
+        assert len(program) <= RAM_SIZE, "Program does not fit in RAM"
+        return cls(
+            registers=dict.fromkeys(STATE_SIGNALS, 0),
+            ram=bytes(program) + bytes(RAM_SIZE - len(program)),
+        )
+
+    def to_bytes(self) -> bytes:
+        return _HEADER.pack(
+            MAGIC, VERSION, self.cycles, self.output_count
+        ) + _BODY.pack(*(self.registers[name] for name in STATE_SIGNALS), self.ram)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> Checkpoint:
+        if len(blob) != _HEADER.size + _BODY.size:
+            raise ValueError("Invalid checkpoint size")
+        magic, version, cycles, output_count = _HEADER.unpack_from(blob)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a SAP1 checkpoint, or unsupported version")
+        *values, ram = _BODY.unpack_from(blob, _HEADER.size)
+        return cls(dict(zip(STATE_SIGNALS, values)), ram, cycles, output_count)
+
+
+def capture(ctx, sap1: SAP1, cycles: int = 0, output_count: int = 0) -> Checkpoint:
+    """Checkpoint of the current state of the simulation of sap1"""
+    data = sap1.memory.memory.data
+    return Checkpoint(
+        registers={
+            name: ctx.get(signal) for name, signal in state_signals(sap1).items()
+        },
+        ram=bytes(ctx.get(data[address]) for address in range(RAM_SIZE)),
+        cycles=cycles,
+        output_count=output_count,
+    )
+
+
+def restore(ctx, sap1: SAP1, checkpoint: Checkpoint) -> None:
+    """Load the checkpoint into the simulation of sap1"""
+    for name, signal in state_signals(sap1).items():
+        ctx.set(signal, checkpoint.registers[name])
+    data = sap1.memory.memory.data
+    for address, value in enumerate(checkpoint.ram):
+        ctx.set(data[address], value)
@@ -0,0 +1,234 @@
+"""
+Microcode and bus coverage of simulation runs.
+
+`CoverageMonitor` is a `harness.Monitor` that only counts, per cycle, the raw tuple
+(opcode, u-sequencer step, flags, bus source, bus destinations) observed in the
+hardware. Those counters are cheap to collect and to merge (across runs, or worker
+processes); `Coverage.report()` maps them to coverage points afterwards:
+
+- Microcode: every (mnemonic, step) of `microcode.OPCODES` and the fetch steps, with
+  one point per outcome of `conditional` entries (each condition, or none matching).
+- Bus: every (source, destination) transfer that the microcode can generate.
+"""
+
+from __future__ import annotations
+
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterable, Sequence
+
+from ..core import microcode
+from ..core.microcode import Mnemonic
+from ..model.interpreter import ADDRESS_BUS_WIDTH, opcode_microcode
+from ..model.tstate import BUS_DESTINATIONS, BUS_SOURCES, FETCH
+from .harness import MAX_CYCLES, Harness, standard_probes
+
+# Raw counter key: (opcode, step, carry_flag, zero_flag, bus source, bus destinations)
+RawKey = tuple[int, int, int, int, int, int]
+# Microcode point: (mnemonic or "FETCH", step, conditional outcome or None)
+MicrocodePoint = tuple[str, int, str | None]
+BusPoint = tuple[str, str]
+
+PROBES = (
+    "ir",
+    "u_sequencer",
+    "carry_flag",
+    "zero_flag",
+    "bus_source",
+    "bus_destinations",
+    "halted",
+)
+NO_CONDITION = "default"
+
+
+def _condition_label(condition: microcode.Condition) -> str:
+    flag, value = condition
+    return f"{flag}={value}"
+
+
+def microcode_points() -> list[MicrocodePoint]:
+    points: list[MicrocodePoint] = [("FETCH", step, None) for step in range(len(FETCH))]
+    for mnemonic, uinstructions in microcode.OPCODES.items():
+        for step, uinstr in enumerate(uinstructions, len(FETCH)):
+            if uinstr.conditional:
+                points += [
+                    (mnemonic.name, step, _condition_label(condition))
+                    for condition in uinstr.conditional
+                ]
+                points.append((mnemonic.name, step, NO_CONDITION))
+            else:
+                points.append((mnemonic.name, step, None))
+    return points
+
+
+def _transfers(uinstr: microcode.uInstr) -> list[BusPoint]:
+    if uinstr.src is None:
+        return []
+    return [(uinstr.src, dst) for dst in uinstr.dst.split()]
+
+
+def bus_points() -> list[BusPoint]:
+    points: dict[BusPoint, None] = {}
+    uinstructions = FETCH + [
+        uinstr for program in microcode.OPCODES.values() for uinstr in program
+    ]
+    for uinstr in uinstructions:
+        for variant in [uinstr, *(uinstr.conditional or {}).values()]:
+            points |= dict.fromkeys(_transfers(variant))
+    return list(points)
+
+
+def microcode_point(key: RawKey) -> MicrocodePoint | None:
+    """Microcode point exercised in the cycle (None for idle steps)"""
+    opcode, step, carry_flag, zero_flag = key[:4]
+    if step < len(FETCH):
+        return ("FETCH", step, None)
+    uinstructions = opcode_microcode(opcode)
+    if step - len(FETCH) >= len(uinstructions):
+        return None
+    uinstr = uinstructions[step - len(FETCH)]
+    if not uinstr.conditional:
+        return (Mnemonic(opcode).name, step, None)
+    flags = {"carry_flag": carry_flag, "zero_flag": zero_flag}
+    outcome = NO_CONDITION
+    for condition in uinstr.conditional:
+        flag, value = condition
+        if flags[flag] == value:
+            outcome = _condition_label(condition)
+    return (Mnemonic(opcode).name, step, outcome)
+
+
+def bus_transfers(key: RawKey) -> list[BusPoint]:
+    source, destinations = key[4:]
+    if source >= len(BUS_SOURCES):
+        return []
+    return [
+        (BUS_SOURCES[source], dst)
+        for bit, dst in enumerate(BUS_DESTINATIONS)
+        if destinations >> bit & 1
+    ]
+
+
+@dataclass
+class Coverage:
+    """Raw cycle counters of one or more runs. Add them up with `+` or `merge`"""
+
+    counts: Counter[RawKey] = field(default_factory=Counter)
+    runs: int = 0
+
+    def merge(self, other: Coverage) -> None:
+        self.counts.update(other.counts)
+        self.runs += other.runs
+
+    def __add__(self, other: Coverage) -> Coverage:
+        result = Coverage()
+        result.merge(self)
+        result.merge(other)
+        return result
+
+    def microcode(self) -> dict[MicrocodePoint, int]:
+        """Cycles spent on every microcode point"""
+        hits = dict.fromkeys(microcode_points(), 0)
+        for key, count in self.counts.items():
+            point = microcode_point(key)
+            if point is not None:
+                hits[point] = hits.get(point, 0) + count
+        return hits
+
+    def bus(self) -> dict[BusPoint, int]:
+        """Cycles with each bus transfer. Transfers not in the microcode are added"""
+        hits = dict.fromkeys(bus_points(), 0)
+        for key, count in self.counts.items():
+            for point in bus_transfers(key):
+                hits[point] = hits.get(point, 0) + count
+        return hits
+
+    def report(self, verbose: bool = False) -> str:
+        """Summary, listing uncovered points (or every point if verbose)"""
+        lines = [f"Coverage of {self.runs} runs, {self.counts.total()} cycles"]
+        sections: list[tuple[str, dict]] = [
+            ("Microcode", self.microcode()),
+            ("Bus transfers", self.bus()),
+        ]
+        for title, hits in sections:
+            covered = sum(1 for count in hits.values() if count)
+            percent = 100 * covered / len(hits) if hits else 100
+            lines.append(f"{title}: {covered}/{len(hits)} points ({percent:.1f}%)")
+            for point, count in hits.items():
+                if verbose or not count:
+                    lines.append(f"  {_format_point(point):40} {count}")
+        return "\n".join(lines)
+
+
+def _format_point(point: MicrocodePoint | BusPoint) -> str:
+    if len(point) == 2:
+        return f"{point[0]} -> {point[1]}"
+    name, step, outcome = point
+    return f"{name} step {step}" + (f" ({outcome})" if outcome else "")
+
+
+class CoverageMonitor:
+    """Collects coverage from Harness runs into `coverage`"""
+
+    def __init__(self, harness: Harness, coverage: Coverage | None = None) -> None:
+        probes = standard_probes(harness.sap1)
+        self.probes = {name: probes[name] for name in PROBES}
+        self.coverage = coverage if coverage is not None else Coverage()
+
+    def sample(self, cycle: int, values: dict[str, int]) -> None:
+        if values["halted"]:
+            return  # Final state, or frozen sequencer
+        self.coverage.counts[
+            (
+                values["ir"] >> ADDRESS_BUS_WIDTH,
+                values["u_sequencer"],
+                values["carry_flag"],
+                values["zero_flag"],
+                values["bus_source"],
+                values["bus_destinations"],
+            )
+        ] += 1
+
+    def finish(self, cycle: int) -> None:
+        self.coverage.runs += 1
+
+
+def collect(
+    programs: Iterable[Sequence[int]],
+    max_cycles: int = MAX_CYCLES,
+    harness: Harness | None = None,
+) -> Coverage:
+    """Coverage of running every program"""
+    harness = harness or Harness()
+    monitor = CoverageMonitor(harness)
+    for program in programs:
+        harness.run(program, max_cycles, monitors=[monitor])
+    return monitor.coverage
+
+
+def collect_parallel(
+    programs: Sequence[Sequence[int]],
+    max_cycles: int = MAX_CYCLES,
+    processes: int | None = None,
+) -> Coverage:
+    """Same as collect(), sharding the programs across worker processes"""
+    parts = processes or os.cpu_count() or 1
+    chunks = [list(programs[idx::parts]) for idx in range(parts) if programs[idx::parts]]
+    coverage = Coverage()
+    with ProcessPoolExecutor(processes) as pool:
+        for partial in pool.map(collect, chunks, [max_cycles] * len(chunks)):
+            coverage.merge(partial)
+    return coverage
+
+
+if __name__ == "__main__":
+    import random
+    import sys
+
+    # Usage: python -m sap1.sim.coverage [number of random programs]
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = random.Random(0)
+    programs = [[rng.randrange(256) for _ in range(16)] for _ in range(count)]
+    print(collect_parallel(programs, max_cycles=500).report(verbose=True))
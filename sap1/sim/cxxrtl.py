@@ -0,0 +1,256 @@
+"""
+Compiled simulation backend using Yosys CXXRTL.
+
+The design is converted to RTLIL, translated to C++ by the bundled yowasp-yosys
+(`write_cxxrtl`), and compiled with the local C++ compiler into a shared library
+together with a small C shim. The library is then driven from Python with ctypes.
+
+Compiled designs are cached in `build/cxxrtl/`, keyed by a hash of the RTLIL, so
+re-running the same design only pays the (slow) compilation once.
+
+Signals are referred to by their hierarchical name, with components separated by dots
+(e.g. "register_a.data_out", "halted"). Memories are accessed with an index.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import hashlib
+import importlib.resources
+import os
+import subprocess
+from pathlib import Path
+
+from amaranth import Elaboratable
+from amaranth.back import rtlil
+
+BUILD_DIR = Path("build") / "cxxrtl"
+CXX = os.environ.get("CXX", "c++")
+CXXFLAGS = ["-std=c++14", "-O2", "-shared", "-fPIC"]
+
+SHIM_SOURCE = r"""
+#include <cxxrtl/capi/cxxrtl_capi.cc>
+
+extern "C" {
+
+cxxrtl_toplevel cxxrtl_design_create();
+
+cxxrtl_handle shim_create() {
+    return cxxrtl_create(cxxrtl_design_create());
+}
+
+cxxrtl_object *shim_get(cxxrtl_handle handle, const char *name) {
+    return cxxrtl_get(handle, name);
+}
+
+size_t shim_width(cxxrtl_object *object) {
+    return object->width;
+}
+
+size_t shim_depth(cxxrtl_object *object) {
+    return object->depth;
+}
+
+uint64_t shim_read(cxxrtl_object *object, size_t index) {
+    if (object->type == CXXRTL_OUTLINE)
+        cxxrtl_outline_eval(object->outline);
+    size_t chunks = (object->width + 31) / 32;
+    const uint32_t *data = object->curr + index * chunks;
+    uint64_t value = data[0];
+    if (chunks > 1)
+        value |= (uint64_t)data[1] << 32;
+    return value;
+}
+
+int shim_write(cxxrtl_object *object, size_t index, uint64_t value) {
+    // Memories can only be written through curr
+    uint32_t *data = object->type == CXXRTL_MEMORY ? object->curr : object->next;
+    if (data == NULL || object->width > 64)
+        return 0;
+    size_t chunks = (object->width + 31) / 32;
+    if (object->width < 64)
+        value &= ((uint64_t)1 << object->width) - 1;
+    data += index * chunks;
+    data[0] = (uint32_t)value;
+    if (chunks > 1)
+        data[1] = (uint32_t)(value >> 32);
+    return 1;
+}
+
+void shim_tick(cxxrtl_handle handle, cxxrtl_object *clk, size_t count) {
+    for (size_t i = 0; i < count; i++) {
+        clk->next[0] = 0;
+        cxxrtl_step(handle);
+        clk->next[0] = 1;
+        cxxrtl_step(handle);
+    }
+}
+
+// Tick until `until` is not zero. Returns the number of cycles run
+size_t shim_run_until(cxxrtl_handle handle, cxxrtl_object *clk, cxxrtl_object *until,
+                      size_t max_cycles) {
+    size_t cycles = 0;
+    while (cycles < max_cycles && shim_read(until, 0) == 0) {
+        shim_tick(handle, clk, 1);
+        cycles++;
+    }
+    return cycles;
+}
+
+}
+"""
+
+
+def runtime_include_dir() -> Path:
+    """Location of the CXXRTL runtime headers in the yowasp-yosys package"""
+    share = importlib.resources.files("yowasp_yosys") / "share"
+    return Path(str(share)) / "include" / "backends" / "cxxrtl" / "runtime"
+
+
+def build(
+    top: Elaboratable,
+    *,
+    platform=None,
+    ports=None,
+    build_dir: Path = BUILD_DIR,
+) -> Path:
+    """Compile the design into a shared library (if not cached) and return its path"""
+    import yowasp_yosys
+
+    design = rtlil.convert(top, name="top", platform=platform, ports=ports)
+    digest = hashlib.sha256((design + SHIM_SOURCE).encode()).hexdigest()[:16]
+    output_dir = Path(build_dir) / digest
+    library = output_dir / "libtop.so"
+    if library.exists():
+        return library
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    (output_dir / "top.il").write_text(design)
+    (output_dir / "shim.cc").write_text(SHIM_SOURCE)
+    status = yowasp_yosys.run_yosys(
+        [
+            "-q",
+            "-p",
+            f"read_rtlil {output_dir / 'top.il'}; "
+            f"write_cxxrtl -header {output_dir / 'top.cc'}",
+        ]
+    )
+    if status != 0:
+        raise RuntimeError(f"write_cxxrtl failed with status {status}")
+    subprocess.run(
+        [
+            CXX,
+            *CXXFLAGS,
+            f"-I{runtime_include_dir()}",
+            f"-I{output_dir}",
+            str(output_dir / "top.cc"),
+            str(output_dir / "shim.cc"),
+            "-o",
+            str(library) + ".tmp",
+        ],
+        check=True,
+    )
+    # Rename at the end, so an interrupted build is never picked up from the cache
+    os.replace(str(library) + ".tmp", library)
+    return library
+
+
+class CxxrtlSimulator:
+    """
+    A compiled simulation of `top`. The testbench interface is minimal: get/set
+    signals by name, tick the (default domain) clock, or run until a signal is set.
+    """
+
+    def __init__(self, top: Elaboratable, *, platform=None, ports=None) -> None:
+        self.library_path = build(top, platform=platform, ports=ports)
+        lib = self._lib = ctypes.CDLL(str(self.library_path))
+
+        handle, obj = ctypes.c_void_p, ctypes.c_void_p
+        lib.shim_create.restype = handle
+        lib.shim_get.argtypes = [handle, ctypes.c_char_p]
+        lib.shim_get.restype = obj
+        lib.shim_width.argtypes = [obj]
+        lib.shim_width.restype = ctypes.c_size_t
+        lib.shim_depth.argtypes = [obj]
+        lib.shim_depth.restype = ctypes.c_size_t
+        lib.shim_read.argtypes = [obj, ctypes.c_size_t]
+        lib.shim_read.restype = ctypes.c_uint64
+        lib.shim_write.argtypes = [obj, ctypes.c_size_t, ctypes.c_uint64]
+        lib.shim_write.restype = ctypes.c_int
+        lib.shim_tick.argtypes = [handle, obj, ctypes.c_size_t]
+        lib.shim_run_until.argtypes = [handle, obj, obj, ctypes.c_size_t]
+        lib.shim_run_until.restype = ctypes.c_size_t
+        lib.cxxrtl_step.argtypes = [handle]
+        lib.cxxrtl_reset.argtypes = [handle]
+        lib.cxxrtl_destroy.argtypes = [handle]
+
+        self._handle = lib.shim_create()
+        self._objects: dict[str, int] = {}
+        self._clk = self._object("clk")
+        self._dirty = True
+        self.cycles = 0
+
+    def __del__(self) -> None:
+        if getattr(self, "_handle", None):
+            self._lib.cxxrtl_destroy(self._handle)
+            self._handle = None
+
+    def _object(self, name: str) -> int:
+        if name not in self._objects:
+            obj = self._lib.shim_get(self._handle, name.replace(".", " ").encode())
+            if not obj:
+                raise KeyError(f"Unknown signal: {name!r}")
+            self._objects[name] = obj
+        return self._objects[name]
+
+    def _settle(self) -> None:
+        if self._dirty:
+            self._lib.cxxrtl_step(self._handle)
+            self._dirty = False
+
+    def get(self, name: str, index: int = 0) -> int:
+        self._settle()
+        return self._lib.shim_read(self._object(name), index)
+
+    def set(self, name: str, value: int, index: int = 0) -> None:
+        if not self._lib.shim_write(self._object(name), index, value):
+            raise ValueError(f"Signal {name!r} can't be written")
+        self._dirty = True
+
+    def depth(self, name: str) -> int:
+        """Number of elements (for memories; other signals have 1)"""
+        return self._lib.shim_depth(self._object(name))
+
+    def tick(self, count: int = 1) -> None:
+        self._settle()
+        self._lib.shim_tick(self._handle, self._clk, count)
+        self.cycles += count
+
+    def run_until(self, name: str, max_cycles: int) -> int:
+        """Tick until the given signal is non-zero. Returns the number of cycles run"""
+        self._settle()
+        cycles = self._lib.shim_run_until(
+            self._handle, self._clk, self._object(name), max_cycles
+        )
+        self.cycles += cycles
+        return cycles
+
+    def reset(self) -> None:
+        """Go back to the initial state (including memory contents)"""
+        self._lib.cxxrtl_reset(self._handle)
+        self._dirty = True
+        self.cycles = 0
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from ..core.sap1 import SAP1
+
+    # Usage: python -m sap1.sim.cxxrtl 14 25 e0 f0 1c 0e
+    sim = CxxrtlSimulator(SAP1([int(v, 16) for v in sys.argv[1:]]))
+    start = time.perf_counter()
+    cycles = sim.run_until("halted", 10_000_000)
+    elapsed = time.perf_counter() - start
+    print(f"Display: {sim.get('display')}. {cycles} cycles in {elapsed:.3f}s")
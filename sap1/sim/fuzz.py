@@ -0,0 +1,205 @@
+"""
+Differential fuzzing of the Amaranth SAP1 against the reference interpreter.
+
+Every case is a random 16 byte RAM image plus random initial registers (at an
+instruction boundary). It runs in the HDL simulation (through a `Harness`, starting
+from a `Checkpoint`) and in `model.interpreter`, which implements the ISA without the
+microcode. The OUT stream, halting, cycle count, final RAM and registers must match.
+
+Failing cases are shrunk: bytes and registers are simplified one at a time (set to 0, or
+to smaller values) while the case still fails, to get a minimal reproduction.
+
+Cases are numbered, and each one is generated from (seed, number) only, so any case can
+be reproduced without running the ones before it.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Iterator
+
+from ..model import interpreter
+from ..model.interpreter import ADDRESS_BUS_WIDTH, ADDRESS_MASK, CYCLES, RAM_SIZE, State
+from ..model.tstate import STEPS
+from .checkpoint import STATE_SIGNALS, Checkpoint
+from .harness import Harness
+
+MAX_INSTRUCTIONS = 64  # Per case. Cases run for at most STEPS times as many cycles
+# Registers that can be set in a case (the rest are determined at an instruction
+# boundary), with their widths
+REGISTERS = {
+    "a": 8,
+    "b": 8,
+    "pc": ADDRESS_BUS_WIDTH,
+    "mar": ADDRESS_BUS_WIDTH,
+    "ir": 8,
+    "out": 8,
+    "carry_flag": 1,
+    "zero_flag": 1,
+}
+
+
+@dataclass(frozen=True)
+class Case:
+    ram: bytes
+    registers: tuple[tuple[str, int], ...]  # (name, value) for REGISTERS
+
+    @classmethod
+    def generate(cls, seed: int, number: int) -> Case:
+        rng = random.Random(f"{seed}:{number}")
+        ram = bytes(rng.randrange(256) for _ in range(RAM_SIZE))
+        registers = tuple(
+            (name, rng.randrange(1 << width)) for name, width in REGISTERS.items()
+        )
+        return cls(ram, registers)
+
+    def state(self) -> State:
+        return State(bytearray(self.ram), **dict(self.registers))
+
+    def checkpoint(self) -> Checkpoint:
+        registers = dict.fromkeys(STATE_SIGNALS, 0) | dict(self.registers)
+        registers["ir_operand"] = registers["ir"] & ADDRESS_MASK
+        return Checkpoint(registers, self.ram)
+
+    def __str__(self) -> str:
+        registers = " ".join(f"{name}={value:x}" for name, value in self.registers)
+        return f"ram={self.ram.hex()} {registers}"
+
+
+@dataclass
+class Difference:
+    field: str
+    expected: object  # From the interpreter
+    actual: object  # From the HDL simulation
+
+
+def check(
+    case: Case, harness: Harness, max_instructions: int = MAX_INSTRUCTIONS
+) -> Difference | None:
+    """First difference between the HDL and the interpreter running case, or None"""
+    expected = interpreter.run(case.state(), max_instructions)
+    # Every instruction but HLT takes STEPS cycles, so after running this many cycles
+    # without halting the hardware is at the same instruction boundary
+    actual = harness.resume(case.checkpoint(), max_instructions * STEPS)
+
+    state = expected.state
+    u_sequencer = CYCLES[state.ir >> ADDRESS_BUS_WIDTH] % STEPS if state.halted else 0
+    comparisons = [
+        ("outputs", expected.outputs, actual.outputs),
+        ("halted", state.halted, actual.halted),
+        ("cycles", expected.cycles, actual.cycles),
+        ("ram", bytes(state.ram), actual.ram),
+        ("u_sequencer", u_sequencer, actual.registers["u_sequencer"]),
+    ] + [
+        (name, int(getattr(state, name)), actual.registers[name]) for name in REGISTERS
+    ]
+    for name, value, hardware in comparisons:
+        if value != hardware:
+            return Difference(name, value, hardware)
+    return None
+
+
+def _simplifications(case: Case) -> Iterator[Case]:
+    """Simpler variants of case, simplest first"""
+    for address, byte in enumerate(case.ram):
+        if byte:
+            ram = bytearray(case.ram)
+            for smaller in (0, byte >> 1, byte & 0xF0, byte - 1):
+                if smaller != byte:
+                    ram[address] = smaller
+                    yield replace(case, ram=bytes(ram))
+    for idx, (name, value) in enumerate(case.registers):
+        for smaller in (0, value >> 1, value - 1):
+            if value and smaller != value:
+                registers = list(case.registers)
+                registers[idx] = (name, smaller)
+                yield replace(case, registers=tuple(registers))
+
+
+def shrink(
+    case: Case, harness: Harness, max_instructions: int = MAX_INSTRUCTIONS
+) -> Case:
+    """Simplify a failing case while it keeps failing"""
+    progress = True
+    while progress:
+        progress = False
+        for simpler in _simplifications(case):
+            if check(simpler, harness, max_instructions) is not None:
+                case = simpler
+                progress = True
+                break
+    return case
+
+
+@dataclass
+class Failure:
+    number: int
+    case: Case  # Shrunk
+    difference: Difference  # Of the shrunk case
+    original: Case
+
+
+_harness: Harness | None = None
+
+
+def fuzz_range(
+    seed: int, start: int, stop: int, max_instructions: int = MAX_INSTRUCTIONS
+) -> list[Failure]:
+    """Run cases start..stop-1, returning the (shrunk) failures"""
+    global _harness
+    if _harness is None:
+        _harness = Harness()  # One per process
+    failures = []
+    for number in range(start, stop):
+        case = Case.generate(seed, number)
+        if check(case, _harness, max_instructions) is not None:
+            shrunk = shrink(case, _harness, max_instructions)
+            difference = check(shrunk, _harness, max_instructions)
+            assert difference is not None
+            failures.append(Failure(number, shrunk, difference, case))
+    return failures
+
+
+def fuzz(
+    cases: int,
+    seed: int = 0,
+    processes: int | None = None,
+    max_instructions: int = MAX_INSTRUCTIONS,
+) -> list[Failure]:
+    """Run cases 0..cases-1 across a process pool"""
+    parts = processes or os.cpu_count() or 1
+    bounds = [cases * idx // parts for idx in range(parts + 1)]
+    with ProcessPoolExecutor(processes) as pool:
+        results = pool.map(
+            fuzz_range,
+            [seed] * parts,
+            bounds[:-1],
+            bounds[1:],
+            [max_instructions] * parts,
+        )
+        return [failure for part in results for failure in part]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Fuzz the HDL against the interpreter")
+    parser.add_argument("-n", "--cases", type=int, default=1000)
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-j", "--processes", type=int, default=None)
+    parser.add_argument("-i", "--instructions", type=int, default=MAX_INSTRUCTIONS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    failures = fuzz(args.cases, args.seed, args.processes, args.instructions)
+    elapsed = time.perf_counter() - start
+    print(f"{args.cases} cases (seed {args.seed}) in {elapsed:.1f}s")
+    for failure in failures:
+        print(f"Case {failure.number} fails: {failure.difference}")
+        print(f"  Shrunk: {failure.case}")
+    if failures:
+        raise SystemExit(f"{len(failures)} failing cases")
@@ -0,0 +1,248 @@
+"""
+Reusable Amaranth simulation of the SAP-1, for running many programs.
+
+Building `SAP1(program)` and a `Simulator` for it costs much more than simulating a
+short program: the design has to be elaborated, and pysim generates and compiles Python
+code for it. A `Harness` does that once, for a SAP1 with empty RAM. Every run then
+resets the simulation and writes the program into the RAM `Memory` through the simulator
+before clocking, so the cost of each program is just the simulated cycles.
+
+Runs can also start from a `Checkpoint` (see `checkpoint.py`) instead of a program, and
+record checkpoints periodically. `Monitor`s get the values of their probe signals on
+every cycle (see `capture.py`).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Protocol, Sequence
+
+from amaranth import Value
+from amaranth.sim import Simulator
+
+from ..core.sap1 import SAP1
+from ..model.interpreter import RAM_SIZE
+from .checkpoint import Checkpoint, capture, restore
+
+MAX_CYCLES = 100_000
+
+
+@dataclass
+class SimResult:
+    outputs: list[int]  # Every value written to the output register (in this run)
+    cycles: int  # Including the ones before the starting checkpoint, if any
+    halted: bool
+    ram: bytes  # RAM contents at the end
+    registers: dict[str, int]  # Final values of checkpoint.STATE_SIGNALS
+    checkpoints: list[Checkpoint] = field(default_factory=list)
+    # With track_accesses: for every address, the first cycle (in this run) where
+    # it was read or written, or None
+    first_access: list[int | None] | None = None
+
+
+class Monitor(Protocol):
+    """Observer of a run, called once per cycle before the clock edge"""
+
+    probes: dict[str, Value]
+
+    def sample(self, cycle: int, values: dict[str, int]) -> None: ...
+
+    def finish(self, cycle: int) -> None:
+        """Called at the end of the run, with the final cycle count"""
+        ...
+
+
+def standard_probes(sap1: SAP1) -> dict[str, Value]:
+    """Commonly observed signals of the SAP1, by short name"""
+    bus = sap1.data_bus
+    return {
+        "a": sap1.register_a.data_out,
+        "b": sap1.register_b.data_out,
+        "pc": sap1.program_counter.data_out,
+        "mar": sap1.memory_address_register.data_out,
+        "ir": sap1.instruction_register.full_value,
+        "out": sap1.output_register.data_out,
+        "carry_flag": sap1.alu.carry_flag,
+        "zero_flag": sap1.alu.zero_flag,
+        "halted": sap1.halted,
+        "u_sequencer": sap1.u_sequencer,
+        "bus_value": bus.bus_value,
+        "bus_source": bus.active_input,
+        "bus_destinations": bus.active_outputs,
+        "memory_read": bus.is_selected("memory"),
+        "memory_write": bus.is_writing("memory"),
+        "output_write": bus.is_writing("output"),
+    }
+
+
+@dataclass
+class _Job:
+    start: Checkpoint
+    max_cycles: int
+    input_switches: int
+    checkpoint_every: int
+    track_accesses: bool
+    monitors: Sequence[Monitor]
+    result: SimResult | None = None
+
+
+class Harness:
+    """
+    One elaborated SAP1 simulation, reused for every program run with it.
+
+    Only one program runs at a time; `run` resets the simulation before starting.
+    """
+
+    def __init__(self) -> None:
+        self.sap1 = SAP1([])
+        self.sim = Simulator(self.sap1)
+        self.sim.add_clock(1e-6)
+        # The testbench is restarted on every reset, and reads its job from here
+        self._job: _Job | None = None
+        self.sim.add_testbench(self._testbench)
+        self._fresh = True
+
+    async def _testbench(self, ctx) -> None:
+        job = self._job
+        if job is None:
+            return
+        sap1 = self.sap1
+        restore(ctx, sap1, job.start)
+        ctx.set(sap1.input_switches, job.input_switches)
+
+        writing_output = sap1.data_bus.is_writing("output")
+        bus_value = sap1.data_bus.bus_value
+        memory_access = sap1.data_bus.is_selected("memory") | sap1.data_bus.is_writing(
+            "memory"
+        )
+        mar = sap1.memory_address_register.data_out
+        outputs: list[int] = []
+        checkpoints: list[Checkpoint] = []
+        first_access: list[int | None] = [None] * RAM_SIZE
+        probes: dict[str, Value] = {}
+        for monitor in job.monitors:
+            probes |= monitor.probes
+
+        def sample(cycle: int) -> None:
+            values = {name: ctx.get(probe) for name, probe in probes.items()}
+            for monitor in job.monitors:
+                monitor.sample(cycle, values)
+
+        cycles = job.start.cycles
+        output_count = job.start.output_count
+        while cycles < job.max_cycles and not ctx.get(sap1.halted):
+            if job.checkpoint_every and cycles % job.checkpoint_every == 0:
+                checkpoints.append(capture(ctx, sap1, cycles, output_count))
+            if probes:
+                sample(cycles)
+            if ctx.get(writing_output):
+                outputs.append(ctx.get(bus_value))
+                output_count += 1
+            if job.track_accesses and ctx.get(memory_access):
+                address = ctx.get(mar)
+                if first_access[address] is None:
+                    first_access[address] = cycles
+            await ctx.tick()
+            cycles += 1
+
+        # Monitors also see the final state (e.g. halted)
+        if probes:
+            sample(cycles)
+        for monitor in job.monitors:
+            monitor.finish(cycles)
+
+        final = capture(ctx, sap1)
+        job.result = SimResult(
+            outputs=outputs,
+            cycles=cycles,
+            halted=bool(final.registers["halted"]),
+            ram=final.ram,
+            registers=final.registers,
+            checkpoints=checkpoints,
+            first_access=first_access if job.track_accesses else None,
+        )
+
+    def _run(self, job: _Job) -> SimResult:
+        self._job = job
+        # The simulator starts in the reset state, so the first run doesn't need it
+        if not self._fresh:
+            self.sim.reset()
+        self._fresh = False
+        self.sim.run()
+        assert job.result is not None
+        return job.result
+
+    def run(
+        self,
+        program: Sequence[int],
+        max_cycles: int = MAX_CYCLES,
+        input_switches: int = 0,
+        checkpoint_every: int = 0,
+        track_accesses: bool = False,
+        monitors: Sequence[Monitor] = (),
+    ) -> SimResult:
+        """
+        Run program (0-padded to the RAM size) until halted, or for max_cycles.
+
+        With checkpoint_every, a checkpoint is recorded every that many cycles. With
+        track_accesses, the first access to every RAM address is recorded. Monitors
+        are sampled on every cycle
+        """
+        return self.resume(
+            Checkpoint.at_reset(program),
+            max_cycles,
+            input_switches,
+            checkpoint_every,
+            track_accesses,
+            monitors,
+        )
+
+    def resume(
+        self,
+        checkpoint: Checkpoint,
+        max_cycles: int = MAX_CYCLES,
+        input_switches: int = 0,
+        checkpoint_every: int = 0,
+        track_accesses: bool = False,
+        monitors: Sequence[Monitor] = (),
+    ) -> SimResult:
+        """
+        Same as run(), starting from the checkpoint. max_cycles counts from the start
+        of the original run (i.e. it includes checkpoint.cycles)
+        """
+        return self._run(
+            _Job(
+                checkpoint,
+                max_cycles,
+                input_switches,
+                checkpoint_every,
+                track_accesses,
+                monitors,
+            )
+        )
+
+    def run_all(
+        self, programs: Iterable[Sequence[int]], max_cycles: int = MAX_CYCLES
+    ) -> Iterator[SimResult]:
+        for program in programs:
+            yield self.run(program, max_cycles)
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    from ..model import interpreter
+
+    # Simulate random programs, comparing with the reference interpreter
+    rng = random.Random(0)
+    programs = [bytes(rng.randrange(256) for _ in range(RAM_SIZE)) for _ in range(200)]
+    start = time.perf_counter()
+    harness = Harness()
+    results = list(harness.run_all(programs, max_cycles=500))
+    elapsed = time.perf_counter() - start
+    print(f"{len(programs)} programs in {elapsed:.2f}s")
+    for program, result in zip(programs, results):
+        expected = interpreter.run(program, max_instructions=500)
+        if result.halted and result.outputs != expected.outputs:
+            print(f"Mismatch in {program.hex()}: {result} vs {expected}")
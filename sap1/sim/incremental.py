@@ -0,0 +1,192 @@
+"""
+Incremental re-simulation for edit-run loops.
+
+Runs are recorded with periodic checkpoints and the first cycle at which every RAM
+address is read or written. When a new RAM image differs from a recorded one only in
+some addresses, execution is identical until the first access to any of them, so the
+new run resumes from the last checkpoint before that cycle (with the changed bytes
+patched into its RAM) instead of simulating from reset.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Sequence
+
+from ..model.interpreter import RAM_SIZE
+from .checkpoint import Checkpoint
+from .harness import MAX_CYCLES, Harness, SimResult
+
+CHECKPOINT_EVERY = 32
+MAX_ENTRIES = 64
+
+
+@dataclass
+class _Recording:
+    ram: bytes
+    input_switches: int
+    result: SimResult  # With outputs, checkpoints and accesses since reset
+
+
+def _patch(checkpoint: Checkpoint, ram: bytes, addresses: list[int]) -> Checkpoint:
+    patched = bytearray(checkpoint.ram)
+    for address in addresses:
+        patched[address] = ram[address]
+    return replace(checkpoint, ram=bytes(patched))
+
+
+class IncrementalSimulator:
+    """
+    Run programs through a Harness, reusing the recorded runs of similar RAM images.
+
+    Results are the same as `Harness.run(program, max_cycles, input_switches)`, with
+    checkpoints and first accesses counted from reset.
+    """
+
+    def __init__(
+        self,
+        harness: Harness | None = None,
+        checkpoint_every: int = CHECKPOINT_EVERY,
+        max_entries: int = MAX_ENTRIES,
+    ) -> None:
+        self.harness = harness or Harness()
+        self.checkpoint_every = checkpoint_every
+        self.max_entries = max_entries
+        # Recorded runs by (RAM image, input switches), least recently used first
+        self.recordings: OrderedDict[tuple[bytes, int], _Recording] = OrderedDict()
+        # Statistics
+        self.simulated_cycles = 0
+        self.skipped_cycles = 0
+
+    def _resume_point(
+        self, recording: _Recording, ram: bytes, max_cycles: int
+    ) -> tuple[Checkpoint, list[int]] | None:
+        """Latest usable checkpoint of recording for ram, and the addresses to patch"""
+        changed = [
+            address
+            for address in range(RAM_SIZE)
+            if recording.ram[address] != ram[address]
+        ]
+        assert recording.result.first_access is not None
+        limit = min(
+            (
+                access
+                for address in changed
+                if (access := recording.result.first_access[address]) is not None
+            ),
+            default=max_cycles,
+        )
+        usable = [
+            checkpoint
+            for checkpoint in recording.result.checkpoints
+            if checkpoint.cycles <= min(limit, max_cycles)
+        ]
+        if not usable:
+            return None
+        return usable[-1], changed
+
+    def run(
+        self,
+        program: Sequence[int],
+        max_cycles: int = MAX_CYCLES,
+        input_switches: int = 0,
+    ) -> SimResult:
+        ram = Checkpoint.at_reset(program).ram
+
+        # Pick the recording that allows skipping the most cycles
+        best: tuple[_Recording, Checkpoint, list[int]] | None = None
+        for recording in self.recordings.values():
+            if recording.input_switches != input_switches:
+                continue
+            point = self._resume_point(recording, ram, max_cycles)
+            if point is not None and (best is None or point[0].cycles > best[1].cycles):
+                best = (recording, *point)
+
+        if best is None:
+            result = self.harness.run(
+                ram,
+                max_cycles,
+                input_switches,
+                checkpoint_every=self.checkpoint_every,
+                track_accesses=True,
+            )
+            self.simulated_cycles += result.cycles
+        else:
+            base, checkpoint, changed = best
+            tail = self.harness.resume(
+                _patch(checkpoint, ram, changed),
+                max_cycles,
+                input_switches,
+                checkpoint_every=self.checkpoint_every,
+                track_accesses=True,
+            )
+            self.simulated_cycles += tail.cycles - checkpoint.cycles
+            self.skipped_cycles += checkpoint.cycles
+            result = self._join(base, checkpoint, changed, ram, tail)
+
+        self._record(_Recording(ram, input_switches, result))
+        return result
+
+    def _join(
+        self,
+        base: _Recording,
+        checkpoint: Checkpoint,
+        changed: list[int],
+        ram: bytes,
+        tail: SimResult,
+    ) -> SimResult:
+        """Result of the full run, from the base recording until checkpoint + tail"""
+        assert base.result.first_access is not None
+        assert tail.first_access is not None
+        # Accesses before the checkpoint are the ones of the base run
+        first_access = [
+            (
+                before
+                if (before := base.result.first_access[address]) is not None
+                and before < checkpoint.cycles
+                else tail.first_access[address]
+            )
+            for address in range(RAM_SIZE)
+        ]
+        checkpoints = [
+            _patch(previous, ram, changed)
+            for previous in base.result.checkpoints
+            if previous.cycles < checkpoint.cycles
+        ]
+        return SimResult(
+            outputs=base.result.outputs[: checkpoint.output_count] + tail.outputs,
+            cycles=tail.cycles,
+            halted=tail.halted,
+            ram=tail.ram,
+            registers=tail.registers,
+            checkpoints=checkpoints + tail.checkpoints,
+            first_access=first_access,
+        )
+
+    def _record(self, recording: _Recording) -> None:
+        key = (recording.ram, recording.input_switches)
+        self.recordings.pop(key, None)
+        self.recordings[key] = recording
+        while len(self.recordings) > self.max_entries:
+            self.recordings.popitem(last=False)
+
+
+if __name__ == "__main__":
+    import time
+
+    from ..workloads import MULTIPLY_PROG
+
+    # Edit-run loop: change the HLT of MULTIPLY_PROG (address 3, only reached after the
+    # multiplication loop) and the unused byte at address a
+    simulator = IncrementalSimulator()
+    start = time.perf_counter()
+    for value in range(256):
+        program = list(MULTIPLY_PROG)
+        program[3] = 0xF0 | value & 0xF
+        program[0xA] = value
+        result = simulator.run(program, max_cycles=1000)
+    elapsed = time.perf_counter() - start
+    print(f"256 runs in {elapsed:.2f}s.", end=" ")
+    print(f"Simulated {simulator.simulated_cycles} cycles,", end=" ")
+    print(f"skipped {simulator.skipped_cycles}")
@@ -0,0 +1,113 @@
+"""
+Regression runner for the workload corpus.
+
+Runs every `workloads.Workload` in the HDL simulation, spread across a process pool (one
+`Harness` per worker), and compares the OUT sequence, halting and exact cycle count with
+the golden values recorded in the corpus. Exits with an error if any of them differs.
+"""
+
+from __future__ import annotations
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Sequence
+
+from ..workloads import CORPUS, WORKLOADS, Workload
+from .harness import Harness
+
+
+@dataclass
+class Outcome:
+    workload: Workload
+    outputs: tuple[int, ...]
+    halted: bool
+    cycles: int
+    seconds: float  # Wall time of the simulation
+    differences: list[str] = field(default_factory=list)
+
+    @property
+    def passed(self) -> bool:
+        return not self.differences
+
+
+def compare(
+    workload: Workload, outputs: Sequence[int], halted: bool, cycles: int
+) -> list[str]:
+    """Descriptions of the differences from the golden values"""
+    differences = []
+    if tuple(outputs) != workload.outputs:
+        # Report the first diverging value, not the whole (possibly long) sequence
+        position = next(
+            (
+                idx
+                for idx, (expected, actual) in enumerate(zip(workload.outputs, outputs))
+                if expected != actual
+            ),
+            min(len(outputs), len(workload.outputs)),
+        )
+        expected = workload.outputs[position : position + 1] or "end"
+        actual = tuple(outputs[position : position + 1]) or "end"
+        differences.append(f"output #{position}: expected {expected}, got {actual}")
+    if halted != workload.halts:
+        differences.append(f"halted: expected {workload.halts}, got {halted}")
+    if cycles != workload.cycles:
+        differences.append(f"cycles: expected {workload.cycles}, got {cycles}")
+    return differences
+
+
+_harness: Harness | None = None
+
+
+def run_workload(workload: Workload) -> Outcome:
+    global _harness
+    if _harness is None:
+        _harness = Harness()  # One per process
+    start = time.perf_counter()
+    result = _harness.run(workload.program, workload.max_cycles)
+    seconds = time.perf_counter() - start
+    return Outcome(
+        workload,
+        tuple(result.outputs),
+        result.halted,
+        result.cycles,
+        seconds,
+        compare(workload, result.outputs, result.halted, result.cycles),
+    )
+
+
+def regress(
+    workloads: Sequence[Workload] = CORPUS, processes: int | None = None
+) -> list[Outcome]:
+    """Run the workloads across a process pool (every CPU by default), in order"""
+    with ProcessPoolExecutor(processes) as pool:
+        return list(pool.map(run_workload, workloads))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check the HDL against the corpus")
+    parser.add_argument("workloads", nargs="*", help=f"Any of: {', '.join(WORKLOADS)}")
+    parser.add_argument("-j", "--processes", type=int, default=None)
+    args = parser.parse_args()
+    for name in args.workloads:
+        if name not in WORKLOADS:
+            parser.error(f"Unknown workload {name!r}")
+
+    selected = [WORKLOADS[name] for name in args.workloads] or CORPUS
+    start = time.perf_counter()
+    outcomes = regress(selected, args.processes)
+    elapsed = time.perf_counter() - start
+    for outcome in outcomes:
+        status = "ok" if outcome.passed else "FAIL"
+        print(
+            f"{outcome.workload.name:20} {status:4} {outcome.cycles:6} cycles"
+            f"  {len(outcome.outputs):4} outputs  {outcome.seconds:.2f}s"
+        )
+        for difference in outcome.differences:
+            print(f"    {difference}")
+    failures = [outcome for outcome in outcomes if not outcome.passed]
+    print(f"{len(outcomes)} workloads in {elapsed:.1f}s")
+    if failures:
+        raise SystemExit(f"{len(failures)} regressions")
@@ -0,0 +1,216 @@
+"""
+Columnar binary traces, and queries over them.
+
+A `TraceWriter` (a `harness.Monitor`) records, for every probe, only the cycles where its
+value changes and the new values, as two arrays. When the run finishes they are written
+to a directory as `.npy` files (plus `trace.json` with the signal list), which `Trace`
+opens memory-mapped: nothing is parsed, and only the columns used are read from disk.
+
+Queries work on the arrays of changes, never on one value per cycle: a condition is
+evaluated at the cycles where one of its signals changes, and holds until the next one.
+For example:
+
+    trace = Trace("trace")
+    cycles = trace.when(
+        lambda bus, writing: (bus == 0x2A) & (writing == 1), "bus_value", "memory_write"
+    )
+    # PC is incremented during the fetch, so read it at step 0 of each OUT instruction
+    outs = trace.when(lambda write: write == 1, "output_write")
+    out_addresses = trace["pc"].at(trace.fetches(outs))
+"""
+
+from __future__ import annotations
+
+import json
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Sequence
+
+import numpy as np
+from amaranth import Value
+
+from ..core.sap1 import SAP1
+from .harness import standard_probes
+
+FORMAT_VERSION = 1
+METADATA = "trace.json"
+
+
+def value_dtype(width: int) -> np.dtype:
+    """Smallest unsigned type for values of the given width"""
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if width <= np.iinfo(dtype).bits:
+            return np.dtype(dtype)
+    raise ValueError(f"Signals wider than 64 bits are not supported ({width})")
+
+
+class TraceWriter:
+    """Records value changes of the probes (standard probe names, or name: Value)"""
+
+    def __init__(
+        self,
+        sap1: SAP1,
+        path: str | Path,
+        signals: Sequence[str] | dict[str, Value] = (),
+    ) -> None:
+        available = standard_probes(sap1)
+        if isinstance(signals, dict):
+            self.probes = dict(signals)
+        else:
+            self.probes = {name: available[name] for name in signals or available}
+        self.path = Path(path)
+        self.widths = {
+            name: len(Value.cast(probe)) for name, probe in self.probes.items()
+        }
+        self._cycles = {name: array("q") for name in self.probes}
+        self._values = {name: array("Q") for name in self.probes}
+        self._last: dict[str, int | None] = dict.fromkeys(self.probes)
+        self._start: int | None = None
+
+    def sample(self, cycle: int, values: dict[str, int]) -> None:
+        if self._start is None:
+            self._start = cycle
+        last = self._last
+        for name in self.probes:
+            value = values[name]
+            if value != last[name]:
+                last[name] = value
+                self._cycles[name].append(cycle)
+                self._values[name].append(value)
+
+    def finish(self, cycle: int) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        for name, width in self.widths.items():
+            cycles = np.frombuffer(self._cycles[name], dtype=np.int64)
+            values = np.frombuffer(self._values[name], dtype=np.uint64)
+            np.save(self.path / f"{name}.cycles.npy", cycles)
+            np.save(self.path / f"{name}.values.npy", values.astype(value_dtype(width)))
+        metadata = {
+            "version": FORMAT_VERSION,
+            # Samples are taken for cycles start..cycle (the last one is the final
+            # state). start is not 0 for runs resumed from a checkpoint
+            "start": self._start or 0,
+            "cycles": cycle + 1,
+            "signals": self.widths,
+        }
+        (self.path / METADATA).write_text(json.dumps(metadata, indent=2))
+
+
+@dataclass
+class Column:
+    """Changes of one signal: it takes values[i] from cycle cycles[i] on"""
+
+    name: str
+    width: int
+    cycles: np.ndarray  # int64, increasing
+    values: np.ndarray
+    length: int  # Cycles in the trace (including the ones before the first change)
+
+    def at(self, cycles: np.ndarray | Sequence[int] | int) -> np.ndarray:
+        """Value of the signal at the given cycles (ValueError outside the trace)"""
+        if np.any(np.asarray(cycles) >= self.length):
+            raise ValueError(f"Cycles past the end of the trace of {self.name}")
+        idx = _last_before(self.cycles, cycles, f"the trace of {self.name}")
+        return self.values[idx]
+
+    def dense(self) -> np.ndarray:
+        """
+        Value of the signal at every cycle, from the first change on. This takes memory
+        for every cycle of the trace: queries don't need it (see Trace.when)
+        """
+        runs = np.diff(self.cycles, append=self.length)
+        return np.repeat(self.values, runs)
+
+    def changes(self) -> list[tuple[int, int]]:
+        return list(zip(self.cycles.tolist(), self.values.tolist()))
+
+
+def _last_before(
+    cycles: np.ndarray, at: np.ndarray | Sequence[int] | int, what: str
+) -> np.ndarray:
+    """Index of the last of (increasing) cycles at or before every one of at"""
+    idx = np.searchsorted(cycles, at, side="right") - 1
+    if np.any(idx < 0):
+        raise ValueError(f"Cycles before {what}")
+    return idx
+
+
+class Trace:
+    """A trace directory written by TraceWriter, opened memory-mapped"""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        metadata = json.loads((self.path / METADATA).read_text())
+        if metadata["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported trace version {metadata['version']}")
+        self.start: int = metadata["start"]
+        self.cycles: int = metadata["cycles"]
+        self.widths: dict[str, int] = metadata["signals"]
+        self._columns: dict[str, Column] = {}
+
+    @property
+    def signals(self) -> list[str]:
+        return list(self.widths)
+
+    def __getitem__(self, name: str) -> Column:
+        if name not in self._columns:
+            if name not in self.widths:
+                raise KeyError(f"Signal {name!r} not in trace")
+            self._columns[name] = Column(
+                name,
+                self.widths[name],
+                np.load(self.path / f"{name}.cycles.npy", mmap_mode="r"),
+                np.load(self.path / f"{name}.values.npy", mmap_mode="r"),
+                self.cycles,
+            )
+        return self._columns[name]
+
+    def when(self, condition: Callable[..., np.ndarray], *signals: str) -> np.ndarray:
+        """
+        Cycles where condition holds. It is called once, with the values of the signals
+        at every cycle where one of them changes, and returns a boolean array
+        """
+        columns = [self[name] for name in signals]
+        changes = np.unique(np.concatenate([column.cycles for column in columns]))
+        holds = np.asarray(condition(*(column.at(changes) for column in columns)))
+        # It holds from a change to the next one
+        starts = changes[holds]
+        runs = np.append(changes[1:], self.cycles)[holds] - starts
+        offsets = np.cumsum(runs) - runs
+        return np.arange(runs.sum()) + np.repeat(starts - offsets, runs)
+
+    def fetches(self, cycles: np.ndarray | Sequence[int]) -> np.ndarray:
+        """
+        Cycle of the first fetch step (u_sequencer 0) of the instruction running at
+        each of cycles. PC still holds the address of the instruction there
+        """
+        steps = self["u_sequencer"]
+        starts = steps.cycles[steps.values == 0]
+        return starts[_last_before(starts, cycles, "the first fetch")]
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from ..workloads import MULTIPLY_PROG
+    from .harness import Harness
+
+    # Usage: python -m sap1.sim.trace [directory] [program bytes in hex]
+    path = sys.argv[1] if len(sys.argv) > 1 else "trace"
+    program = bytes.fromhex(sys.argv[2]) if sys.argv[2:] else bytes(MULTIPLY_PROG)
+    harness = Harness()
+    result = harness.run(program, monitors=[TraceWriter(harness.sap1, path)])
+
+    start = time.perf_counter()
+    trace = Trace(path)
+    out_cycles = trace.when(lambda write: write == 1, "output_write")
+    print(f"{trace.cycles} cycles traced, {len(trace.signals)} signals")
+    print("Address of every OUT:", *trace["pc"].at(trace.fetches(out_cycles)).tolist())
+    print("Values output:", *trace["bus_value"].at(out_cycles).tolist())
+    stores = trace.when(lambda write: write == 1, "memory_write")
+    addresses, values = trace["mar"].at(stores), trace["bus_value"].at(stores)
+    print("RAM writes (cycle, address, value):", end=" ")
+    print(*zip(stores.tolist(), addresses.tolist(), values.tolist()))
+    print(f"Queries took {time.perf_counter() - start:.4f}s")
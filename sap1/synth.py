@@ -12,6 +12,8 @@ from dev_boards.tang_nano_20k import TangNano20kPlatform
 from .core.sap1 import SAP1
 from .clock_control import ClockControl
 from .prog_control import ProgrammingControl
+from .timing import HARDWARE, TimingProfile
+from .workloads import MULTIPLY_PROG
 
 
 class SAP1_Nano(TangNano20kPlatform):
@@ -59,6 +61,10 @@ class SAP1_Nano(TangNano20kPlatform):
     ]
 
 
+# Put the clock in the global network
+CLOCK_PREFERENCES = 'CLOCK_LOC "clk27_0__io" BUFG;'
+
+
 class Display(wiring.Elaboratable):
     def __init__(self, *args, out_port, **kwargs):
         self.out_port = out_port
@@ -170,48 +176,55 @@ class TangGlue(wiring.Elaboratable):
         return m
 
 
-MULTIPLY_PROG = [
-    0x1E,  # 0: LDA x
-    0x3C,  # 1: SUB c1
-    0x74,  # 2: JC 4
-    0xF0,  # 3: HLT
-    0x4E,  # 4: STA x
-    0x1D,  # 5: LDA result
-    0x2F,  # 6: ADD y
-    0xE0,  # 7: OUT
-    0x4D,  # 8: STA result
-    0x60,  # 9: JMP 0
-    0,  # a
-    0xff,  # b
-    0x1,  # c: c1
-    0,  # d: result
-    3,  # e: x
-    14,  # f: y
-]
-
-
-if __name__ == "__main__":
-    platform = SAP1_Nano()
-
+def make_top(
+    platform: SAP1_Nano,
+    program: list[int] = MULTIPLY_PROG,
+    timing: TimingProfile = HARDWARE,
+    panels: bool = True,
+) -> Module:
+    """
+    The whole board design: CPU, clock and programming control, front and LED panels
+    (unless panels is False)
+    """
     m = Module()
 
     # Create submodules
-    m.submodules.front_panel = front_panel = clocked_scanner()
+    m.submodules.front_panel = front_panel = clocked_scanner(timing)
 
-    m.submodules.clock_control = cc = ClockControl()
+    m.submodules.clock_control = cc = ClockControl(WAIT_BITS=timing.clock_wait_bits)
     m.submodules.prog_control = prog_control = ProgrammingControl()
-    m.submodules.sap1 = sap1 = cc.apply_to(SAP1(MULTIPLY_PROG))
+    m.submodules.sap1 = sap1 = cc.apply_to(SAP1(program))
     m.submodules.glue = TangGlue(sap1, cc, prog_control, front_panel)
-    m.submodules.panel_glue = SAP1Panel(sap1)
+    if not panels:
+        return m
+    m.submodules.panel_glue = SAP1Panel(sap1, timing)
 
     m.d.comb += platform.request("panel_alu").o.eq(m.submodules.panel_glue.alu_dout)
     m.d.comb += platform.request("panel_ctrl").o.eq(m.submodules.panel_glue.ctrl_dout)
     m.d.comb += platform.request("panel_mem").o.eq(m.submodules.panel_glue.mem_dout)
     m.d.comb += platform.request("panel_bus").o.eq(m.submodules.panel_glue.bus_dout)
+    return m
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .toolchain.build import add_arguments, command
+    from .workloads import WORKLOADS
 
-    print("Building...")
-    platform.build(
-        m,
-        do_program=False,
-        add_preferences='CLOCK_LOC "clk27_0__io" BUFG;',  # Put clock in global network
+    parser = argparse.ArgumentParser(description="Build the bitstream in build/")
+    parser.add_argument(
+        "-p", "--program", default="multiply", help=f"Any of: {', '.join(WORKLOADS)}"
+    )
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.program not in WORKLOADS:
+        parser.error(f"Unknown program {args.program!r}")
+    program = list(WORKLOADS[args.program].program)
+
+    command(
+        args,
+        lambda platform: make_top(platform, program),
+        key=("sap1.synth", program, HARDWARE),
+        design="board",
     )
@@ -0,0 +1,92 @@
+"""
+Timing profiles for the board-level components.
+
+Several components count clock cycles to produce real-time delays: the CPU clock
+divider in `ClockControl`, the switch scanner and the WS2812 LED panel protocol. With
+the hardware values, simulating anything at board level takes billions of cycles. A
+`TimingProfile` sets all of them together, so a simulation can use much shorter delays
+that keep the same relative ordering:
+
+    CPU step (slowest speed) > switch scan period > LED reset > LED bit
+
+The LED bit phases keep the WS2812 shape (a 0 bit is a short high pulse and a long low
+one, a 1 bit the opposite); the absolute WS2812 timings only hold for HARDWARE.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from fpga_io.led_panel import LEDPanel
+
+from . import clock_control
+
+SWITCHES = 16  # Switches in the scanned matrix (see front_panel.SwitchScanner)
+
+
+@dataclass(frozen=True)
+class TimingProfile:
+    """Delays, in cycles of the main clock"""
+
+    name: str
+    clock_wait_bits: int  # ClockControl waits 2**clock_wait_bits cycles per CPU step
+    scanner_delay: int  # Cycles per switch scanned
+    # LEDPanel phases (see LEDPanel.T_*)
+    led_t_high: int
+    led_t_data: int
+    led_t_low: int
+    led_t_wait: int
+
+    def __post_init__(self) -> None:
+        delays = (
+            self.scanner_delay,
+            self.led_t_high,
+            self.led_t_data,
+            self.led_t_low,
+            self.led_t_wait,
+        )
+        if self.clock_wait_bits < 1 or min(delays) < 1:
+            raise ValueError(f"Timing profile {self.name!r}: delays must be positive")
+        if not (
+            1 << self.clock_wait_bits
+            > self.scan_period
+            > self.led_t_wait
+            > self.led_bit_cycles
+        ):
+            raise ValueError(
+                f"Timing profile {self.name!r} must keep the ordering "
+                "CPU step > switch scan period > LED reset > LED bit"
+            )
+
+    @property
+    def scan_period(self) -> int:
+        """Cycles to scan every switch once"""
+        return self.scanner_delay * SWITCHES
+
+    @property
+    def led_bit_cycles(self) -> int:
+        """Cycles to send one WS2812 bit (every phase lasts one cycle more than its T)"""
+        return self.led_t_high + self.led_t_data + self.led_t_low + 3
+
+
+HARDWARE = TimingProfile(
+    name="hardware",
+    clock_wait_bits=clock_control.WAIT_BITS,
+    scanner_delay=27000,  # 1ms at 27MHz
+    led_t_high=LEDPanel.T_HIGH,
+    led_t_data=LEDPanel.T_DATA,
+    led_t_low=LEDPanel.T_LOW,
+    led_t_wait=LEDPanel.T_WAIT,
+)
+
+SIMULATION = TimingProfile(
+    name="simulation",
+    clock_wait_bits=10,
+    scanner_delay=16,
+    led_t_high=1,
+    led_t_data=1,
+    led_t_low=1,
+    led_t_wait=64,
+)
+
+PROFILES = {profile.name: profile for profile in (HARDWARE, SIMULATION)}
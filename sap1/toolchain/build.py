@@ -0,0 +1,186 @@
+"""
+Running the Gowin flow for a design, and reading back what it reports.
+
+`build()` is `platform.build` without programming, for any top (not only the synth
+one), into a given directory. It returns the `BuildReport` parsed from the tool logs.
+When a tool fails (or is missing), the report has what the earlier ones produced (e.g.
+yosys cell counts without nextpnr placement or Fmax) and the error.
+
+With a `BuildCache`, products of successful builds are stored, and restored instead of
+elaborating (same sources and key) or running the toolchain (same generated files).
+When only memory contents (the program) changed since the previous build in the same
+directory, its placed design is patched and packed again, skipping place and route.
+
+Every stage (elaboration, RTLIL emission, each tool) is timed, with its peak memory, in
+`BuildResult.stages`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from amaranth.hdl import Elaboratable, Fragment
+
+from ..bench import hierarchy, history
+from ..synth import CLOCK_PREFERENCES, SAP1_Nano
+from .cache import BuildCache
+from .patch import PatchError, repack
+from .reports import BuildReport
+from . import stages as profile
+from . import tools
+from .stages import Stage, measure, run_script
+
+BUILD_DIR = "build"
+
+
+@dataclass
+class BuildResult:
+    path: Path
+    name: str
+    report: BuildReport
+    error: str | None = None  # Why the flow stopped early, if it did
+    cached: bool = False  # Restored from the cache
+    repacked: bool = False  # Previous build patched with new memory contents
+    stages: list[Stage] = field(default_factory=list)
+
+    @property
+    def bitstream(self) -> Path | None:
+        path = self.path / f"{self.name}.fs"
+        return path if path.exists() and self.error is None else None
+
+
+def products(path: Path, name: str) -> list[str]:
+    """Names of the files a build of name wrote in path, oldest first"""
+    files = [
+        file
+        for pattern in (f"{name}.*", f"build_{name}.*")
+        for file in path.glob(pattern)
+        if file.is_file()
+    ]
+    # Restoring them in this order keeps outputs newer than their inputs
+    return [file.name for file in sorted(files, key=lambda file: file.stat().st_mtime)]
+
+
+def build(
+    make_top: Callable[[SAP1_Nano], Elaboratable],
+    name: str = "top",
+    build_dir: str | Path = BUILD_DIR,
+    platform: SAP1_Nano | None = None,
+    cache: BuildCache | None = None,
+    key: object = (),
+    patch: bool = True,
+    **kwargs,
+) -> BuildResult:
+    """
+    Synthesize, place and route and pack make_top(platform). kwargs are toolchain
+    overrides. key identifies what make_top builds beyond the sources (e.g. the program).
+    patch=False always places and routes
+    """
+    platform = platform or SAP1_Nano()
+    kwargs.setdefault("add_preferences", CLOCK_PREFERENCES)
+    path = Path(build_dir)
+
+    if cache is not None:
+        inputs = cache.key("build", name, key, sorted(kwargs.items()))
+        if cache.restore(inputs, path) is not None:
+            report = BuildReport.from_directory(path, name)
+            return BuildResult(path, name, report, cached=True)
+
+    stages: list[Stage] = []
+    with measure(stages, "elaborate"):
+        fragment = Fragment.get(make_top(platform), platform)
+    with measure(stages, "emit"):
+        plan = platform.prepare(fragment, name, **kwargs)
+
+    if cache is not None:
+        generated = cache.key("plan", plan.digest().hex(), sources=False)
+        if cache.restore(generated, path) is not None:
+            cache.save(inputs, path, products(path, name))
+            report = BuildReport.from_directory(path, name)
+            return BuildResult(path, name, report, cached=True, stages=stages)
+
+    error = None
+    repacked = False
+    try:
+        if patch:
+            try:
+                repack(plan, path, name, stages)
+                repacked = True
+            except PatchError:
+                pass  # Not only memory contents changed
+        if not repacked:
+            plan.extract(path)
+            run_script(path, name, stages)
+    except subprocess.CalledProcessError as exc:
+        error = f"{stages[-1].name} failed with exit status {exc.returncode}"
+    if cache is not None and error is None:
+        for entry in (inputs, generated):
+            cache.save(entry, path, products(path, name))
+    report = BuildReport.from_directory(path, name)
+    return BuildResult(path, name, report, error, repacked=repacked, stages=stages)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Build options of the commands calling `command`"""
+    parser.add_argument("--no-cache", action="store_true", help="Always rebuild")
+    parser.add_argument(
+        "--no-patch",
+        action="store_true",
+        help="Place and route even if only the program changed",
+    )
+    parser.add_argument(
+        "--toolchain",
+        choices=tools.PREFERENCES,
+        default="native",
+        help="Preferred tool builds, when both are on PATH (native by default)",
+    )
+    parser.add_argument(
+        "--wasm-cache", help="Sets YOWASP_CACHE_DIR, where YoWASP keeps the compiled tools"
+    )
+    parser.add_argument(
+        "--no-record", action="store_true", help="Don't add to the histories"
+    )
+
+
+def command(
+    args: argparse.Namespace,
+    make_top: Callable[[SAP1_Nano], Elaboratable],
+    key: object,
+    design: str,
+) -> BuildResult:
+    """
+    Build from the command line: select the tools, build, print and record the stages
+    and the resources of every submodule
+    """
+    selection = tools.configure(args.toolchain, args.wasm_cache)
+    print(f"Tools: {tools.describe(selection)}")
+    warm_up = Stage("wasm_warm_up", tools.warm_up(selection))
+
+    print("Building...")
+    result = build(
+        make_top,
+        cache=None if args.no_cache else BuildCache(),
+        key=key,
+        patch=not args.no_patch,
+    )
+    if result.cached:
+        print(f"Restored {result.path} from the build cache")
+    elif result.repacked:
+        print("Only the program changed: patched the placed design and packed it again")
+    if result.stages:
+        stages = [warm_up, *result.stages]
+        print(profile.table(stages))
+        if not args.no_record:
+            profile.record(design, stages)
+    if result.report.scopes:
+        scopes = hierarchy.breakdown(result.report)
+        print(hierarchy.table(scopes))
+        if not args.no_record:
+            history.append(hierarchy.HISTORY, hierarchy.metrics(design, scopes))
+    if result.error:
+        raise SystemExit(result.error)
+    return result
@@ -0,0 +1,207 @@
+"""
+Content-addressed cache of generated HDL and build products.
+
+Elaborating the design and running the Gowin flow are deterministic: the same inputs
+always give the same outputs. Entries are stored under two kinds of keys:
+
+- An input key, computed without elaborating anything: the hash of every Python source
+  file of the design packages (which includes the microcode tables), the versions of
+  Amaranth and of the toolchain, and the parameters the caller passes (program image,
+  timing profile, build options...). A hit skips elaboration and the toolchain.
+- The digest of the Amaranth `BuildPlan` (the RTLIL, constraints and scripts given to
+  the toolchain). A hit after an edit that didn't change the generated files (a
+  comment, a simulation-only module) skips the toolchain.
+
+Files are stored once, by their SHA-256, in `objects/`; entries in `entries/` map file
+names to those hashes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from importlib import metadata
+from pathlib import Path
+from typing import Iterable
+
+CACHE_DIR = "build/cache"
+# Packages whose sources define the design
+PACKAGES = ("sap1", "fpga_io", "dev_boards")
+# Distributions whose versions affect what is generated
+DISTRIBUTIONS = (
+    "amaranth",
+    "yowasp-yosys",
+    "yowasp-nextpnr-himbaechel-gowin",
+    "apycula",
+)
+# Environment variables selecting the tools (see dev_boards.tang_nano_20k)
+TOOL_VARIABLES = ("YOSYS", "NEXTPNR_HIMBAECHEL", "GOWIN_PACK", "AMARANTH_ENV_APICULA")
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def source_files(root: Path = ROOT, packages: Iterable[str] = PACKAGES) -> list[Path]:
+    return sorted(
+        path
+        for package in packages
+        for path in (root / package).rglob("*.py")
+        if "__pycache__" not in path.parts
+    )
+
+
+def source_digest(root: Path = ROOT, packages: Iterable[str] = PACKAGES) -> str:
+    hasher = hashlib.sha256()
+    for path in source_files(root, packages):
+        hasher.update(path.relative_to(root).as_posix().encode())
+        hasher.update(hashlib.sha256(path.read_bytes()).digest())
+    return hasher.hexdigest()
+
+
+def toolchain_fingerprint() -> dict[str, str | None]:
+    versions: dict[str, str | None] = {}
+    for name in DISTRIBUTIONS:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions | {name: os.environ.get(name) for name in TOOL_VARIABLES}
+
+
+class BuildCache:
+    def __init__(self, path: str | Path = CACHE_DIR) -> None:
+        self.path = Path(path)
+        self.hits = 0
+        self.misses = 0
+        self._sources: str | None = None
+
+    def key(self, *parts: object, sources: bool = True) -> str:
+        """
+        Key for parts (their repr must be deterministic) and the toolchain, and the
+        design sources unless the parts already identify the generated files
+        """
+        hasher = hashlib.sha256()
+        if sources:
+            if self._sources is None:
+                self._sources = source_digest()
+            hasher.update(self._sources.encode())
+        hasher.update(json.dumps(toolchain_fingerprint(), sort_keys=True).encode())
+        hasher.update(repr(parts).encode())
+        return hasher.hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.path / "entries" / f"{key}.json"
+
+    def _object(self, digest: str) -> Path:
+        return self.path / "objects" / digest[:2] / digest
+
+    @staticmethod
+    def _write(path: Path, content: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f".{path.name}.{os.getpid()}")
+        temporary.write_bytes(content)
+        temporary.replace(path)  # Atomic, for concurrent builds
+
+    def load(self, key: str) -> dict[str, bytes] | None:
+        """Files of an entry, or None if it isn't cached"""
+        entry = self._entry(key)
+        try:
+            manifest = json.loads(entry.read_text())
+            files = {
+                name: self._object(digest).read_bytes()
+                for name, digest in manifest.items()
+            }
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return files
+
+    def store(self, key: str, files: dict[str, bytes]) -> None:
+        manifest = {}
+        for name, content in files.items():
+            digest = hashlib.sha256(content).hexdigest()
+            if not self._object(digest).exists():
+                self._write(self._object(digest), content)
+            manifest[name] = digest
+        self._write(self._entry(key), json.dumps(manifest, indent=1).encode())
+
+    def restore(self, key: str, directory: str | Path) -> list[str] | None:
+        """Write the files of an entry into directory. None if it isn't cached"""
+        files = self.load(key)
+        if files is None:
+            return None
+        for name, content in files.items():
+            self._write(Path(directory) / name, content)
+        return list(files)
+
+    def save(self, key: str, directory: str | Path, names: Iterable[str]) -> None:
+        directory = Path(directory)
+        self.store(key, {name: (directory / name).read_bytes() for name in names})
+
+    def clear(self) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def size(self) -> tuple[int, int]:
+        """(entries, bytes stored)"""
+        entries = len(list((self.path / "entries").glob("*.json")))
+        stored = sum(
+            path.stat().st_size for path in (self.path / "objects").rglob("*")
+            if path.is_file()
+        )
+        return entries, stored
+
+
+def cached_main(design, *, key: object, name: str = "top", ports=()) -> None:
+    """
+    `amaranth.cli.main`, with `generate` going through the cache. key identifies the
+    design parameters that are not in the sources (e.g. the program)
+    """
+    from amaranth.back import cxxrtl, rtlil, verilog
+    from amaranth.cli import main_parser, main_runner
+
+    parser = main_parser()
+    args = parser.parse_args()
+    if args.action != "generate":
+        main_runner(parser, args, design, name=name, ports=ports)
+        return
+
+    generate_type = args.generate_type
+    if generate_type is None and args.generate_file:
+        generate_type = {".il": "il", ".cc": "cc", ".v": "v"}.get(
+            Path(args.generate_file).suffix
+        )
+    if generate_type is None:
+        parser.error("Unable to auto-detect language, specify explicitly with -t/--type")
+
+    cache = BuildCache()
+    port_names = [port.name for port in ports]
+    entry = cache.key("generate", key, generate_type, name, port_names, args.emit_src)
+    files = cache.load(entry)
+    if files is not None:
+        output = files["output"].decode()
+    else:
+        backend = {"il": rtlil, "cc": cxxrtl, "v": verilog}[generate_type]
+        output = backend.convert(design, name=name, ports=ports, emit_src=args.emit_src)
+        cache.store(entry, {"output": output.encode()})
+    if args.generate_file:
+        Path(args.generate_file).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build cache maintenance")
+    parser.add_argument("--path", default=CACHE_DIR)
+    parser.add_argument("--clear", action="store_true", help="Delete every entry")
+    args = parser.parse_args()
+
+    cache = BuildCache(args.path)
+    if args.clear:
+        cache.clear()
+    entries, stored = cache.size()
+    print(f"{cache.path}: {entries} entries, {stored / 1e6:.1f} MB")
+    print(f"Sources digest: {source_digest()[:16]}")
@@ -0,0 +1,214 @@
+"""
+Build farm: a matrix of design variants, programs and nextpnr seeds, built in parallel.
+
+Placement on the GW2A-18 is randomized by the nextpnr seed, and Fmax varies a lot from
+one seed to another. Every `Job` (variant, program, seed) runs the whole Gowin flow in
+its own directory under `build/farm/`, spread across a process pool (one job per CPU
+by default). Fmax and utilization of every job are collected in `results.json`, and the
+bitstream of the fastest seed of every (variant, program) is copied to
+`build/farm/{variant}-{program}.fs`.
+
+Builds go through the `BuildCache`, so running the same matrix again only builds the
+new jobs.
+"""
+
+from __future__ import annotations
+
+import json
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import product
+from pathlib import Path
+from typing import Callable, Sequence
+
+from amaranth.hdl import Elaboratable
+
+from ..bench.cores import code_addresses, core_top, monolith_top, translate
+from ..model.tstate import STEPS
+from ..synth import SAP1_Nano, make_top
+from ..workloads import WORKLOADS, Workload
+from .build import build
+from .cache import BuildCache
+from . import tools
+from .reports import BuildReport
+
+BUILD_DIR = "build/farm"
+SEEDS = 4
+
+
+def _monolith(platform: SAP1_Nano, workload: Workload) -> Elaboratable:
+    code = code_addresses(workload.program, workload.max_cycles // STEPS)
+    return monolith_top(platform, translate(workload.program, code))
+
+
+# Tops by variant name, running a workload
+VARIANTS: dict[str, Callable[[SAP1_Nano, Workload], Elaboratable]] = {
+    "board": lambda platform, workload: make_top(platform, list(workload.program)),
+    "board_nopanels": lambda platform, workload: make_top(
+        platform, list(workload.program), panels=False
+    ),
+    "core": lambda platform, workload: core_top(platform, workload.program),
+    "monolith": _monolith,
+}
+
+
+@dataclass(frozen=True)
+class Job:
+    variant: str
+    program: str  # Workload name
+    seed: int
+
+    @property
+    def design(self) -> str:
+        return f"{self.variant}-{self.program}"
+
+    @property
+    def name(self) -> str:
+        return f"{self.design}-s{self.seed}"
+
+
+@dataclass
+class JobResult:
+    job: Job
+    path: Path
+    report: BuildReport
+    error: str | None
+    cached: bool
+    seconds: float
+
+    @property
+    def fmax(self) -> float | None:
+        """Of the slowest clock"""
+        return min(self.report.fmax.values()) if self.report.fmax else None
+
+    @property
+    def bitstream(self) -> Path | None:
+        path = self.path / "top.fs"
+        return path if path.exists() and self.error is None else None
+
+
+def jobs(
+    variants: Sequence[str], programs: Sequence[str], seeds: Sequence[int]
+) -> list[Job]:
+    return [Job(*job) for job in product(variants, programs, seeds)]
+
+
+def run_job(
+    job: Job, build_dir: str | Path = BUILD_DIR, cache: bool = True
+) -> JobResult:
+    workload = WORKLOADS[job.program]
+    start = time.perf_counter()
+    result = build(
+        lambda platform: VARIANTS[job.variant](platform, workload),
+        build_dir=Path(build_dir) / job.name,
+        cache=BuildCache() if cache else None,
+        key=("sap1.toolchain.farm", job.variant, workload.program),
+        patch=False,  # Each job has its own directory
+        nextpnr_opts=f"--seed {job.seed}",
+    )
+    seconds = time.perf_counter() - start
+    return JobResult(
+        job, result.path, result.report, result.error, result.cached, seconds
+    )
+
+
+def run(
+    matrix: Sequence[Job],
+    build_dir: str | Path = BUILD_DIR,
+    processes: int | None = None,
+    cache: bool = True,
+) -> list[JobResult]:
+    """Build the jobs across a process pool (every CPU by default), in order"""
+    with ProcessPoolExecutor(processes) as pool:
+        futures = [pool.submit(run_job, job, build_dir, cache) for job in matrix]
+        return [future.result() for future in futures]
+
+
+def best(results: Sequence[JobResult]) -> dict[str, JobResult]:
+    """Fastest job with a bitstream, by design. Designs without an Fmax aren't included"""
+    fastest: dict[str, JobResult] = {}
+    for result in results:
+        if result.bitstream is None or result.fmax is None:
+            continue
+        current = fastest.get(result.job.design)
+        if current is None or result.fmax > current.fmax:
+            fastest[result.job.design] = result
+    return fastest
+
+
+def save(results: Sequence[JobResult], build_dir: str | Path = BUILD_DIR) -> Path:
+    """Write results.json and copy the best bitstreams. Returns the results path"""
+    build_dir = Path(build_dir)
+    fastest = best(results)
+    for design, result in fastest.items():
+        shutil.copyfile(result.bitstream, build_dir / f"{design}.fs")
+    summary = [
+        {
+            "job": result.job.name,
+            **vars(result.job),
+            "error": result.error,
+            "seconds": result.seconds,
+            "placed": result.report.placed,
+            "resources": result.report.resources,
+            "fmax": result.report.fmax,
+            "best": fastest.get(result.job.design) is result,
+        }
+        for result in results
+    ]
+    path = build_dir / "results.json"
+    path.write_text(json.dumps(summary, indent=1))
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build variants with several seeds")
+    parser.add_argument(
+        "-v", "--variants", nargs="+", default=["board"], help=", ".join(VARIANTS)
+    )
+    parser.add_argument(
+        "-p", "--programs", nargs="+", default=["multiply"], help=", ".join(WORKLOADS)
+    )
+    parser.add_argument("-s", "--seeds", type=int, default=SEEDS, help="Seeds 1 to SEEDS")
+    parser.add_argument("-j", "--processes", type=int, default=None)
+    parser.add_argument("--build-dir", default=BUILD_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="Always rebuild")
+    parser.add_argument("--toolchain", choices=tools.PREFERENCES, default="native")
+    parser.add_argument(
+        "--wasm-cache", help="Sets YOWASP_CACHE_DIR, where YoWASP keeps the compiled tools"
+    )
+    args = parser.parse_args()
+    for name in args.variants:
+        if name not in VARIANTS:
+            parser.error(f"Unknown variant {name!r}")
+    for name in args.programs:
+        if name not in WORKLOADS:
+            parser.error(f"Unknown program {name!r}")
+
+    # Compile the YoWASP tools once, not in every worker at the same time
+    tools.warm_up(tools.configure(args.toolchain, args.wasm_cache))
+    matrix = jobs(args.variants, args.programs, range(1, args.seeds + 1))
+    start = time.perf_counter()
+    results = run(matrix, args.build_dir, args.processes, not args.no_cache)
+    elapsed = time.perf_counter() - start
+
+    print("Job                               LUT    FF   ALU  SSRAM  Fmax (MHz)    Time")
+    fastest = best(results)
+    for result in results:
+        resources = result.report.resources
+        fmax = f"{result.fmax:.1f}" if result.fmax is not None else "-"
+        marker = "*" if fastest.get(result.job.design) is result else " "
+        status = "cached" if result.cached else f"{result.seconds:.0f}s"
+        print(
+            f"{result.job.name:32} {resources['lut']:4} {resources['ff']:5}"
+            f" {resources['alu']:5} {resources['ssram']:6} {fmax:>10}{marker} {status:>7}"
+        )
+        if result.error:
+            print(f"    {result.error}")
+    path = save(results, args.build_dir)
+    print(f"{len(results)} jobs in {elapsed:.0f}s, results in {path}")
+    for design, result in fastest.items():
+        print(f"Best {design}: seed {result.job.seed}, {result.fmax:.1f} MHz")
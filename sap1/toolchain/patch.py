@@ -0,0 +1,383 @@
+"""
+Rebuilding a bitstream when only memory contents changed, without place and route.
+
+Changing the program only changes the `$meminit_v2` cells of the RTLIL. Yosys maps the
+16-word RAM to Gowin shadow SRAM cells (`RAM16SDP4` and friends, one per read port and
+slice, named "{memory}.{port}.{slice}"), whose `INIT_<k>` parameters hold bit
+`slice * width + k` of every word (last character is word 0). nextpnr-himbaechel keeps
+them, and packs every `INIT_<k>` into the LUT "{ram}_LUT{k}" of the same slice: the
+LUTs are what gowin_pack writes to the bitstream. Placement and routing don't depend on
+their contents, so the placed netlist of the previous build (`{name}.pnr.json`) can be
+patched with the new contents and given to `gowin_pack` alone.
+
+`repack` checks that the new build plan differs from the one in the build directory
+only by memory contents, locates the RAM cells and their LUTs by matching their `INIT`
+parameters with the previous contents, and checks the patched netlist by reading the
+contents back. It raises `PatchError` (nothing is written) when any of this doesn't
+hold, so the caller can fall back to a full build.
+
+These assumptions are checked against real placed netlists in `fixtures/` (`python -m
+sap1.toolchain.patch`); a repacked bitstream was the same as the one of a full build.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from amaranth.build.plat import BuildPlan
+
+from .stages import Stage, run_script
+
+# Memory cells of builds of the board with two programs (see check_fixture)
+FIXTURE = Path(__file__).parent / "fixtures" / "ssram_gw2a18.json"
+RAM_DEPTH = 16
+# Data bits of the Gowin shadow SRAM cells
+RAM_WIDTHS = {
+    "RAM16S1": 1,
+    "RAM16S2": 2,
+    "RAM16S4": 4,
+    "RAM16SDP1": 1,
+    "RAM16SDP2": 2,
+    "RAM16SDP4": 4,
+}
+# Stages of the build script that repack skips
+PLACE_AND_ROUTE = ("yosys", "nextpnr_himbaechel")
+
+_CONSTANT = re.compile(r"(\d+)'([01xz]+)")
+
+
+class PatchError(Exception):
+    """The previous build can't be patched into the new one"""
+
+
+@dataclass(frozen=True)
+class MemoryInit:
+    memory: str
+    width: int
+    words: int
+    data: int  # Word i is bits [i * width, (i + 1) * width)
+
+    def word(self, address: int) -> int:
+        return (self.data >> (address * self.width)) & ((1 << self.width) - 1)
+
+    def column(self, bit: int) -> str:
+        """INIT value of a shadow SRAM storing bit of every word"""
+        return "".join(
+            str((self.word(address) >> bit) & 1) if address < self.words else "0"
+            for address in reversed(range(RAM_DEPTH))
+        )
+
+
+def _constant(text: str) -> int:
+    match = _CONSTANT.fullmatch(text)
+    if match is None or not set(match[2]) <= {"0", "1"}:
+        raise PatchError(f"Unsupported memory init value {text[:40]}")
+    return int(match[2], 2)
+
+
+def memory_inits(rtlil: str) -> list[MemoryInit]:
+    """Every `$meminit_v2` cell of an RTLIL design, in order"""
+    inits = []
+    cell: dict[str, str] | None = None
+    for line in rtlil.splitlines():
+        words = line.split()
+        if words[:2] == ["cell", "$meminit_v2"]:
+            cell = {}
+        elif cell is not None and words[:1] == ["end"]:
+            inits.append(
+                MemoryInit(
+                    cell["MEMID"],
+                    int(cell["WIDTH"]),
+                    int(cell["WORDS"]),
+                    _constant(cell["DATA"]),
+                )
+            )
+            cell = None
+        elif cell is not None and len(words) == 3:
+            if words[0] in ("parameter", "connect"):
+                cell[words[1].lstrip("\\")] = words[2]
+    return inits
+
+
+def init_changes(old: str, new: str) -> list[tuple[MemoryInit, MemoryInit]]:
+    """
+    (old, new) contents of the memories that differ between two RTLIL designs. Raises
+    PatchError if anything else differs (source locations may, they aren't logic)
+    """
+    old_lines, new_lines = old.splitlines(), new.splitlines()
+    if len(old_lines) != len(new_lines):
+        raise PatchError("The design changed")
+    cell = None  # Type of the cell the lines are in
+    for old_line, new_line in zip(old_lines, new_lines):
+        words = new_line.split()
+        if words[:1] == ["cell"]:
+            cell = words[1]
+        elif words[:1] == ["end"]:
+            cell = None
+        if old_line == new_line:
+            continue
+        # Write and read ports of memories have a DATA connection too
+        contents = cell == "$meminit_v2" and words[:2] == ["connect", "\\DATA"]
+        if not contents and words[:2] != ["attribute", "\\src"]:
+            raise PatchError(f"The design changed: {new_line.strip()[:60]}")
+    changes = [
+        (before, after)
+        for before, after in zip(memory_inits(old), memory_inits(new))
+        if before != after
+    ]
+    if not changes and old != new:
+        raise PatchError("The design changed, but no memory contents")
+    for before, after in changes:
+        if (before.memory, before.width, before.words) != (
+            after.memory,
+            after.width,
+            after.words,
+        ):
+            raise PatchError(f"Memory {after.memory} changed shape")
+        if after.words > RAM_DEPTH:
+            raise PatchError(f"Memory {after.memory} is larger than a shadow SRAM")
+    return changes
+
+
+def _value(parameter: object) -> str | None:
+    """A 16-bit parameter as a string of bits (None for other parameters)"""
+    if isinstance(parameter, int):
+        if parameter >> RAM_DEPTH:
+            return None
+        return format(parameter, f"0{RAM_DEPTH}b")
+    if isinstance(parameter, str) and len(parameter) == RAM_DEPTH:
+        return parameter if set(parameter) <= {"0", "1"} else None
+    return None
+
+
+def _cells(netlist: dict) -> dict[str, dict]:
+    return {
+        name: cell
+        for module in netlist["modules"].values()
+        for name, cell in module["cells"].items()
+    }
+
+
+def _placed(cells: dict[str, dict]) -> bool:
+    return any("NEXTPNR_BEL" in cell.get("attributes", {}) for cell in cells.values())
+
+
+def _slice(name: str) -> int | None:
+    """Slice number of a RAM cell named "{memory}.{port}.{slice}" """
+    try:
+        return int(name.rsplit(".", 1)[-1])
+    except ValueError:
+        return None
+
+
+def patch_netlist(
+    netlist: dict, changes: list[tuple[MemoryInit, MemoryInit]]
+) -> list[str]:
+    """
+    Replace the contents of the RAM cells of a (yosys or nextpnr) JSON netlist, and in a
+    placed one of the LUTs they were packed into ("{ram}_LUT{k}", whose INIT is the
+    INIT_<k> of the RAM, and the ones gowin_pack writes), checking them by reading the
+    contents back. Returns the patched cells
+    """
+    cells = _cells(netlist)
+    placed = _placed(cells)
+    new_inits: dict[str, dict[str, str]] = {}  # Name of a cell: new parameters
+    memories: dict[str, MemoryInit] = {}  # Name of a RAM cell: new contents
+    covered: list[set[int]] = [set() for _ in changes]
+    for name, cell in cells.items():
+        width = RAM_WIDTHS.get(cell["type"])
+        offset = _slice(name)
+        if width is None or offset is None:
+            continue
+        bits = range(offset * width, (offset + 1) * width)
+        inits = [_value(cell["parameters"].get(f"INIT_{k}")) for k in range(width)]
+        # Bits past the width of the memory are 0 (column() gives them so)
+        matches = [
+            idx
+            for idx, (before, _) in enumerate(changes)
+            if inits == [before.column(bit) for bit in bits]
+        ]
+        if len({changes[idx][1] for idx in matches}) > 1:
+            raise PatchError(f"Contents of {name} match several memories")
+        if not matches:
+            continue
+        before, after = changes[matches[0]]
+        memories[name] = after
+        new_inits[name] = {f"INIT_{k}": after.column(bit) for k, bit in enumerate(bits)}
+        for k, bit in enumerate(bits):
+            if not placed:
+                continue
+            lut = cells.get(f"{name}_LUT{k}", {"parameters": {}})
+            if _value(lut["parameters"].get("INIT")) != before.column(bit):
+                raise PatchError(f"LUT {k} of {name} not found in the placed netlist")
+            new_inits[f"{name}_LUT{k}"] = {"INIT": after.column(bit)}
+        for idx in matches:
+            covered[idx].update(bits)
+    for (before, _), bits in zip(changes, covered):
+        if not bits >= set(range(before.width)):
+            raise PatchError(f"RAM cells of memory {before.memory} not found")
+
+    # Other cells of the memories that may still hold old contents
+    prefixes = tuple({ram.rsplit(".", 2)[0] for ram in memories})
+    stale = {
+        before.column(bit)
+        for before, after in changes
+        for bit in range(before.width)
+        if before.column(bit) != after.column(bit)
+        and len(set(before.column(bit))) > 1  # Constant columns are too common to track
+    }
+    for name, cell in cells.items():
+        if name in new_inits or not name.startswith(prefixes):
+            continue
+        for parameter in cell["parameters"].values():
+            if _value(parameter) in stale:
+                raise PatchError(f"Cell {name} may hold memory contents")
+
+    for name, parameters in new_inits.items():
+        for key, value in parameters.items():
+            old = cells[name]["parameters"][key]
+            new = value if isinstance(old, str) else int(value, 2)
+            cells[name]["parameters"][key] = new
+    # Every port of a memory has its own copy ("{memory}.{port}.{slice}" RAM cells)
+    ports: dict[str, list[str]] = {}
+    for ram in memories:
+        ports.setdefault(ram.rsplit(".", 1)[0], []).append(ram)
+    for port, rams in ports.items():
+        after = memories[rams[0]]
+        expected = [
+            after.word(address) if address < after.words else 0
+            for address in range(RAM_DEPTH)
+        ]
+        if read_back(netlist, rams, after.width) != expected:
+            raise PatchError(f"Contents read back from {port} don't match")
+    return sorted(new_inits)
+
+
+def read_back(netlist: dict, rams: list[str], width: int) -> list[int]:
+    """
+    Words of a memory of width bits, from the RAM cells storing its slices. In a placed
+    netlist they are read from the LUTs gowin_pack writes, which must match the RAM
+    cells
+    """
+    cells = _cells(netlist)
+    placed = _placed(cells)
+    words = [0] * RAM_DEPTH
+    found = set()
+    for ram in rams:
+        ram_width = RAM_WIDTHS[cells[ram]["type"]]
+        for k in range(ram_width):
+            bit = _slice(ram) * ram_width + k
+            init = _value(cells[ram]["parameters"][f"INIT_{k}"])
+            if placed and _value(cells[f"{ram}_LUT{k}"]["parameters"]["INIT"]) != init:
+                raise PatchError(f"LUT {k} of {ram} doesn't match the RAM cell")
+            for address in range(RAM_DEPTH):
+                # The last character is address 0
+                words[address] |= int(init[RAM_DEPTH - 1 - address]) << bit
+            found.add(bit)
+    if not found >= set(range(width)):
+        raise PatchError(f"Missing slices of {rams[0].rsplit('.', 1)[0]}")
+    return [word & ((1 << width) - 1) for word in words]
+
+
+def repack(
+    plan: BuildPlan, path: Path, name: str, stages: list[Stage] | None = None
+) -> list[str]:
+    """
+    Build plan by patching the previous build in path and running only the packer
+    (added to stages). Returns the patched cells
+    """
+    stages = [] if stages is None else stages
+    previous = {
+        suffix: path / f"{name}.{suffix}" for suffix in ("il", "pnr.json", "fs")
+    }
+    if not all(file.exists() for file in previous.values()):
+        raise PatchError("No previous build")
+    # A failed build leaves the files of the steps before the failure
+    times = [file.stat().st_mtime for file in previous.values()]
+    if times != sorted(times):
+        raise PatchError("The previous build didn't complete")
+    for filename, content in plan.files.items():
+        if filename in (f"{name}.il", f"{name}.debug.v"):
+            continue
+        if isinstance(content, str):
+            content = content.encode()
+        file = path / filename
+        if not file.exists() or file.read_bytes() != content:
+            raise PatchError(f"{filename} changed")
+
+    changes = init_changes(previous["il"].read_text(), plan.files[f"{name}.il"])
+    netlist = json.loads(previous["pnr.json"].read_text())
+    patched = patch_netlist(netlist, changes)
+
+    for filename in (f"{name}.il", f"{name}.debug.v"):
+        if filename in plan.files:
+            (path / filename).write_text(plan.files[filename])
+    previous["pnr.json"].write_text(json.dumps(netlist, indent=2))
+    run_script(path, name, stages, skip=PLACE_AND_ROUTE)
+    return patched
+
+
+def check_fixture(path: str | Path = FIXTURE) -> list[str]:
+    """
+    Check patch_netlist against the memory cells of builds placed by nextpnr, with
+    different programs: the contents read back from each must be its program, and
+    patching the first build with the program of another one must give the cells of
+    that build. Patching without one of the LUTs, or when a memory write port is
+    rewired, must fail. Returns the patched cells, raises PatchError otherwise
+    """
+    fixture = json.loads(Path(path).read_text())
+    builds = fixture["builds"]
+    inits = {}
+    for name, build in builds.items():
+        (init,) = memory_inits(build["rtlil"])
+        program = build["program"] + [0] * (RAM_DEPTH - len(build["program"]))
+        cells = _cells(build["netlist"])
+        ports: dict[str, list[str]] = {}
+        for cell_name, cell in cells.items():
+            if cell["type"] in RAM_WIDTHS:
+                ports.setdefault(cell_name.rsplit(".", 1)[0], []).append(cell_name)
+        if [init.word(address) for address in range(RAM_DEPTH)] != program:
+            raise PatchError(f"RTLIL of {name} doesn't hold its program")
+        for rams in ports.values():
+            if read_back(build["netlist"], rams, init.width) != program:
+                raise PatchError(f"Contents read back from {name} aren't its program")
+        inits[name] = init
+
+    first, *others = builds
+    rtlil = {name: build["rtlil"] + fixture["memwr"] for name, build in builds.items()}
+    patched = []
+    for name in others:
+        netlist = json.loads(json.dumps(builds[first]["netlist"]))
+        patched = patch_netlist(netlist, init_changes(rtlil[first], rtlil[name]))
+        if _cells(netlist) != _cells(builds[name]["netlist"]):
+            raise PatchError(f"Patching {first} with the program of {name} differs")
+
+    netlist = json.loads(json.dumps(builds[first]["netlist"]))
+    # Without one of the LUTs, the old contents would stay in the bitstream
+    del netlist["modules"]["top"]["cells"][next(c for c in patched if "_LUT" in c)]
+    rewired = rtlil[first].replace("\\_write__data [7:0]", "8'00000000")
+    failures = {
+        "a placed netlist without all its LUTs": lambda: patch_netlist(
+            netlist, [(inits[first], inits[others[0]])]
+        ),
+        "a design with another memory write port": lambda: init_changes(
+            rtlil[first], rewired
+        ),
+    }
+    for what, attempt in failures.items():
+        try:
+            attempt()
+        except PatchError:
+            continue
+        raise PatchError(f"Patching {what} didn't fail")
+    return patched
+
+if __name__ == "__main__":
+    import sys
+
+    # Usage: python -m sap1.toolchain.patch [fixture]
+    cells = check_fixture(*sys.argv[1:])
+    print(f"Fixture OK: {len(cells)} cells patched,", ", ".join(cells[:5]), "...")
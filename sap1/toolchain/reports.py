@@ -0,0 +1,190 @@
+"""
+Parsing of the Gowin flow (yosys, nextpnr) logs left in the build directory.
+
+The Amaranth Gowin platform runs yosys with `-l {name}.rpt` and nextpnr with
+`--log {name}.tim`. From those:
+
+- `yosys_cells`: cell counts of the synthesized design (from the final `stat`),
+- `nextpnr_utilization`: used and available cells of the placed design,
+- `nextpnr_fmax`: maximum frequency reported for every clock,
+
+and `resources` groups cell types into LUT, MUX, FF, ALU, SSRAM, BSRAM and IO counts.
+
+The synthesized netlist (`{name}.syn.json`) is flattened, but cell names keep the
+Amaranth hierarchy (yosys names mapped cells after the nets they drive, e.g.
+`sap1.alu.carry_flag_DFFRE_Q`), and the `$scopeinfo` cells list the submodules.
+`scope_cells` counts cells per submodule from them: an approximation, as logic between
+modules is attributed to the module of the net it drives.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+CATEGORIES = ("lut", "mux", "ff", "alu", "ssram", "bsram", "io")
+BSRAM_CELLS = {
+    *("SP", "SPX9", "SDP", "SDPB", "SDPX9", "SDPX9B", "DP", "DPB", "DPX9", "DPX9B"),
+    *("PROM", "PROMX9", "BSRAM"),
+}
+
+_STAT_SECTION = re.compile(r"^=== (.+) ===$", re.MULTILINE)
+# "       43   LUT4" (yosys >= 0.4x) or "     LUT4       43" (older)
+_STAT_CELL = re.compile(r"^\s+(\d+)\s{3}(\S+)$|^\s{5}(\S+)\s+(\d+)$")
+_UTILIZATION = re.compile(r"^Info:\s+(\S+):\s+(\d+)/\s*(\d+)\s+\d+%$", re.MULTILINE)
+_FMAX = re.compile(r"Max frequency for clock\s+'([^']+)':\s+([\d.]+) MHz")
+
+
+def category(cell: str) -> str | None:
+    """Resource category of a Gowin cell type (None for the ones not counted)"""
+    name = cell.upper()
+    if name.startswith("MUX2_"):
+        return "mux"
+    if re.fullmatch(r"LUT\d", name):
+        return "lut"
+    if name.startswith("DFF"):
+        return "ff"
+    if name == "ALU":
+        return "alu"
+    if name.startswith("RAM16"):
+        return "ssram"
+    if name in BSRAM_CELLS:
+        return "bsram"
+    if name.endswith("BUF") or name.startswith("IOB"):
+        return "io"
+    return None
+
+
+def resources(cells: dict[str, int]) -> dict[str, int]:
+    """Totals per category, of cell counts by type"""
+    totals = dict.fromkeys(CATEGORIES, 0)
+    for cell, count in cells.items():
+        kind = category(cell)
+        if kind is not None:
+            totals[kind] += count
+    return totals
+
+
+def yosys_stat_sections(log: str) -> dict[str, dict[str, int]]:
+    """Cell counts of every module in the last `stat` of a yosys log"""
+    sections: dict[str, dict[str, int]] = {}
+    matches = list(_STAT_SECTION.finditer(log))
+    for idx, match in enumerate(matches):
+        end = matches[idx + 1].start() if idx + 1 < len(matches) else len(log)
+        cells = {}
+        for line in log[match.end() : end].splitlines():
+            if not line.strip():
+                if cells:
+                    break  # End of the table
+                continue
+            parsed = _STAT_CELL.match(line)
+            if parsed:
+                count, cell = parsed[1] or parsed[4], parsed[2] or parsed[3]
+                if not cell.startswith("$"):
+                    cells[cell] = int(count)
+        # Later stat runs replace the earlier ones
+        sections[match[1]] = cells
+    return sections
+
+
+def yosys_cells(log: str, top: str | None = None) -> dict[str, int]:
+    """Cell counts of the top module (the design is flattened by synth_gowin)"""
+    sections = yosys_stat_sections(log)
+    sections.pop("design hierarchy", None)
+    if not sections:
+        raise ValueError("No stat output in yosys log")
+    return sections[top] if top is not None else list(sections.values())[-1]
+
+
+def scope_cells(netlist: dict, top: str = "top") -> dict[str, dict[str, int]]:
+    """Cell counts by type of every submodule, not including its own submodules"""
+    module = netlist["modules"][top]
+    scopes = {
+        name for name, cell in module["cells"].items() if cell["type"] == "$scopeinfo"
+    }
+    counts: dict[str, dict[str, int]] = {}
+    for name, cell in module["cells"].items():
+        if cell["type"].startswith("$"):
+            continue
+        parts = name.split(".")
+        scope = next(
+            (
+                ".".join(parts[:end])
+                for end in range(len(parts) - 1, 0, -1)
+                if ".".join(parts[:end]) in scopes
+            ),
+            "",
+        )
+        counts.setdefault(scope, {})
+        counts[scope][cell["type"]] = counts[scope].get(cell["type"], 0) + 1
+    return counts
+
+
+def hierarchy(
+    scopes: dict[str, dict[str, int]], depth: int = 2
+) -> dict[str, dict[str, int]]:
+    """
+    Resources of every submodule down to depth, including its own submodules. "" is
+    the top module, with everything
+    """
+    totals: dict[str, dict[str, int]] = {}
+    for scope, cells in scopes.items():
+        parts = scope.split(".") if scope else []
+        for end in range(min(len(parts), depth) + 1):
+            name = ".".join(parts[:end])
+            total = totals.setdefault(name, dict.fromkeys(CATEGORIES, 0))
+            for kind, count in resources(cells).items():
+                total[kind] += count
+    return dict(sorted(totals.items()))
+
+
+def nextpnr_utilization(log: str) -> dict[str, tuple[int, int]]:
+    """(used, available) per cell type, from the last device utilisation report"""
+    utilization = {}
+    for cell, used, available in _UTILIZATION.findall(log):
+        utilization[cell] = (int(used), int(available))
+    return utilization
+
+
+def nextpnr_fmax(log: str) -> dict[str, float]:
+    """Maximum frequency in MHz per clock (the last estimate, after routing)"""
+    return {clock: float(mhz) for clock, mhz in _FMAX.findall(log)}
+
+
+@dataclass
+class BuildReport:
+    """What the logs of a build say. Empty fields when a tool didn't run"""
+
+    cells: dict[str, int] = field(default_factory=dict)  # After synthesis
+    utilization: dict[str, tuple[int, int]] = field(default_factory=dict)  # Placed
+    fmax: dict[str, float] = field(default_factory=dict)
+    scopes: dict[str, dict[str, int]] = field(default_factory=dict)  # After synthesis
+
+    @classmethod
+    def from_directory(cls, path: str | Path, name: str = "top") -> BuildReport:
+        path = Path(path)
+        report = cls()
+        rpt, tim = path / f"{name}.rpt", path / f"{name}.tim"
+        if rpt.exists():
+            report.cells = yosys_cells(rpt.read_text(errors="replace"), name)
+        netlist = path / f"{name}.syn.json"
+        if netlist.exists():
+            report.scopes = scope_cells(json.loads(netlist.read_text()), name)
+        if tim.exists():
+            log = tim.read_text(errors="replace")
+            report.utilization = nextpnr_utilization(log)
+            report.fmax = nextpnr_fmax(log)
+        return report
+
+    @property
+    def resources(self) -> dict[str, int]:
+        """Per category, from placement if available, or else from synthesis"""
+        if self.utilization:
+            return resources({cell: used for cell, (used, _) in self.utilization.items()})
+        return resources(self.cells)
+
+    @property
+    def placed(self) -> bool:
+        return bool(self.utilization)
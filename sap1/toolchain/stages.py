@@ -0,0 +1,100 @@
+"""
+Wall time and peak memory of every stage of a build.
+
+The in-process stages are measured around the calls: elaboration (`Fragment.get` of
+the top) and emission (`platform.prepare`: domain lowering, pins, RTLIL and the debug
+Verilog). Their peak memory is the peak resident size of this process so far, as Python
+doesn't give a peak per stage.
+
+The tools run one at a time instead of through the build script: every line of it that
+invokes a tool (`"$YOSYS" ...`) runs in its own shell, after the lines setting up the
+environment, and its peak resident size comes from the `wait4` resource usage (at least
+the size of this process, which the forked shell starts as). POSIX only, like the build
+script itself.
+"""
+
+from __future__ import annotations
+
+import os
+import resource
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Collection, Iterator
+
+from ..bench import history
+
+HISTORY = "build/bench/stages.json"
+
+
+@dataclass
+class Stage:
+    name: str
+    seconds: float
+    peak_mb: float | None = None  # Unknown for some stages
+
+
+def _mb(maxrss: int) -> float:
+    """ru_maxrss is in kilobytes on Linux, in bytes on macOS"""
+    return maxrss / (1 << 20) if sys.platform == "darwin" else maxrss / 1024
+
+
+@contextmanager
+def measure(stages: list[Stage], name: str) -> Iterator[None]:
+    """Add an in-process stage to stages"""
+    start = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - start
+    peak = _mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    stages.append(Stage(name, seconds, peak))
+
+
+def tool_name(step: str) -> str:
+    """Stage name of a build script line, e.g. "yosys" for "$YOSYS" """
+    return step.split('"')[1].lstrip("$").lower()
+
+
+def run_script(
+    path: str | Path, name: str, stages: list[Stage], skip: Collection[str] = ()
+) -> None:
+    """
+    Run the tools of the build script of name in path, but the ones in skip (by stage
+    name), adding them to stages. Raises CalledProcessError when one fails
+    """
+    lines = (Path(path) / f"build_{name}.sh").read_text().splitlines()
+    setup = [line for line in lines if not line.startswith('"$')]
+    for step in lines:
+        if not step.startswith('"$') or tool_name(step) in skip:
+            continue
+        start = time.perf_counter()
+        process = subprocess.Popen(["sh", "-c", "\n".join([*setup, step])], cwd=path)
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        stages.append(
+            Stage(tool_name(step), time.perf_counter() - start, _mb(usage.ru_maxrss))
+        )
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, step)
+
+
+def table(stages: list[Stage]) -> str:
+    lines = ["Stage                Time (s)  Peak memory (MB)"]
+    for stage in stages:
+        peak = "-" if stage.peak_mb is None else f"{stage.peak_mb:.0f}"
+        lines.append(f"{stage.name:20} {stage.seconds:8.2f}  {peak:>16}")
+    total = sum(stage.seconds for stage in stages)
+    lines.append(f"{'total':20} {total:8.2f}")
+    return "\n".join(lines)
+
+
+def record(design: str, stages: list[Stage], path: str | Path = HISTORY) -> None:
+    """Add the stages of a build of design to the JSON history"""
+    results = {
+        f"{design}:{stage.name}": {"seconds": stage.seconds}
+        | ({} if stage.peak_mb is None else {"peak_mb": stage.peak_mb})
+        for stage in stages
+    }
+    history.append(path, results)
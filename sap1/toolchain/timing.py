@@ -0,0 +1,230 @@
+"""
+Critical paths of a placed design, mapped back to the Amaranth source.
+
+nextpnr logs a critical path report per clock (in `{name}.tim`): the chain of cell
+outputs ("Source"), nets and cell inputs ("Sink") with their delays. Yosys keeps the
+`src` attributes Amaranth writes in the RTLIL on the nets, and on the cells it doesn't
+map through its techmap libraries. `SourceMap` reads them from the JSON netlist, and
+locates a cell by its own `src`, or else by the net it was named after (yosys names
+mapped cells `{net}_{TYPE}_{PORT}...`), or else by the nets it drives.
+
+`limiting` then adds up the delay of every path step by source line and by module
+(the hierarchy in the cell or net name), which tells which constructs limit Fmax.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .cache import ROOT
+
+_HEADER = re.compile(r"Critical path report for (.+):$")
+_STEP = re.compile(
+    r"^(?:(?P<kind>[a-z-]+)\s+)?(?P<delay>-?\d+\.\d+)\s+(?P<total>-?\d+\.\d+)\s+"
+    r"(?P<what>Source|Net|Sink)\s+(?P<name>\S+)"
+)
+_SINK = re.compile(r"^Sink\s+(\S+)$")
+_LOCATION = re.compile(r"^(\S+:\d+\S*)$")
+_SUMMARY = re.compile(r"^(-?\d+\.\d+) ns logic, (-?\d+\.\d+) ns routing$")
+_BIT = re.compile(r"\[\d+\]$")
+# Source locations of yosys' own techmap libraries, that say nothing about the design
+_TECHMAP = re.compile(r"(^|/)share/|_map\.v:|^techlibs/")
+
+
+@dataclass
+class Step:
+    what: str  # Source (a cell output), Net or Sink (a cell input)
+    name: str  # "{cell}.{port}" or the net
+    delay: float  # ns
+    kind: str = ""  # clk-to-q, logic, routing, setup... (recent nextpnr only)
+    sinks: list[str] = field(default_factory=list)  # Of a net
+    locations: list[str] = field(default_factory=list)
+
+    @property
+    def cell(self) -> str | None:
+        return None if self.what == "Net" else self.name.rsplit(".", 1)[0]
+
+
+@dataclass
+class CriticalPath:
+    clock: str  # As reported, e.g. "clock 'clk' (posedge -> posedge)"
+    steps: list[Step] = field(default_factory=list)
+    logic: float = 0.0
+    routing: float = 0.0
+
+    @property
+    def delay(self) -> float:
+        return sum(step.delay for step in self.steps)
+
+
+def critical_paths(log: str) -> list[CriticalPath]:
+    """Critical path reports of a nextpnr log. Locations are the "Defined in" ones"""
+    paths: list[CriticalPath] = []
+    path: CriticalPath | None = None
+    defined_in = False
+    for line in log.splitlines():
+        line = line.removeprefix("Info:").strip()
+        if header := _HEADER.search(line):
+            path = CriticalPath(header[1])
+            paths.append(path)
+            defined_in = False
+            continue
+        if path is None:
+            continue
+        if step := _STEP.match(line):
+            path.steps.append(
+                Step(step["what"], step["name"], float(step["delay"]), step["kind"] or "")
+            )
+            defined_in = False
+        elif (sink := _SINK.match(line)) and path.steps:
+            path.steps[-1].sinks.append(sink[1])
+        elif line == "Defined in:":
+            defined_in = True
+        elif defined_in and (location := _LOCATION.match(line)) and path.steps:
+            path.steps[-1].locations.append(location[1])
+        elif summary := _SUMMARY.match(line):
+            path.logic, path.routing = float(summary[1]), float(summary[2])
+            path = None
+    return paths
+
+
+def _locations(attributes: dict) -> list[str]:
+    src = attributes.get("src", "")
+    return [
+        location
+        for location in src.split("|")
+        if location and not _TECHMAP.search(location)
+    ]
+
+
+def short(location: str) -> str:
+    """Location relative to the repository (or to site-packages for libraries)"""
+    path = location.split(":", 1)[0]
+    if path.startswith(str(ROOT) + "/"):
+        return location[len(str(ROOT)) + 1 :]
+    if "site-packages/" in location:
+        return location.split("site-packages/", 1)[1]
+    return location
+
+
+class SourceMap:
+    """Source locations of the cells and nets of a yosys or nextpnr JSON netlist"""
+
+    def __init__(self, netlist: dict) -> None:
+        self.cells: dict[str, list[str]] = {}
+        self.nets: dict[str, list[str]] = {}
+        self.drivers: dict[str, list[str]] = {}  # Cell: names of the nets it drives
+        for module in netlist["modules"].values():
+            bits: dict[int, str] = {}
+            for name, net in module.get("netnames", {}).items():
+                self.nets[name] = _locations(net.get("attributes", {}))
+                for bit in net.get("bits", ()):
+                    bits.setdefault(bit, name)
+            for name, cell in module.get("cells", {}).items():
+                self.cells[name] = _locations(cell.get("attributes", {}))
+                directions = cell.get("port_directions", {})
+                self.drivers[name] = [
+                    bits[bit]
+                    for port, connected in cell.get("connections", {}).items()
+                    if directions.get(port) == "output"
+                    for bit in connected
+                    if bit in bits
+                ]
+
+    @classmethod
+    def from_directory(cls, path: str | Path, name: str = "top") -> SourceMap:
+        path = Path(path)
+        for suffix in ("pnr.json", "syn.json"):
+            if (path / f"{name}.{suffix}").exists():
+                return cls(json.loads((path / f"{name}.{suffix}").read_text()))
+        return cls({"modules": {}})
+
+    def net(self, name: str) -> list[str]:
+        return self.nets.get(name) or self.nets.get(_BIT.sub("", name)) or []
+
+    def cell(self, name: str) -> list[str]:
+        if self.cells.get(name):
+            return self.cells[name]
+        # Named after a net: the longest prefix (cut at an underscore) that is one
+        parts = name.split("_")
+        for end in range(len(parts) - 1, 0, -1):
+            if locations := self.net("_".join(parts[:end])):
+                return locations
+        for net in self.drivers.get(name, ()):
+            if locations := self.net(net):
+                return locations
+        return []
+
+    def annotate(self, paths: list[CriticalPath]) -> None:
+        """Fill in the locations nextpnr didn't report"""
+        for path in paths:
+            for step in path.steps:
+                if not step.locations:
+                    step.locations = (
+                        self.net(step.name) if step.cell is None else self.cell(step.cell)
+                    )
+
+
+def module(name: str, depth: int = 2) -> str:
+    """Hierarchy of a cell or net, from its name (e.g. "sap1.data_bus")"""
+    scopes = name.split(".")[:-1]
+    return ".".join(scopes[:depth]) or "(top)"
+
+
+def limiting(paths: list[CriticalPath], depth: int = 2) -> tuple[Counter, Counter]:
+    """Delay (ns) on the critical paths by source location, and by module"""
+    by_location: Counter = Counter()
+    by_module: Counter = Counter()
+    for path in paths:
+        for step in path.steps:
+            for location in step.locations[:1] or ["(unknown)"]:
+                by_location[short(location)] += step.delay
+            by_module[module(step.cell or step.name, depth)] += step.delay
+    return by_location, by_module
+
+
+def report(paths: list[CriticalPath], top: int = 10) -> str:
+    lines = []
+    for path in paths:
+        lines.append(
+            f"Critical path for {path.clock}: {path.delay:.2f} ns"
+            f" ({path.logic:.2f} logic, {path.routing:.2f} routing)"
+        )
+        for step in path.steps:
+            location = short(step.locations[0]) if step.locations else "?"
+            lines.append(
+                f"  {step.kind or step.what.lower():9} {step.delay:5.2f}"
+                f"  {step.name[:60]:60}  {location}"
+            )
+    by_location, by_module = limiting(paths)
+    total = sum(by_module.values()) or 1.0
+    lines.append("\nDelay on critical paths by source location")
+    for location, delay in by_location.most_common(top):
+        lines.append(f"  {delay:6.2f} ns {100 * delay / total:4.0f}%  {location}")
+    lines.append("\nBy module")
+    for name, delay in by_module.most_common(top):
+        lines.append(f"  {delay:6.2f} ns {100 * delay / total:4.0f}%  {name}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Critical paths of a Gowin build")
+    parser.add_argument("build_dir", nargs="?", default="build")
+    parser.add_argument("--name", default="top")
+    parser.add_argument("-n", "--top", type=int, default=10, help="Constructs shown")
+    args = parser.parse_args()
+
+    log = Path(args.build_dir) / f"{args.name}.tim"
+    if not log.exists():
+        raise SystemExit(f"No nextpnr log {log}: build with nextpnr first")
+    paths = critical_paths(log.read_text(errors="replace"))
+    if not paths:
+        raise SystemExit(f"No critical path report in {log}")
+    SourceMap.from_directory(args.build_dir, args.name).annotate(paths)
+    print(report(paths, args.top))
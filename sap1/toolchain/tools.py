@@ -0,0 +1,86 @@
+"""
+Choosing between native and YoWASP (WebAssembly) builds of the Gowin flow tools.
+
+The Amaranth build script runs the tools named by environment variables (`YOSYS`,
+`NEXTPNR_HIMBAECHEL`, `GOWIN_PACK`), or else the native binaries from PATH. The YoWASP
+builds of yosys and nextpnr-himbaechel (with the Gowin chip databases) are project
+dependencies, so they are always available with `uv`, but run several times slower.
+`gowin_pack` is the Python one from Apicula, installed along with them. `configure` sets
+the variables that aren't set yet, with the preferred kind of build when it is on PATH
+and the other one otherwise.
+
+YoWASP compiles every tool to machine code the first time it runs (that takes minutes)
+and keeps the result in its own cache, `YOWASP_CACHE_DIR` (a user cache directory by
+default, which persists between runs on the same machine). Nothing is cached here:
+`configure` can only point that variable somewhere else, such as a directory CI keeps
+between jobs. `warm_up` runs the selected YoWASP tools once, so that parallel builds
+don't all compile them, and says how long that took.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import subprocess
+import time
+
+# Environment variable: native build, YoWASP build
+TOOLS = {
+    "YOSYS": ("yosys", "yowasp-yosys"),
+    "NEXTPNR_HIMBAECHEL": ("nextpnr-himbaechel", "yowasp-nextpnr-himbaechel-gowin"),
+    "GOWIN_PACK": ("gowin_pack", None),
+}
+PREFERENCES = ("native", "wasm")
+# Arguments making a tool only print its version
+VERSION_ARGUMENTS = {"YOSYS": "-V", "NEXTPNR_HIMBAECHEL": "--version"}
+
+
+def select(prefer: str = "native") -> dict[str, str]:
+    """Tool by environment variable: the one already set, or else found on PATH"""
+    if prefer not in PREFERENCES:
+        raise ValueError(f"Unknown toolchain preference {prefer!r}")
+    selection = {}
+    for variable, (native, wasm) in TOOLS.items():
+        if variable in os.environ:
+            selection[variable] = os.environ[variable]
+            continue
+        candidates = (native, wasm) if prefer == "native" else (wasm, native)
+        found = next(
+            (path for name in candidates if name and (path := shutil.which(name))), None
+        )
+        if found is not None:
+            selection[variable] = found
+    return selection
+
+
+def is_wasm(tool: str) -> bool:
+    return os.path.basename(tool).startswith("yowasp-")
+
+
+def configure(prefer: str = "native", wasm_cache: str | None = None) -> dict[str, str]:
+    """Set the tool environment variables (and YOWASP_CACHE_DIR if given) for builds"""
+    selection = select(prefer)
+    os.environ.update(selection)
+    if wasm_cache is not None:
+        os.environ["YOWASP_CACHE_DIR"] = os.path.abspath(wasm_cache)
+    return selection
+
+
+def warm_up(selection: dict[str, str]) -> float:
+    """Run the YoWASP tools of selection once. Returns the seconds it took"""
+    start = time.perf_counter()
+    for variable, tool in selection.items():
+        if is_wasm(tool) and variable in VERSION_ARGUMENTS:
+            subprocess.run(
+                [tool, VERSION_ARGUMENTS[variable]],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                check=False,
+            )
+    return time.perf_counter() - start
+
+
+def describe(selection: dict[str, str]) -> str:
+    return ", ".join(
+        f"{variable}={os.path.basename(tool)}" for variable, tool in selection.items()
+    )
@@ -0,0 +1,155 @@
+"""
+Corpus of SAP-1 programs, with their expected ("golden") behavior.
+
+Every workload records what the hardware does with it from reset: the values sent to
+the output register, whether it halts, and the exact clock cycles until it halts (or
+the cycle budget, for programs that run forever). `sap1.sim.regress` checks the HDL
+against all of them.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+ADD2_PROG = [
+    0x14,  # LDA 4
+    0x25,  # ADD 5
+    0xE0,  # OUT
+    0xFF,  # HLT
+    28,  # data
+    14,  # data
+]
+
+MULTIPLY_PROG = [
+    0x1E,  # 0: LDA x
+    0x3C,  # 1: SUB c1
+    0x74,  # 2: JC 4
+    0xF0,  # 3: HLT
+    0x4E,  # 4: STA x
+    0x1D,  # 5: LDA result
+    0x2F,  # 6: ADD y
+    0xE0,  # 7: OUT
+    0x4D,  # 8: STA result
+    0x60,  # 9: JMP 0
+    0,  # a
+    0xFF,  # b
+    0x1,  # c: c1
+    0,  # d: result
+    3,  # e: x
+    14,  # f: y
+]
+
+# Multiplication using an overflowing SUB as the loop test
+MULTIPLY_OVERFLOW_PROG = [
+    0x1E,  # LDA x
+    0x2C,  # SUB c1
+    0x76,  # JC 6
+    0x1D,  # LDA result
+    0xE0,  # OUT
+    0xF0,  # HLT
+    0x4E,  # STA x
+    0x1D,  # LDA result
+    0x2F,  # ADD y
+    0x4D,  # STA result
+    0x60,  # JMP 0
+    0,  # b
+    0xFF,  # c: c1
+    0,  # d: result
+    13,  # e: x
+    12,  # f: y
+]
+
+JUMP_BY_7_PROG = [
+    0x57,  # LDI 7
+    0x4F,  # STA 15
+    0x50,  # LDI 0
+    0x2F,  # ADD 15
+    0xE0,  # OUT
+    0x63,  # JMP 3
+]
+
+COUNT_UP_DOWN = [
+    0xE0,  # OUT
+    0x28,  # ADD 8
+    0x74,  # JC 4
+    0x60,  # JMP 0
+    0x38,  # SUB 8
+    0xE0,  # OUT
+    0x80,  # JZ 0
+    0x64,  # JMP 4
+    1,  # data
+]
+
+FIBONACCI = [
+    0x51,  # LDI 1
+    0x4E,  # STA e
+    0x50,  # LDI 0
+    0xE0,  # OUT
+    0x2E,  # ADD e
+    0x4F,  # STA f
+    0x1E,  # LDA e
+    0x4D,  # STA d
+    0x1F,  # LDA f
+    0x4E,  # STA e
+    0x1D,  # LDA d
+    0x70,  # JC 0
+    0x63,  # JMP 3
+]
+
+
+@dataclass(frozen=True)
+class Workload:
+    name: str
+    program: tuple[int, ...]
+    outputs: tuple[int, ...]  # Every value written to the output register
+    halts: bool
+    cycles: int  # Until halted, or max_cycles if it doesn't halt
+    max_cycles: int
+
+
+CORPUS = [
+    Workload("add2", tuple(ADD2_PROG), (42,), halts=True, cycles=18, max_cycles=1000),
+    Workload(
+        "multiply",
+        tuple(MULTIPLY_PROG),
+        (14, 28, 42),
+        halts=True,
+        cycles=153,
+        max_cycles=1000,
+    ),
+    Workload(
+        "multiply_overflow",
+        tuple(MULTIPLY_OVERFLOW_PROG),
+        (156,),
+        halts=True,
+        cycles=548,
+        max_cycles=2000,
+    ),
+    # The rest never halt, and run for their whole cycle budget
+    Workload(
+        "jump_by_7",
+        tuple(JUMP_BY_7_PROG),
+        tuple(7 * n % 256 for n in range(1, 67)),
+        halts=False,
+        cycles=1000,
+        max_cycles=1000,
+    ),
+    Workload(
+        "count_up_down",
+        tuple(COUNT_UP_DOWN),
+        tuple(range(256)) + tuple(range(255, -1, -1)) + (0, 1, 2, 3),
+        halts=False,
+        cycles=10300,
+        max_cycles=10300,
+    ),
+    Workload(
+        "fibonacci",
+        tuple(FIBONACCI),
+        (0, 1, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144) + (0, 1, 1, 2, 3, 5, 8),
+        halts=False,
+        cycles=1000,
+        max_cycles=1000,
+    ),
+]
+
+WORKLOADS = {workload.name: workload for workload in CORPUS}
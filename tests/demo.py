@@ -4,77 +4,13 @@ from amaranth.sim import Simulator
 from amaranth.hdl._ast import Statement
 
 from sap1.core.sap1 import SAP1
+from sap1.workloads import FIBONACCI
 
 # This shows how to instantiate and simulate the SAP-1 CPU.
 # It should be the basis for building a testbench. TBD.
 
 m = Module()
 
-ADD2_PROG = [
-    0x14,  # LDA 4
-    0x25,  # ADD 5
-    0xE0,  # OUT
-    0xFF,  # HLT
-    28,  # data
-    14,  # data
-]
-
-MULTIPLY_PROG = [
-    0x1E,  # LDA x
-    0x2C,  # SUB c1
-    0x76,  # JC 6
-    0x1D,  # LDA result
-    0xE0,  # OUT
-    0xF0,  # HLT
-    0x4E,  # STA x
-    0x1D,  # LDA result
-    0x2F,  # ADD y
-    0x4D,  # STA result
-    0x60,  # JMP 0
-    0,  # b
-    0xFF,  # c: c1
-    0,  # d: result
-    13,  # e: x
-    12,  # f: y
-]
-
-JUMP_BY_7_PROG = [
-    0x57,  # LDI 7
-    0x4F,  # STA 15
-    0x50,  # LDI 0
-    0x2F,  # ADD 15
-    0xE0,  # OUT
-    0x63,  # JMP 3
-]
-
-COUNT_UP_DOWN = [
-    0xE0,  # OUT
-    0x28,  # ADD 8
-    0x74,  # JC 4
-    0x60,  # JMP 0
-    0x38,  # SUB 8
-    0xE0,  # OUT
-    0x80,  # JZ 0
-    0x64,  # JMP 4
-    1,  # data
-]
-
-FIBONACCI = [
-    0x51, # LDI 1
-    0x4e, # STA e
-    0x50, # LDI 0
-    0xE0, # OUT
-    0x2E, # ADD e
-    0x4f, # STA f
-    0x1e, # LDA e
-    0x4d, # STA d
-    0x1f, # LDA f
-    0x4e, # STA e
-    0x1d, # LDA d
-    0x70, # JC 0
-    0x63, # JMP 3
-]
-
 sap1 = m.submodules.sap1 = SAP1(FIBONACCI)
 
 